@@ -0,0 +1,428 @@
+"""Headless batch measurement.
+
+Measures every subject listed in a manifest (or found in a directory of
+front/side photo pairs) and writes one consolidated CSV, one row per subject.
+With --store the rows are also appended to a SQLite measurement store.
+Never imports PyQt5, so it runs on servers without a display.
+
+    python batch_measure.py --manifest subjects.csv --output results.csv
+    python batch_measure.py --manifest subjects.csv --store measurements.db
+    python batch_measure.py --image-dir photos/ --subjects subjects.csv --output results.csv
+
+A manifest has the columns subject_id, front, side, height, gender (image
+paths are relative to the manifest). In directory mode the subjects file
+only needs subject_id, height, gender and images are found as
+<subject_id>_front.<ext> and <subject_id>_side.<ext>. Optional back and
+three_quarter views (manifest columns, or <subject_id>_back.<ext> etc.)
+are fused with the front and side by measurement_batch.fuse_views.
+
+With --backend onnx detection runs on ONNX Runtime instead of MediaPipe,
+every view of --batch-size subjects going through the model in one call:
+
+    python batch_measure.py --manifest subjects.csv --backend onnx --onnx-model pose_landmark_full.onnx --int8
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+import coefficient_model
+import image_loader
+import instrumentation
+import measurement
+import measurement_store
+import pose_backends
+import silhouette
+from keypoint_cache import KeypointCache
+from measurement_store import MeasurementStore
+from parallel_detect import ParallelDetector
+from pose_pool import PoseEstimatorPool
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+EXTRA_VIEWS = ("back", "three_quarter")
+STORE_BUFFER = 100000
+
+
+class Subject:
+    def __init__(self, subject_id, front_path, side_path, height, gender, extra_paths=None):
+        self.subject_id = subject_id
+        self.front_path = front_path
+        self.side_path = side_path
+        self.height = height
+        self.gender = gender
+        self.extra_paths = extra_paths or {}  # view name -> path for EXTRA_VIEWS
+
+    def view_paths(self):
+        return dict({"front": self.front_path, "side": self.side_path}, **self.extra_paths)
+
+
+def parse_gender(value):
+    gender = value.strip().capitalize()
+    if gender in ("M", "Male"):
+        return "Male"
+    if gender in ("F", "Female"):
+        return "Female"
+    raise ValueError(f"Unknown gender: {value!r}")
+
+
+def read_manifest(path):
+    """Read subjects from a manifest CSV with explicit front/side image paths."""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    subjects = []
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            subjects.append(Subject(
+                row["subject_id"],
+                os.path.join(base_dir, row["front"]),
+                os.path.join(base_dir, row["side"]),
+                float(row["height"]),
+                parse_gender(row["gender"]),
+                {view: os.path.join(base_dir, row[view]) for view in EXTRA_VIEWS if row.get(view)}
+            ))
+    return subjects
+
+
+def find_image(image_dir, subject_id, view, names):
+    for ext in IMAGE_EXTENSIONS:
+        name = f"{subject_id}_{view}{ext}"
+        if name.lower() in names:
+            return os.path.join(image_dir, names[name.lower()])
+    return None
+
+
+def read_image_dir(image_dir, subjects_path):
+    """Pair <id>_front/<id>_side images in a directory with heights and genders."""
+    names = {name.lower(): name for name in os.listdir(image_dir)}
+    subjects = []
+    with open(subjects_path, newline='') as file:
+        for row in csv.DictReader(file):
+            subject_id = row["subject_id"]
+            extra_paths = {view: find_image(image_dir, subject_id, view, names) for view in EXTRA_VIEWS}
+            subjects.append(Subject(
+                subject_id,
+                find_image(image_dir, subject_id, "front", names),
+                find_image(image_dir, subject_id, "side", names),
+                float(row["height"]),
+                parse_gender(row["gender"]),
+                {view: path for view, path in extra_paths.items() if path}
+            ))
+    return subjects
+
+
+def measure_points(subject, front_points, side_points, coefficient_set="default", extra_points=None):
+    """Turn mapped points into one result row, fusing any extra views with front and side."""
+    if extra_points:
+        view_points = dict({"front": front_points, "side": side_points}, **extra_points)
+        scale_factor, chest, waist = measurement.calculate_multiview_measurements(view_points, subject.height)
+    else:
+        scale_factor, chest, waist = measurement.calculate_measurements(
+            front_points, side_points, subject.height)
+    estimated = measurement.estimate_measurements(
+        chest, waist, subject.height, subject.gender, coefficient_set)
+    row = result_row(subject, "ok")
+    row["Scale Factor"] = scale_factor
+    row["Chest Circumference"] = chest
+    row["Waist Circumference"] = waist
+    row.update(estimated)
+    for prefix, labels, points in (
+            ("Front", measurement.POINT_FRONT_LABELS, front_points),
+            ("Side", measurement.POINT_SIDE_LABELS, side_points)):
+        for label, (x, y) in zip(labels, points):
+            row[f"{prefix} {label} X"] = x
+            row[f"{prefix} {label} Y"] = y
+    return row
+
+
+def error_row(subject, error):
+    """A failed result row; unexpected exception types are named in the status."""
+    if isinstance(error, ValueError):
+        return result_row(subject, f"error: {error}")
+    return result_row(subject, f"error: {type(error).__name__}: {error}")
+
+
+def result_row(subject, status):
+    return {
+        "subject_id": subject.subject_id,
+        "status": status,
+        "Gender": subject.gender,
+        "Height (cm)": subject.height,
+    }
+
+
+def format_row(row):
+    """Round the measured values of a result row for the CSV."""
+    formatted = dict(row)
+    for name, value in row.items():
+        if isinstance(value, float) and " X" not in name and " Y" not in name:
+            formatted[name] = f"{value:.6f}" if name == "Scale Factor" else f"{value:.2f}"
+    return formatted
+
+
+def store_row(store, row, coefficient_set="default"):
+    """Append a result row to a MeasurementStore at full precision."""
+    points = {}
+    for prefix, labels in (("Front", measurement.POINT_FRONT_LABELS),
+                           ("Side", measurement.POINT_SIDE_LABELS)):
+        if f"{prefix} {labels[0]} X" in row:
+            points[prefix] = [(row[f"{prefix} {label} X"], row[f"{prefix} {label} Y"]) for label in labels]
+    values = {name: value for name, value in row.items() if name in measurement_store.VALUE_NAMES}
+    store.append(row["subject_id"], row["Gender"], row["Height (cm)"], points.get("Front"),
+                 points.get("Side"), values, source="batch", status=row["status"],
+                 coefficient_set=coefficient_set)
+
+
+def result_fields(coefficient_set="default"):
+    fields = ["subject_id", "status", "Gender", "Height (cm)", "Scale Factor",
+              "Chest Circumference", "Waist Circumference"]
+    fields += coefficient_model.get_model(coefficient_set).names
+    for prefix, labels in (("Front", measurement.POINT_FRONT_LABELS),
+                           ("Side", measurement.POINT_SIDE_LABELS)):
+        for label in labels:
+            fields += [f"{prefix} {label} X", f"{prefix} {label} Y"]
+    return fields
+
+
+def measure_subject(pose, subject, cache=None, inference_size="auto", coefficient_set="default",
+                    use_silhouette=False):
+    """Measure one subject, recording failures in the status column instead of raising."""
+    try:
+        points = {
+            view: measurement.detect_image_points(pose, path, view, cache, inference_size, use_silhouette)
+            for view, path in subject.view_paths().items()
+        }
+        front_points, side_points = points.pop("front"), points.pop("side")
+        return measure_points(subject, front_points, side_points, coefficient_set, points)
+    except Exception as error:
+        return error_row(subject, error)
+
+
+def run_serial(subjects, args):
+    with PoseEstimatorPool(model_complexity=args.model_complexity,
+                           min_detection_confidence=args.min_detection_confidence,
+                           inference_size=args.inference_size,
+                           enable_segmentation=args.silhouette) as pose_pool:
+        pose_pool.warm_up()
+        cache = KeypointCache(args.cache_dir, pose_pool.settings()) if args.cache_dir else None
+        with pose_pool.pose() as pose:
+            for subject in subjects:
+                yield measure_subject(pose, subject, cache, args.inference_size, args.coefficient_set,
+                                      args.silhouette)
+
+
+def run_parallel(subjects, args):
+    """Detect on a process pool and yield rows as soon as every view of a subject finishes."""
+    detector = ParallelDetector(
+        workers=args.workers,
+        model_complexity=args.model_complexity,
+        min_detection_confidence=args.min_detection_confidence,
+        inference_size=args.inference_size,
+        max_worker_memory_mb=args.max_worker_memory,
+        cache_dir=args.cache_dir,
+        use_silhouette=args.silhouette
+    )
+    by_id = {subject.subject_id: subject for subject in subjects}
+    tasks = []
+    for subject in subjects:
+        for view, path in subject.view_paths().items():
+            tasks.append((subject.subject_id, view, path))
+
+    pending = {}
+    for subject_id, view, points, error in detector.detect(tasks):
+        views = pending.setdefault(subject_id, {})
+        views[view] = error if error else points
+        subject = by_id[subject_id]
+        if len(views) < 2 + len(subject.extra_paths):
+            continue
+        del pending[subject_id]
+        errors = [f"{name}: {value}" for name, value in views.items() if isinstance(value, str)]
+        if errors:
+            yield result_row(subject, "error: " + "; ".join(errors))
+            continue
+        try:
+            front_points, side_points = views.pop("front"), views.pop("side")
+            row = measure_points(subject, front_points, side_points, args.coefficient_set, views)
+        except Exception as error:
+            row = error_row(subject, error)
+        yield row
+
+
+def detection_points(landmarks, mask, view, image_shape, use_silhouette):
+    if landmarks is None:
+        raise ValueError(f"no person detected in {view} image")
+    points = measurement.map_landmarks(landmarks, view, image_shape)
+    if not use_silhouette:
+        return points
+    if mask is None:
+        raise ValueError("silhouette measurement needs a model with a segmentation output")
+    return silhouette.silhouette_points(mask, landmarks, points, image_shape)
+
+
+def measure_chunk(backend, subjects, cache, args):
+    """Measure a few subjects with one detect_batch call over all their views."""
+    points = {subject.subject_id: {} for subject in subjects}
+    errors = {subject.subject_id: [] for subject in subjects}
+    batch = []  # (subject, view, LoadedImage, cache key)
+    for subject in subjects:
+        for view, path in subject.view_paths().items():
+            if path is None:
+                errors[subject.subject_id].append(f"{view}: missing {view} image")
+                continue
+            try:
+                data = np.fromfile(path, dtype=np.uint8)
+            except OSError:
+                errors[subject.subject_id].append(f"{view}: could not read {view} image {path}")
+                continue
+            key = None
+            # Masks are not cached, so silhouette runs always detect
+            if cache is not None and not args.silhouette:
+                key = cache.make_key(data)
+                cached = cache.get(key)
+                if cached is not None:
+                    try:
+                        points[subject.subject_id][view] = detection_points(
+                            cached[0], None, view, cached[1], False)
+                    except ValueError as error:
+                        errors[subject.subject_id].append(f"{view}: {error}")
+                    continue
+            loaded = image_loader.load_image(None, data=data)
+            if loaded is None:
+                errors[subject.subject_id].append(f"{view}: could not read {view} image {path}")
+                continue
+            batch.append((subject, view, loaded, key))
+
+    results = backend.detect_batch([loaded.pixels for _, _, loaded, _ in batch], args.silhouette)
+    for (subject, view, loaded, key), result in zip(batch, results):
+        landmarks, mask = result if args.silhouette else (result, None)
+        if key is not None:
+            cache.put(key, landmarks, loaded.full_shape)
+        try:
+            points[subject.subject_id][view] = detection_points(
+                landmarks, mask, view, loaded.full_shape, args.silhouette)
+        except ValueError as error:
+            errors[subject.subject_id].append(f"{view}: {error}")
+
+    for subject in subjects:
+        if errors[subject.subject_id]:
+            yield result_row(subject, "error: " + "; ".join(errors[subject.subject_id]))
+            continue
+        views = points[subject.subject_id]
+        try:
+            front_points, side_points = views.pop("front"), views.pop("side")
+            row = measure_points(subject, front_points, side_points, args.coefficient_set, views)
+        except Exception as error:
+            row = error_row(subject, error)
+        yield row
+
+
+def run_batched(subjects, args):
+    """Detect batch_size subjects at a time on the ONNX backend."""
+    with pose_backends.create_backend(
+            "onnx", min_detection_confidence=args.min_detection_confidence,
+            model_path=args.onnx_model, quantized=args.int8, intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads, batch_size=args.batch_size) as backend:
+        backend.warm_up()
+        cache = KeypointCache(args.cache_dir, backend.settings()) if args.cache_dir else None
+        # Every view of a chunk goes into one run (the backend splits it by its own batch size)
+        chunk_size = max(1, args.batch_size // 2)
+        for start in range(0, len(subjects), chunk_size):
+            yield from measure_chunk(backend, subjects[start:start + chunk_size], cache, args)
+
+
+def parse_inference_size(value):
+    if value == "auto":
+        return value
+    return int(value)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure front/side photo pairs without the GUI.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--manifest", help="CSV with subject_id, front, side, height, gender")
+    source.add_argument("--image-dir", help="directory of <id>_front/<id>_side images")
+    parser.add_argument("--subjects", help="CSV with subject_id, height, gender (with --image-dir)")
+    parser.add_argument("--output", default="batch_measurements.csv", help="consolidated results file")
+    parser.add_argument("--store", default=None,
+                        help="also append every row to this SQLite measurement store")
+    parser.add_argument("--model-complexity", type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument("--min-detection-confidence", type=float, default=0.5)
+    parser.add_argument("--inference-size", type=parse_inference_size, default="auto",
+                        help="long side to downscale to before detection: auto, 0 for full size, or pixels")
+    parser.add_argument("--silhouette", action="store_true",
+                        help="measure chest and waist from the person mask instead of landmark offsets")
+    parser.add_argument("--coefficient-set", default="default",
+                        help="named set in coefficients.csv used for estimated measurements")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="detection processes; 0 uses every CPU core")
+    parser.add_argument("--max-worker-memory", type=float, default=None,
+                        help="address-space cap per worker process in MB")
+    parser.add_argument("--cache-dir", default=None,
+                        help="reuse detected landmarks for images seen before")
+    parser.add_argument("--metrics", default=None,
+                        help="write per-stage timings here (.json for JSON, else Prometheus text)")
+    parser.add_argument("--backend", default="mediapipe", choices=pose_backends.BACKENDS,
+                        help="pose detection backend")
+    parser.add_argument("--onnx-model", default=None, help="BlazePose landmark model (with --backend onnx)")
+    parser.add_argument("--int8", action="store_true",
+                        help="use the int8 quantized model, quantizing it on first use")
+    parser.add_argument("--intra-op-threads", type=int, default=0,
+                        help="threads per ONNX operator; 0 uses every core")
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=16, help="images per ONNX inference call")
+    args = parser.parse_args(argv)
+    if args.image_dir and not args.subjects:
+        parser.error("--image-dir requires --subjects")
+    if args.backend == "onnx":
+        if not args.onnx_model:
+            parser.error("--backend onnx requires --onnx-model")
+        if args.workers != 1:
+            parser.error("--backend onnx parallelizes with --intra-op-threads instead of --workers")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.metrics:
+        instrumentation.enable()
+    if args.manifest:
+        subjects = read_manifest(args.manifest)
+    else:
+        subjects = read_image_dir(args.image_dir, args.subjects)
+
+    start = time.perf_counter()
+    failures = 0
+    # Rows are written in one transaction at the end (or every STORE_BUFFER rows)
+    store = MeasurementStore(args.store, buffer_size=STORE_BUFFER) if args.store else None
+    with open(args.output, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=result_fields(args.coefficient_set))
+        writer.writeheader()
+        if args.backend == "onnx":
+            rows = run_batched(subjects, args)
+        elif args.workers == 1:
+            rows = run_serial(subjects, args)
+        else:
+            rows = run_parallel(subjects, args)
+        for row in rows:
+            with instrumentation.span("csv_export"):
+                writer.writerow(format_row(row))
+            if store is not None:
+                store_row(store, row, args.coefficient_set)
+            if row["status"] != "ok":
+                failures += 1
+                print(f"{row['subject_id']}: {row['status']}", file=sys.stderr)
+    if store is not None:
+        store.close()
+    if args.metrics:
+        instrumentation.write(args.metrics)
+
+    elapsed = time.perf_counter() - start
+    rate = len(subjects) / elapsed * 3600 if elapsed > 0 else 0
+    print(f"Measured {len(subjects) - failures}/{len(subjects)} subjects "
+          f"in {elapsed:.1f}s ({rate:.0f} subjects/hour). Results exported to {args.output}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""Benchmarks of the measurement hot paths, with stored baselines.
+
+Front and side stick figures are drawn at several resolutions (fixed
+proportions, so every run sees the same pixels) and each hot path is
+timed on them: cv2.imread, image_loader.load_image, detect_keypoints,
+the keypoint mappers, calculate_measurements, estimate_measurements,
+export_to_csv, and the GUI redraw (display_image and draw_points of ml.py
+and combination.py) on Qt's offscreen platform.
+
+    python benchmark.py
+    python benchmark.py --save benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json --threshold 0.15
+
+--compare exits with status 1 when any case's median got slower than the
+baseline by more than the threshold (and by more than --noise-ms, so
+microsecond cases do not flap). Baselines are only comparable on the
+same machine; the environment they were taken in is stored with them.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+import coefficient_model
+import image_loader
+import measurement
+import pose_backends
+
+SIZES = (800, 2000, 4000)  # long side of the synthetic photos, portrait 3:4
+SUBJECT_HEIGHT = 175.0
+SUBJECT_GENDER = "Male"
+# Smallest time one sample should take; faster functions are called in a loop per sample
+MIN_SAMPLE_SECONDS = 0.0005
+
+# Normalized joint positions of the stick figure: (front x, side x, y)
+_JOINTS = {
+    0: (0.50, 0.52, 0.10),   # nose
+    2: (0.48, 0.50, 0.09),   # left eye
+    5: (0.52, 0.50, 0.09),   # right eye
+    11: (0.60, 0.50, 0.22),  # left shoulder
+    12: (0.40, 0.49, 0.22),  # right shoulder
+    13: (0.64, 0.50, 0.37),  # left elbow
+    14: (0.36, 0.49, 0.37),
+    15: (0.66, 0.51, 0.50),  # left wrist
+    16: (0.34, 0.50, 0.50),
+    23: (0.57, 0.50, 0.52),  # left hip
+    24: (0.43, 0.49, 0.52),
+    25: (0.56, 0.51, 0.72),  # left knee
+    26: (0.44, 0.50, 0.72),
+    27: (0.56, 0.50, 0.91),  # left ankle
+    28: (0.44, 0.49, 0.91),
+    29: (0.56, 0.47, 0.94),  # left heel
+    30: (0.44, 0.46, 0.94),
+    31: (0.57, 0.56, 0.96),  # left foot index
+    32: (0.43, 0.55, 0.96),
+}
+_BONES = [(11, 13), (13, 15), (12, 14), (14, 16), (23, 25), (25, 27), (24, 26), (26, 28),
+          (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32)]
+
+
+def figure_landmarks(view):
+    """The stick figure's (33, 4) normalized landmarks, as a pose model would report them."""
+    landmarks = np.zeros((33, 4), dtype=np.float32)
+    landmarks[:, 3] = 1.0
+    column = 0 if view == "front" else 1
+    for index, joint in _JOINTS.items():
+        landmarks[index, :2] = joint[column], joint[2]
+    # Joints without a position of their own sit between their neighbours
+    for index in range(33):
+        if index not in _JOINTS:
+            landmarks[index, :2] = landmarks[0, :2] if index < 11 else landmarks[[11, 12, 23, 24], :2].mean(axis=0)
+    return landmarks
+
+
+def stick_figure(view, long_side):
+    """A BGR portrait photo of a stick figure seen from the front or side."""
+    height, width = long_side, long_side * 3 // 4
+    image = np.full((height, width, 3), 200, dtype=np.uint8)
+    # Mild deterministic texture so encoders and decoders do real work
+    rng = np.random.default_rng(long_side)
+    image += rng.integers(0, 24, (height, width, 1), dtype=np.uint8)
+    landmarks = figure_landmarks(view)
+    points = {index: (int(x * width), int(y * height)) for index, (x, y) in enumerate(landmarks[:, :2])}
+    thickness = max(2, long_side // 60)
+    body = (60, 50, 45)
+
+    torso = [points[11], points[12], points[24], points[23]] if view == "front" else [
+        (points[11][0] + long_side // 25, points[11][1]), (points[11][0] - long_side // 25, points[11][1]),
+        (points[23][0] - long_side // 22, points[23][1]), (points[23][0] + long_side // 22, points[23][1])]
+    cv2.fillPoly(image, [np.array(torso, dtype=np.int32)], body, lineType=cv2.LINE_AA)
+    for start, end in _BONES:
+        cv2.line(image, points[start], points[end], body, thickness, cv2.LINE_AA)
+    head_radius = long_side // 18
+    cv2.circle(image, (points[0][0], points[0][1]), head_radius, body, -1, cv2.LINE_AA)
+    neck_top = (points[0][0], points[0][1] + head_radius)
+    shoulder_mid = ((points[11][0] + points[12][0]) // 2, points[11][1])
+    cv2.line(image, neck_top, shoulder_mid, body, thickness * 2, cv2.LINE_AA)
+    return image
+
+
+def write_figures(directory, sizes):
+    """Write front/side JPEGs for every size; returns {(view, size): path}."""
+    paths = {}
+    for size in sizes:
+        for view in ("front", "side"):
+            path = os.path.join(directory, f"{view}_{size}.jpg")
+            cv2.imwrite(path, stick_figure(view, size), [cv2.IMWRITE_JPEG_QUALITY, 92])
+            paths[view, size] = path
+    return paths
+
+
+def time_function(function, repeat):
+    """Per-call seconds of repeat samples, each sample looping enough calls to be measurable."""
+    function()
+    start = time.perf_counter()
+    function()
+    once = time.perf_counter() - start
+    number = max(1, math.ceil(MIN_SAMPLE_SECONDS / once)) if once > 0 else 1000
+    samples = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            samples.append((time.perf_counter() - start) / number)
+    finally:
+        if enabled:
+            gc.enable()
+    return samples
+
+
+def summarize(samples):
+    samples = np.array(samples) * 1000
+    return {
+        "median_ms": float(np.median(samples)),
+        "p95_ms": float(np.percentile(samples, 95)),
+        "min_ms": float(samples.min()),
+        "runs": len(samples),
+    }
+
+
+def detect_keypoints(backend, image):
+    """What ml.py's detect_keypoints does for a LoadedImage, without the window or cache."""
+    with backend.pose() as pose:
+        landmarks = measurement.detect_landmarks(pose, image.pixels, backend.inference_size)
+    if landmarks is None:
+        return None, None
+    return landmarks, measurement.landmarks_to_keypoints(landmarks, image.full_shape)
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+class Suite:
+    """Named benchmark cases, run in a fixed order."""
+
+    def __init__(self, repeat, only=None):
+        self.repeat = repeat
+        self.only = only
+        self.results = {}
+        self.skipped = {}
+
+    def wanted(self, name):
+        return not self.only or any(part in name for part in self.only)
+
+    def run(self, name, function, repeat=None):
+        if not self.wanted(name):
+            return
+        self.results[name] = summarize(time_function(function, repeat or self.repeat))
+        print(f"{name:<40} {self.results[name]['median_ms']:>10.4f} ms", file=sys.stderr)
+
+    def skip(self, name, reason):
+        if self.wanted(name):
+            self.skipped[name] = reason
+            print(f"{name:<40} skipped: {reason}", file=sys.stderr)
+
+
+def run_core(suite, paths, sizes, backend):
+    for size in sizes:
+        path = paths["front", size]
+        suite.run(f"imread/{size}", lambda: cv2.imread(path))
+        suite.run(f"load_image/{size}", lambda: image_loader.load_image(path))
+        if backend is None:
+            suite.skip(f"detect_keypoints/{size}", "no pose backend")
+            continue
+        loaded = image_loader.load_image(path)
+        try:
+            detect_keypoints(backend, loaded)
+        except Exception as error:
+            suite.skip(f"detect_keypoints/{size}", f"{type(error).__name__}: {error}")
+            continue
+        suite.run(f"detect_keypoints/{size}", lambda: detect_keypoints(backend, loaded), max(3, suite.repeat // 4))
+
+    shape = (sizes[-1], sizes[-1] * 3 // 4, 3)
+    front_landmarks, side_landmarks = figure_landmarks("front"), figure_landmarks("side")
+    front_keypoints = measurement.landmarks_to_keypoints(front_landmarks, shape)
+    side_keypoints = measurement.landmarks_to_keypoints(side_landmarks, shape)
+    suite.run("map_keypoints_front", lambda: measurement.map_keypoints_front(front_keypoints, shape))
+    suite.run("map_keypoints_side",
+              lambda: measurement.map_keypoints_side(side_keypoints, side_landmarks, shape))
+
+    front_points = measurement.map_keypoints_front(front_keypoints, shape)
+    side_points = measurement.map_keypoints_side(side_keypoints, side_landmarks, shape)
+    suite.run("calculate_measurements",
+              lambda: measurement.calculate_measurements(front_points, side_points, SUBJECT_HEIGHT))
+    _, chest, waist = measurement.calculate_measurements(front_points, side_points, SUBJECT_HEIGHT)
+    coefficient_model.get_model("default")
+    suite.run("estimate_measurements",
+              lambda: measurement.estimate_measurements(chest, waist, SUBJECT_HEIGHT, SUBJECT_GENDER))
+    return front_points, side_points, (chest, waist)
+
+
+def run_gui(suite, directory, paths, sizes, front_points, circumferences):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        import combination
+        import ml
+        from measurement_store import MeasurementStore
+    except Exception as error:
+        for name in ("export_to_csv", "ml.display_image", "combination.display_image"):
+            suite.skip(name, f"GUI unavailable: {error}")
+        return
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    # The tools open measurements.db in the working directory; keep it out of the repo
+    with working_directory(directory), MeasurementStore(os.path.join(directory, "bench.db")) as store:
+        tool = ml.IntegratedMeasurementTool(pose_pool=pose_backends.create_backend("mediapipe"),
+                                            measurement_store=store)
+        manual = combination.IntegratedMeasurementTool()
+        for window in (tool, manual):
+            window.show()
+        app.processEvents()
+
+        tool.user_height, tool.gender = SUBJECT_HEIGHT, SUBJECT_GENDER
+        chest, waist = circumferences
+        measurements = [("Chest Circumference", chest), ("Waist Circumference", waist)]
+        estimated = measurement.estimate_measurements(chest, waist, SUBJECT_HEIGHT, SUBJECT_GENDER)
+        csv_path = os.path.join(directory, "bench_measurements.csv")
+        suite.run("export_to_csv", lambda: tool.export_to_csv(csv_path, measurements, estimated))
+
+        # Points in label coordinates, as the tools keep them
+        label_scale = 600 / (sizes[-1])
+        label_points = [(int(x * label_scale), int(y * label_scale)) for x, y in front_points]
+        for size in sizes:
+            pixels = image_loader.load_image(paths["front", size]).pixels
+            tool.current_image, tool.current_points, tool.image_type = pixels, label_points, "front"
+
+            def ml_redraw():
+                tool.display_image()
+                tool.image_label.repaint()
+            suite.run(f"ml.display_image/{size}", ml_redraw)
+
+            manual.current_image, manual.current_points, manual.image_type = pixels, label_points, "front"
+
+            def combination_rescale():
+                manual.base_pixmap = None
+                manual.display_image()
+                manual.image_label.repaint()
+            suite.run(f"combination.display_image/{size}", combination_rescale)
+
+        def combination_points():
+            manual.draw_points()
+            manual.overlay.repaint()
+        suite.run("combination.draw_points", combination_points)
+
+        for window in (tool, manual):
+            window.hide()
+            window.deleteLater()
+        tool.pose_pool.close()
+        app.processEvents()
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+    }
+
+
+def compare(results, baseline, threshold, noise_ms):
+    """(name, baseline ms, current ms, ratio) of every case slower than the threshold allows."""
+    regressions = []
+    for name, result in sorted(results.items()):
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        before, after = previous["median_ms"], result["median_ms"]
+        ratio = after / before if before > 0 else float("inf")
+        marker = ""
+        if ratio > 1 + threshold and after - before > noise_ms:
+            regressions.append((name, before, after, ratio))
+            marker = "  REGRESSION"
+        print(f"{name:<40} {before:>10.4f} -> {after:>10.4f} ms ({ratio - 1:+.1%}){marker}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the measurement hot paths on synthetic subjects.")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)),
+                        help="comma-separated long sides of the synthetic photos")
+    parser.add_argument("--repeat", type=int, default=20, help="samples per case")
+    parser.add_argument("--only", default=None, help="comma-separated substrings of the cases to run")
+    parser.add_argument("--no-gui", action="store_true", help="skip the CSV export and redraw cases")
+    parser.add_argument("--backend", default="mediapipe", choices=pose_backends.BACKENDS + ("none",))
+    parser.add_argument("--onnx-model", default=None)
+    parser.add_argument("--output", default=None, help="write this run's results as JSON")
+    parser.add_argument("--save", default=None, help="store this run as the baseline at this path")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="fractional slowdown of a median that counts as a regression")
+    parser.add_argument("--noise-ms", type=float, default=0.02,
+                        help="slowdowns smaller than this many ms never count")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = args.only.split(",") if args.only else None
+    suite = Suite(args.repeat, only)
+
+    backend = None
+    if args.backend != "none":
+        try:
+            backend = pose_backends.create_backend(args.backend, model_path=args.onnx_model)
+        except Exception as error:
+            print(f"No {args.backend} backend: {error}", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory(prefix="mannequin-bench-") as directory:
+        paths = write_figures(directory, sizes)
+        front_points, _, circumferences = run_core(suite, paths, sizes, backend)
+        if not args.no_gui:
+            run_gui(suite, directory, paths, sizes, front_points, circumferences)
+    if backend is not None:
+        backend.close()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": environment(),
+        "settings": {"sizes": sizes, "repeat": args.repeat, "backend": args.backend},
+        "results": suite.results,
+        "skipped": suite.skipped,
+    }
+    for path in (args.output, args.save):
+        if path:
+            with open(path, "w") as file:
+                json.dump(report, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if baseline.get("environment") != report["environment"]:
+            print("Warning: the baseline was taken in a different environment.", file=sys.stderr)
+        regressions = compare(suite.results, baseline, args.threshold, args.noise_ms)
+        if regressions:
+            print(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%}.")
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
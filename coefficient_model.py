@@ -0,0 +1,95 @@
+"""Table-driven anthropometric coefficients for estimate_measurements.
+
+Every derived measurement is a linear combination of the base
+measurements (height, chest circumference, waist circumference), with one
+set of weights per profile (gender). The weights live in coefficients.csv,
+grouped into named coefficient sets, so they can be changed or swapped
+without touching code. Point MANNEQUIN_COEFFICIENTS at another CSV to use
+a different table.
+"""
+import csv
+import os
+from functools import lru_cache
+
+import numpy as np
+
+COEFFICIENTS_PATH = os.environ.get(
+    "MANNEQUIN_COEFFICIENTS",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "coefficients.csv")
+)
+BASE_NAMES = ("height", "chest", "waist")
+
+
+class CoefficientModel:
+    """Coefficients of one set as a contiguous (profiles * 3, measurements) matrix.
+
+    Rows are grouped by profile, so evaluating N subjects is one matrix
+    multiply of an (N, profiles * 3) base matrix, in which each subject's
+    height, chest and waist sit in its own profile's columns.
+    """
+
+    def __init__(self, names, profiles, weights):
+        self.names = list(names)
+        self.profiles = list(profiles)
+        self._profile_index = {profile: i for i, profile in enumerate(self.profiles)}
+        self.weights = np.ascontiguousarray(weights, dtype=np.float64)
+
+    @classmethod
+    def load(cls, coefficient_set="default", path=COEFFICIENTS_PATH):
+        names, profiles, values = [], [], {}
+        with open(path, newline='') as file:
+            for row in csv.DictReader(file):
+                if row["coefficient_set"] != coefficient_set:
+                    continue
+                if row["measurement"] not in names:
+                    names.append(row["measurement"])
+                if row["profile"] not in profiles:
+                    profiles.append(row["profile"])
+                values[row["profile"], row["measurement"]] = [float(row[base]) for base in BASE_NAMES]
+        if not values:
+            raise ValueError(f"No coefficients for set {coefficient_set!r} in {path}")
+
+        base_count = len(BASE_NAMES)
+        weights = np.zeros((len(profiles) * base_count, len(names)))
+        for p, profile in enumerate(profiles):
+            for m, name in enumerate(names):
+                try:
+                    column = values[profile, name]
+                except KeyError:
+                    raise ValueError(f"Set {coefficient_set!r} has no {name!r} for {profile!r}")
+                weights[p * base_count:(p + 1) * base_count, m] = column
+        return cls(names, profiles, weights)
+
+    def profile_indices(self, profiles):
+        profiles = np.asarray(profiles)
+        if profiles.dtype == bool:
+            profiles = np.where(profiles, "Male", "Female")
+        try:
+            return np.array([self._profile_index[p] for p in profiles.tolist()], dtype=np.intp)
+        except KeyError as error:
+            raise ValueError(f"Unknown profile: {error.args[0]!r}")
+
+    def evaluate(self, heights, chest, waist, profiles):
+        """(N, measurements) array of derived measurements for N subjects."""
+        base = np.column_stack([
+            np.asarray(heights, dtype=np.float64),
+            np.asarray(chest, dtype=np.float64),
+            np.asarray(waist, dtype=np.float64),
+        ])
+        count, base_count = base.shape
+        indices = self.profile_indices(profiles)
+        expanded = np.zeros((count, len(self.profiles) * base_count))
+        columns = indices[:, None] * base_count + np.arange(base_count)
+        np.put_along_axis(expanded, columns, base, axis=1)
+        return expanded @ self.weights
+
+    def evaluate_one(self, height, chest, waist, profile):
+        """Derived measurements for one subject as a name -> value dict."""
+        row = self.evaluate([height], [chest], [waist], [profile])[0]
+        return dict(zip(self.names, row.tolist()))
+
+
+@lru_cache(maxsize=None)
+def get_model(coefficient_set="default", path=COEFFICIENTS_PATH):
+    """Load a coefficient set once and reuse it for the rest of the process."""
+    return CoefficientModel.load(coefficient_set, path)
@@ -7,13 +7,22 @@ from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QPushButton, QVBoxLayout,
     QHBoxLayout, QFileDialog, QMessageBox, QInputDialog
 )
-from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt
+
+import coefficient_model
+import image_loader
+import instrumentation
+from measurement_store import MeasurementStore
+from point_overlay import PointOverlay, MoveCoalescer
 
 class IntegratedMeasurementTool(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Body Measurement Tool")
+
+        # Every calculation is appended here as well as written to the CSV
+        self.measurement_store = MeasurementStore(buffer_size=1)
         
         # Image and point variables
         self.front_image = None
@@ -23,6 +32,9 @@ class IntegratedMeasurementTool(QMainWindow):
         self.side_points = []
         self.current_points = []
         
+        # Scaled pixmap of the current image, built once per image
+        self.base_pixmap = None
+        
         # User measurements
         self.user_height = None
         self.gender = None
@@ -56,6 +68,11 @@ class IntegratedMeasurementTool(QMainWindow):
         self.image_label = QLabel()
         self.image_label.setFixedSize(800, 600)
         self.image_label.setStyleSheet("background-color: black;")
+        self.image_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        
+        # Points and labels live on their own layer above the image
+        self.overlay = PointOverlay(self.image_label)
+        self.move_coalescer = MoveCoalescer(self.apply_drag)
         
         # Buttons
         load_front_btn = QPushButton("Load Front Image")
@@ -93,30 +110,20 @@ class IntegratedMeasurementTool(QMainWindow):
         
     def display_image(self):
         if self.current_image is not None:
-            height, width, channel = self.current_image.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(self.current_image.data, width, height, 
-                        bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-            pixmap = QPixmap.fromImage(q_img)
-            self.image_label.setPixmap(pixmap.scaled(
-                self.image_label.size(), Qt.KeepAspectRatio))
+            if self.base_pixmap is None:
+                height, width, channel = self.current_image.shape
+                bytes_per_line = 3 * width
+                q_img = QImage(self.current_image.data, width, height, 
+                            bytes_per_line, QImage.Format_RGB888).rgbSwapped()
+                self.base_pixmap = QPixmap.fromImage(q_img).scaled(
+                    self.image_label.size(), Qt.KeepAspectRatio, Qt.SmoothTransformation)
+                self.image_label.setPixmap(self.base_pixmap)
             self.draw_points()
             
     def draw_points(self):
-        if not self.image_label.pixmap():
-            return
-        painter = QPainter(self.image_label.pixmap())
-        painter.setRenderHint(QPainter.Antialiasing)
-        
-        for i, point in enumerate(self.current_points):
-            painter.setPen(QPen(QColor(255, 0, 0), 3))
-            painter.drawEllipse(QPoint(*point), 5, 5)
-            painter.setPen(QColor(0, 255, 0))
-            label = (self.point_front_labels if self.image_type == 'front' 
-                    else self.point_side_labels)[i]
-            painter.drawText(point[0] + 10, point[1] - 10, label)
-        painter.end()
-        self.image_label.update()
+        labels = (self.point_front_labels if self.image_type == 'front' 
+                  else self.point_side_labels)
+        self.overlay.set_points(self.current_points, labels)
         
     def next_point(self):
         if self.current_image is None:
@@ -142,8 +149,12 @@ class IntegratedMeasurementTool(QMainWindow):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Front Image", "", 
                                                 "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.front_image = cv2.imread(filename)
-            self.current_image = self.front_image.copy()
+            self.front_image = image_loader.load_image(filename)
+            if self.front_image is None:
+                QMessageBox.warning(self, "Load Failed", "Could not read the image.")
+                return
+            self.current_image = self.front_image.pixels
+            self.base_pixmap = None
             self.current_points = self.front_points
             self.current_point_labels = self.point_front_labels
             self.image_type = 'front'
@@ -161,8 +172,12 @@ class IntegratedMeasurementTool(QMainWindow):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Side Image", "", 
                                                 "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.side_image = cv2.imread(filename)
-            self.current_image = self.side_image.copy()
+            self.side_image = image_loader.load_image(filename)
+            if self.side_image is None:
+                QMessageBox.warning(self, "Load Failed", "Could not read the image.")
+                return
+            self.current_image = self.side_image.pixels
+            self.base_pixmap = None
             self.current_points = self.side_points
             self.current_point_labels = self.point_side_labels
             self.image_type = 'side'
@@ -214,24 +229,25 @@ class IntegratedMeasurementTool(QMainWindow):
         if not self._validate_measurements():
             return
 
-        # Calculate scale factors
-        front_pixel_height = self.calculate_distance(self.front_points[0], self.front_points[-1])
-        side_pixel_height = self.calculate_distance(self.side_points[0], self.side_points[-1])
-        avg_pixel_height = (front_pixel_height + side_pixel_height) / 2
-        self.scale_factor = self.user_height / avg_pixel_height
+        with instrumentation.span("measurement_math"):
+            # Calculate scale factors
+            front_pixel_height = self.calculate_distance(self.front_points[0], self.front_points[-1])
+            side_pixel_height = self.calculate_distance(self.side_points[0], self.side_points[-1])
+            avg_pixel_height = (front_pixel_height + side_pixel_height) / 2
+            self.scale_factor = self.user_height / avg_pixel_height
 
-        # Calculate primary measurements
-        chest_width_pixels = self.calculate_distance(self.front_points[1], self.front_points[2])
-        chest_depth_pixels = self.calculate_distance(self.side_points[1], self.side_points[2])
-        chest_width_cm = chest_width_pixels * self.scale_factor
-        chest_depth_cm = chest_depth_pixels * self.scale_factor
-        chest_circumference = self.calculate_ellipse_circumference(chest_width_cm, chest_depth_cm) * 1.1
+            # Calculate primary measurements
+            chest_width_pixels = self.calculate_distance(self.front_points[1], self.front_points[2])
+            chest_depth_pixels = self.calculate_distance(self.side_points[1], self.side_points[2])
+            chest_width_cm = chest_width_pixels * self.scale_factor
+            chest_depth_cm = chest_depth_pixels * self.scale_factor
+            chest_circumference = self.calculate_ellipse_circumference(chest_width_cm, chest_depth_cm) * 1.1
 
-        waist_width_pixels = self.calculate_distance(self.front_points[3], self.front_points[4])
-        waist_depth_pixels = self.calculate_distance(self.side_points[3], self.side_points[4])
-        waist_width_cm = waist_width_pixels * self.scale_factor
-        waist_depth_cm = waist_depth_pixels * self.scale_factor
-        waist_circumference = self.calculate_ellipse_circumference(waist_width_cm, waist_depth_cm) * 1.2
+            waist_width_pixels = self.calculate_distance(self.front_points[3], self.front_points[4])
+            waist_depth_pixels = self.calculate_distance(self.side_points[3], self.side_points[4])
+            waist_width_cm = waist_width_pixels * self.scale_factor
+            waist_depth_cm = waist_depth_pixels * self.scale_factor
+            waist_circumference = self.calculate_ellipse_circumference(waist_width_cm, waist_depth_cm) * 1.2
 
         # Collect and export measurements
         measurements = [
@@ -240,8 +256,15 @@ class IntegratedMeasurementTool(QMainWindow):
         ]
         estimated_measurements = self.estimate_measurements(chest_circumference, waist_circumference)
         self.export_to_csv("output_measurements.csv", measurements, estimated_measurements)
+        self.store_measurements(measurements, estimated_measurements)
         QMessageBox.information(self, "Calculations Complete", "Measurements calculated and saved.")
 
+    def store_measurements(self, measurements, estimated_measurements):
+        values = dict(measurements, **estimated_measurements)
+        values["Scale Factor"] = self.scale_factor
+        self.measurement_store.append(None, self.gender, self.user_height, self.front_points,
+                                      self.side_points, values, source="combination")
+
     def _validate_measurements(self):
         if self.user_height is None:
             QMessageBox.warning(self, "Warning", "User height is not set.")
@@ -263,46 +286,28 @@ class IntegratedMeasurementTool(QMainWindow):
         h = ((a - b) ** 2) / ((a + b) ** 2)
         return math.pi * (a + b) * (1 + (3 * h) / (10 + math.sqrt(4 - 3 * h)))
 
+    @instrumentation.timed("estimate")
     def estimate_measurements(self, chest_circumference, waist_circumference):
-        measurements = {}
-        if self.gender == 'Male':
-            measurements.update({
-                'Hip Circumference': ((chest_circumference + waist_circumference) / 2) * 1.05,
-                'Shoulder Width': (chest_circumference * 0.25) * 1.8,
-                'Sleeve Length': (self.user_height * 0.25) * 1.4,
-                'Inseam Length': self.user_height * 0.45,
-                'Neck Circumference': chest_circumference * 0.37,
-                'Arm Length': self.user_height * 0.28,
-                'Thigh Circumference': waist_circumference * 0.7,
-                'Torso Length': self.user_height * 0.27,
-                'Leg Length': self.user_height * 0.53
-            })
-        else:  # Female
-            measurements.update({
-                'Hip Circumference': ((chest_circumference + waist_circumference) / 2) * 1.15,
-                'Shoulder Width': (chest_circumference * 0.25) * 1.75,
-                'Sleeve Length': (self.user_height * 0.24) * 1.4,
-                'Inseam Length': self.user_height * 0.46,
-                'Neck Circumference': chest_circumference * 0.39,
-                'Arm Length': self.user_height * 0.30,
-                'Thigh Circumference': waist_circumference * 0.75,
-                'Torso Length': self.user_height * 0.28,
-                'Leg Length': self.user_height * 0.55
-            })
-        return measurements
+        model = coefficient_model.get_model("default")
+        return model.evaluate_one(self.user_height, chest_circumference, waist_circumference, self.gender)
+
     def mouse_move_event(self, event):
         if self.dragging and self.current_image is not None:
-            x = event.pos().x()
-            y = event.pos().y()
-            self.current_points[self.drag_point_index] = (x, y)
-            self.display_image()
-            self.draw_points()
+            # Applied at most once per display frame, see apply_drag
+            self.move_coalescer.push((event.pos().x(), event.pos().y()))
+
+    def apply_drag(self, position):
+        if self.dragging:
+            # The overlay shares current_points, so this also updates the point itself
+            self.overlay.move_point(self.drag_point_index, position)
 
     def mouse_release_event(self, event):
         if event.button() == Qt.LeftButton:
+            self.move_coalescer.flush()
             self.dragging = False
             self.drag_point_index = -1
 
+    @instrumentation.timed("csv_export")
     def export_to_csv(self, filename, measurements, estimated_measurements):
         with open(filename, mode='w', newline='') as file:
             writer = csv.writer(file)
@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+import image_loader
+
+
+class DetectionSignals(QObject):
+    progress = pyqtSignal(str, int, str)               # view, percent, stage
+    finished = pyqtSignal(str, object, object, object)  # view, LoadedImage, landmarks, keypoints
+    failed = pyqtSignal(str, str)                       # view, message
+    cancelled = pyqtSignal(str)                         # view
+
+
+class DetectionTask(QRunnable):
+    """Loads an image and detects its keypoints on a QThreadPool thread.
+
+    detect is called as detect(loaded_image, image_bytes) and must return
+    (landmarks, keypoints) without touching any widgets. Cancellation is
+    checked between stages; a running pose inference is allowed to finish.
+    """
+
+    def __init__(self, view, filename, detect):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.view = view
+        self.filename = filename
+        self.detect = detect
+        self.signals = DetectionSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def _stage(self, percent, stage):
+        if self._cancelled.is_set():
+            self.signals.cancelled.emit(self.view)
+            return False
+        self.signals.progress.emit(self.view, percent, stage)
+        return True
+
+    def run(self):
+        try:
+            if not self._stage(0, "Reading"):
+                return
+            image_bytes = np.fromfile(self.filename, dtype=np.uint8)
+
+            if not self._stage(20, "Decoding"):
+                return
+            loaded = image_loader.load_image(self.filename, data=image_bytes)
+            if loaded is None:
+                self.signals.failed.emit(self.view, "Could not read the image.")
+                return
+
+            if not self._stage(40, "Detecting keypoints"):
+                return
+            landmarks, keypoints = self.detect(loaded, image_bytes)
+
+            if not self._stage(100, "Done"):
+                return
+            self.signals.finished.emit(self.view, loaded, landmarks, keypoints)
+        except Exception as error:
+            self.signals.failed.emit(self.view, str(error))
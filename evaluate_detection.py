@@ -0,0 +1,292 @@
+"""Accuracy versus latency of automatic detection across detection settings.
+
+Takes a labeled set: a manifest CSV with the columns subject_id, front,
+side and labels, where labels is a CSV saved by manual_set.py (height,
+gender and the hand-placed points of both views, in original image
+coordinates). Optional chest_cm and waist_cm columns hold tape
+measurements; without them the reference circumferences are computed
+from the hand-placed points, so the cm error is what detection alone
+adds. Paths are relative to the manifest.
+
+Every combination of the given settings runs on its own worker process.
+For each it reports the detection rate, per-point pixel error against the
+hand-placed points, chest and waist error in cm and per-image latency,
+and with --max-cm-error names the fastest combination within the bar.
+
+    python evaluate_detection.py --manifest labeled.csv --model-complexity 0,1,2 --inference-size 512,auto,0
+    python evaluate_detection.py --manifest labeled.csv --min-detection-confidence 0.3,0.5 --max-cm-error 3
+
+Latency is measured while the other combinations run alongside; use
+--workers 1 for undisturbed timings.
+"""
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import measurement
+from batch_measure import parse_gender, parse_inference_size
+
+VIEWS = ("front", "side")
+LABELS = {"front": measurement.POINT_FRONT_LABELS, "side": measurement.POINT_SIDE_LABELS}
+
+
+def read_manual_set_csv(path):
+    """Gender, height, points per view and circumferences from a manual_set.py export."""
+    labeled = {"gender": None, "height": None, "front": [], "side": [], "measured": {}}
+    section = None
+    with open(path, newline='') as file:
+        for row in csv.reader(file):
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if len(row) == 1 or row[1] == "Value (cm)":
+                section = row[0].strip()
+                continue
+            if row[0] == "Point Label":
+                continue
+            if section == "User Information":
+                if row[0] == "Gender":
+                    labeled["gender"] = parse_gender(row[1])
+                elif row[0] == "Height (cm)":
+                    labeled["height"] = float(row[1])
+            elif section in ("Front Image Points", "Side Image Points"):
+                view = "front" if section.startswith("Front") else "side"
+                labeled[view].append((float(row[1]), float(row[2])))
+            elif section == "Measured Circumferences":
+                labeled["measured"][row[0]] = float(row[1])
+    for view in VIEWS:
+        if len(labeled[view]) != len(LABELS[view]):
+            raise ValueError(f"{path} has {len(labeled[view])} {view} points, expected {len(LABELS[view])}")
+    if labeled["height"] is None or labeled["gender"] is None:
+        raise ValueError(f"{path} is missing the height or gender")
+    return labeled
+
+
+def read_labeled_set(manifest_path):
+    """One dict per subject with image paths, hand-placed points and reference circumferences."""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    subjects = []
+    with open(manifest_path, newline='') as file:
+        for row in csv.DictReader(file):
+            labeled = read_manual_set_csv(os.path.join(base_dir, row["labels"]))
+            if row.get("chest_cm") and row.get("waist_cm"):
+                reference = (float(row["chest_cm"]), float(row["waist_cm"]))
+            else:
+                _, chest, waist = measurement.calculate_measurements(
+                    labeled["front"], labeled["side"], labeled["height"])
+                reference = (chest, waist)
+            subjects.append({
+                "subject_id": row["subject_id"],
+                "paths": {view: os.path.join(base_dir, row[view]) for view in VIEWS},
+                "height": labeled["height"],
+                "points": {view: labeled[view] for view in VIEWS},
+                "reference": reference,
+            })
+    return subjects
+
+
+def settings_grid(args):
+    """Every combination of the requested settings as create_backend keyword dicts."""
+    grid = []
+    for complexity, confidence, size in itertools.product(
+            args.model_complexity, args.min_detection_confidence, args.inference_size):
+        grid.append({"name": "mediapipe", "model_complexity": complexity,
+                     "min_detection_confidence": confidence, "inference_size": size})
+    if args.onnx_model:
+        for quantized, confidence in itertools.product((False, True), args.min_detection_confidence):
+            grid.append({"name": "onnx", "model_path": args.onnx_model, "quantized": quantized,
+                         "min_detection_confidence": confidence})
+    return grid
+
+
+def settings_label(settings):
+    if settings["name"] == "onnx":
+        return f"onnx{'-int8' if settings['quantized'] else ''} conf={settings['min_detection_confidence']}"
+    return (f"mediapipe c={settings['model_complexity']} conf={settings['min_detection_confidence']} "
+            f"size={settings['inference_size']}")
+
+
+def _evaluate_settings(settings, images):
+    """Detect every (subject_id, view, path) under one setting; runs in a worker process."""
+    import cv2
+    import image_loader
+    import pose_backends
+
+    # One process per combination already; keep OpenCV from oversubscribing the cores
+    cv2.setNumThreads(1)
+    records = []
+    with pose_backends.create_backend(**settings) as backend:
+        backend.warm_up()
+        with backend.pose() as pose:
+            for subject_id, view, path in images:
+                record = {"subject_id": subject_id, "view": view, "points": None, "error": None}
+                start = time.perf_counter()
+                loaded = image_loader.load_image(path)
+                decoded = time.perf_counter()
+                if loaded is None:
+                    record["error"] = "could not read image"
+                    records.append(record)
+                    continue
+                landmarks = measurement.detect_landmarks(pose, loaded.pixels, backend.inference_size)
+                detected = time.perf_counter()
+                record["decode_ms"] = (decoded - start) * 1000
+                record["detect_ms"] = (detected - decoded) * 1000
+                if landmarks is None:
+                    record["error"] = "no person detected"
+                else:
+                    record["points"] = measurement.map_landmarks(landmarks, view, loaded.full_shape)
+                records.append(record)
+    return records
+
+
+def summarize(settings, records, subjects):
+    """Accuracy and latency of one setting's records."""
+    by_key = {(record["subject_id"], record["view"]): record for record in records}
+    summary = {"settings": settings_label(settings)}
+    details = []
+
+    detected = [record for record in records if record["points"] is not None]
+    summary["detection_rate"] = len(detected) / len(records) if records else 0.0
+    for view in VIEWS:
+        errors, scales = [], []
+        for subject in subjects:
+            record = by_key.get((subject["subject_id"], view))
+            if record is None or record["points"] is None:
+                continue
+            truth = np.array(subject["points"][view], dtype=float)
+            offsets = np.linalg.norm(np.array(record["points"], dtype=float) - truth, axis=1)
+            errors.append(offsets)
+            # Pixel errors scale with resolution; also report them relative to body height
+            scales.append(np.linalg.norm(truth[0] - truth[-1]))
+            for label, offset in zip(LABELS[view], offsets):
+                details.append({"settings": summary["settings"], "subject_id": subject["subject_id"],
+                                "view": view, "point": label, "error_px": float(offset)})
+        errors = np.array(errors) if errors else np.full((0, len(LABELS[view])), np.nan)
+        for label, column in zip(LABELS[view], errors.T):
+            summary[f"{view} {label} px"] = float(column.mean()) if len(column) else float("nan")
+        summary[f"{view} mean px"] = float(errors.mean()) if errors.size else float("nan")
+        summary[f"{view} mean % height"] = (float((errors / np.array(scales)[:, None]).mean() * 100)
+                                            if errors.size else float("nan"))
+
+    cm_errors = []
+    for subject in subjects:
+        front = by_key.get((subject["subject_id"], "front"))
+        side = by_key.get((subject["subject_id"], "side"))
+        if not front or not side or front["points"] is None or side["points"] is None:
+            continue
+        try:
+            _, chest, waist = measurement.calculate_measurements(front["points"], side["points"], subject["height"])
+        except ValueError:
+            continue
+        cm_errors.append((chest - subject["reference"][0], waist - subject["reference"][1]))
+    cm_errors = np.array(cm_errors).reshape(-1, 2)
+    for index, name in enumerate(("chest", "waist")):
+        column = cm_errors[:, index]
+        summary[f"{name} mae cm"] = float(np.abs(column).mean()) if len(column) else float("nan")
+        summary[f"{name} bias cm"] = float(column.mean()) if len(column) else float("nan")
+    summary["measured subjects"] = len(cm_errors)
+
+    detect_ms = np.array([record["detect_ms"] for record in records if "detect_ms" in record])
+    decode_ms = np.array([record["decode_ms"] for record in records if "decode_ms" in record])
+    summary["detect p50 ms"] = float(np.median(detect_ms)) if len(detect_ms) else float("nan")
+    summary["detect p95 ms"] = float(np.percentile(detect_ms, 95)) if len(detect_ms) else float("nan")
+    summary["decode p50 ms"] = float(np.median(decode_ms)) if len(decode_ms) else float("nan")
+    return summary, details
+
+
+def choose(summaries, max_cm_error, min_detection_rate):
+    """The fastest setting whose chest and waist errors and detection rate meet the bar, or None."""
+    passing = [summary for summary in summaries
+               if summary["detection_rate"] >= min_detection_rate
+               and summary["chest mae cm"] <= max_cm_error and summary["waist mae cm"] <= max_cm_error]
+    return min(passing, key=lambda summary: summary["detect p50 ms"], default=None)
+
+
+def write_csv(path, rows):
+    with open(path, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_list(kind):
+    def parse(value):
+        return [kind(item) for item in value.split(",")]
+    return parse
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare detection settings on a labeled set.")
+    parser.add_argument("--manifest", required=True, help="CSV with subject_id, front, side, labels")
+    parser.add_argument("--model-complexity", type=parse_list(int), default=[0, 1, 2])
+    parser.add_argument("--min-detection-confidence", type=parse_list(float), default=[0.5])
+    parser.add_argument("--inference-size", type=parse_list(parse_inference_size), default=["auto"],
+                        help="comma-separated: auto, 0 for full size, or pixels")
+    parser.add_argument("--onnx-model", default=None, help="also evaluate this model, float and int8")
+    parser.add_argument("--workers", type=int, default=0, help="settings run at once; 0 for one per core")
+    parser.add_argument("--output", default="detection_evaluation.csv", help="one summary row per setting")
+    parser.add_argument("--details", default=None, help="per-point pixel errors of every image")
+    parser.add_argument("--max-cm-error", type=float, default=None,
+                        help="accuracy bar: mean absolute chest and waist error in cm")
+    parser.add_argument("--min-detection-rate", type=float, default=1.0)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    subjects = read_labeled_set(args.manifest)
+    if not subjects:
+        raise SystemExit("The manifest lists no subjects.")
+    images = [(subject["subject_id"], view, subject["paths"][view]) for subject in subjects for view in VIEWS]
+    grid = settings_grid(args)
+    workers = min(len(grid), args.workers or os.cpu_count() or 1)
+
+    summaries, details = [], []
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = {executor.submit(_evaluate_settings, settings, images): settings for settings in grid}
+        for future in as_completed(futures):
+            settings = futures[future]
+            try:
+                records = future.result()
+            except Exception as error:
+                print(f"{settings_label(settings)}: failed: {error}", file=sys.stderr)
+                continue
+            summary, setting_details = summarize(settings, records, subjects)
+            summaries.append(summary)
+            details.extend(setting_details)
+            print(f"{summary['settings']}: done", file=sys.stderr)
+    if not summaries:
+        raise SystemExit("No setting could be evaluated.")
+
+    summaries.sort(key=lambda summary: summary["detect p50 ms"])
+    print(f"{'settings':<44} {'detected':>8} {'front px':>9} {'side px':>8} "
+          f"{'chest cm':>9} {'waist cm':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    for summary in summaries:
+        print(f"{summary['settings']:<44} {summary['detection_rate']:>8.0%} {summary['front mean px']:>9.1f} "
+              f"{summary['side mean px']:>8.1f} {summary['chest mae cm']:>9.2f} {summary['waist mae cm']:>9.2f} "
+              f"{summary['detect p50 ms']:>8.1f} {summary['detect p95 ms']:>8.1f}")
+    write_csv(args.output, summaries)
+    if args.details and details:
+        write_csv(args.details, details)
+    print(f"Summary exported to {args.output}")
+
+    if args.max_cm_error is not None:
+        best = choose(summaries, args.max_cm_error, args.min_detection_rate)
+        if best is None:
+            print(f"No setting keeps chest and waist within {args.max_cm_error} cm "
+                  f"at a {args.min_detection_rate:.0%} detection rate.")
+            return 1
+        print(f"Fastest setting within {args.max_cm_error} cm: {best['settings']} "
+              f"({best['detect p50 ms']:.1f} ms per image)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""Minimal binary glTF 2.0 (.glb) writer.
+
+Accessors are appended straight from contiguous NumPy arrays into a single
+binary buffer, so writing a mesh costs a few tobytes() calls regardless of
+its vertex count.
+"""
+import json
+import struct
+
+import numpy as np
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+
+COMPONENT_TYPES = {
+    np.dtype(np.int8): 5120,
+    np.dtype(np.uint8): 5121,
+    np.dtype(np.int16): 5122,
+    np.dtype(np.uint16): 5123,
+    np.dtype(np.uint32): 5125,
+    np.dtype(np.float32): 5126,
+}
+ACCESSOR_TYPES = {1: "SCALAR", 2: "VEC2", 3: "VEC3", 4: "VEC4"}
+
+_GLB_MAGIC = 0x46546C67
+_JSON_CHUNK = 0x4E4F534A
+_BIN_CHUNK = 0x004E4942
+
+
+def _padding(length, alignment=4):
+    return -length % alignment
+
+
+class GltfBuilder:
+    """Collects meshes and nodes into one glTF document with one binary buffer."""
+
+    def __init__(self, generator="mannequin"):
+        self.gltf = {
+            "asset": {"version": "2.0", "generator": generator},
+            "scene": 0,
+            "scenes": [{"nodes": []}],
+            "nodes": [],
+            "meshes": [],
+            "accessors": [],
+            "bufferViews": [],
+            "buffers": [],
+        }
+        self._chunks = []
+        self._length = 0
+
+    def use_extension(self, name, required=False):
+        used = self.gltf.setdefault("extensionsUsed", [])
+        if name not in used:
+            used.append(name)
+        if required:
+            needed = self.gltf.setdefault("extensionsRequired", [])
+            if name not in needed:
+                needed.append(name)
+
+    def add_accessor(self, array, target=None, normalized=False, bounds=False):
+        """Append an (N,) or (N, C) array and return its accessor index.
+
+        Vertex attributes whose elements are not a multiple of four bytes
+        (e.g. int16 VEC3) are padded to a 4-byte stride as glTF requires.
+        """
+        array = np.asarray(array)
+        dtype = array.dtype.newbyteorder("<")
+        array = np.ascontiguousarray(array, dtype=dtype)
+        components = 1 if array.ndim == 1 else array.shape[1]
+        view = {"buffer": 0, "byteOffset": self._length}
+
+        data = array
+        if target == ARRAY_BUFFER and (components * dtype.itemsize) % 4:
+            padded_components = components + _padding(components * dtype.itemsize) // dtype.itemsize
+            data = np.zeros((len(array), padded_components), dtype=dtype)
+            data[:, :components] = array.reshape(len(array), components)
+            view["byteStride"] = padded_components * dtype.itemsize
+        data = data.tobytes()
+        view["byteLength"] = len(data)
+        if target is not None:
+            view["target"] = target
+        self._chunks.append(data)
+        self._chunks.append(b"\0" * _padding(len(data)))
+        self._length += len(data) + _padding(len(data))
+        self.gltf["bufferViews"].append(view)
+
+        accessor = {
+            "bufferView": len(self.gltf["bufferViews"]) - 1,
+            "componentType": COMPONENT_TYPES[np.dtype(dtype.newbyteorder("="))],
+            "count": len(array),
+            "type": ACCESSOR_TYPES[components],
+        }
+        if normalized:
+            accessor["normalized"] = True
+        if bounds:
+            flat = array.reshape(len(array), components)
+            accessor["min"] = flat.min(axis=0).tolist()
+            accessor["max"] = flat.max(axis=0).tolist()
+        self.gltf["accessors"].append(accessor)
+        return len(self.gltf["accessors"]) - 1
+
+    def add_mesh(self, attributes, indices, name=None):
+        """attributes maps glTF attribute names to accessor indices; returns the mesh index."""
+        mesh = {"primitives": [{"attributes": dict(attributes), "indices": indices, "mode": TRIANGLES}]}
+        if name:
+            mesh["name"] = name
+        self.gltf["meshes"].append(mesh)
+        return len(self.gltf["meshes"]) - 1
+
+    def add_node(self, mesh=None, name=None, in_scene=True, **fields):
+        """Add a node (extra fields such as translation or extensions are copied in)."""
+        node = dict(fields)
+        if mesh is not None:
+            node["mesh"] = mesh
+        if name:
+            node["name"] = name
+        self.gltf["nodes"].append(node)
+        index = len(self.gltf["nodes"]) - 1
+        if in_scene:
+            self.gltf["scenes"][0]["nodes"].append(index)
+        return index
+
+    def to_glb(self):
+        self.gltf["buffers"] = [{"byteLength": self._length}]
+        document = json.dumps(self.gltf, separators=(",", ":")).encode("utf-8")
+        document += b" " * _padding(len(document))
+        binary = b"".join(self._chunks)
+        total = 12 + 8 + len(document) + 8 + len(binary)
+        return b"".join((
+            struct.pack("<III", _GLB_MAGIC, 2, total),
+            struct.pack("<II", len(document), _JSON_CHUNK), document,
+            struct.pack("<II", len(binary), _BIN_CHUNK), binary,
+        ))
+
+    def write(self, path):
+        data = self.to_glb()
+        with open(path, "wb") as file:
+            file.write(data)
+        return len(data)
+
+
+def read_glb(data):
+    """(gltf dict, binary buffer) of a .glb file's contents, for tests and tools."""
+    magic, version, total = struct.unpack_from("<III", data, 0)
+    if magic != _GLB_MAGIC or version != 2:
+        raise ValueError("Not a glTF 2.0 binary")
+    json_length, _ = struct.unpack_from("<II", data, 12)
+    gltf = json.loads(data[20:20 + json_length])
+    offset = 20 + json_length
+    binary = b""
+    if offset < total:
+        bin_length, _ = struct.unpack_from("<II", data, offset)
+        binary = data[offset + 8:offset + 8 + bin_length]
+    return gltf, binary
@@ -0,0 +1,136 @@
+import struct
+
+import cv2
+import numpy as np
+
+import instrumentation
+
+# Long side, in pixels, images are decoded at for display and detection.
+# The viewer is 800x600 and detection runs at 1024px (see measurement.AUTO_INFERENCE_SIZE).
+WORKING_SIZE = 1024
+
+# Reduction factors OpenCV can apply while decoding (JPEGs decode natively at 1/2, 1/4, 1/8)
+_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Bytes read from the start of a file when only the header is needed
+_HEADER_BYTES = 64 * 1024
+
+
+def read_image_size(data):
+    """Return (height, width) parsed from a PNG, JPEG or BMP header, or None if unknown."""
+    data = bytes(data[:_HEADER_BYTES])
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        width, height = struct.unpack(">II", data[16:24])
+        return height, width
+    if data[:2] == b"BM" and len(data) >= 26:
+        width, height = struct.unpack("<ii", data[18:26])
+        return abs(height), width
+    if data[:2] == b"\xff\xd8":
+        pos = 2
+        while pos + 9 < len(data):
+            if data[pos] != 0xFF:
+                pos += 1
+                continue
+            marker = data[pos + 1]
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+                pos += 1 if marker == 0xFF else 2
+                continue
+            length = struct.unpack(">H", data[pos + 2:pos + 4])[0]
+            # Start-of-frame markers carry the image size (C4, C8 and CC are not frames)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack(">HH", data[pos + 5:pos + 9])
+                return height, width
+            pos += 2 + length
+    return None
+
+
+def select_reduction(size, working_size=WORKING_SIZE):
+    """Largest decode reduction that still leaves the long side at least working_size."""
+    if size is None or not working_size:
+        return 1
+    long_side = max(size)
+    for factor in (8, 4, 2):
+        if long_side / factor >= working_size:
+            return factor
+    return 1
+
+
+class LoadedImage:
+    """An image decoded at reduced scale, with full-resolution regions decoded on demand.
+
+    pixels holds the reduced BGR image used for display and detection.
+    full_shape is the shape of the original image; multiply reduced
+    coordinates by scale to get original image coordinates.
+    """
+
+    def __init__(self, path, data, pixels, full_shape):
+        self.path = path
+        self.data = data
+        self.pixels = pixels
+        self.full_shape = full_shape
+        self.scale = max(full_shape[:2]) / max(pixels.shape[:2])
+        self._regions = {}
+
+    def to_full(self, point):
+        """Map a point in reduced pixel coordinates to original image coordinates."""
+        return (int(point[0] * self.scale), int(point[1] * self.scale))
+
+    def to_reduced(self, point):
+        """Map a point in original image coordinates to reduced pixel coordinates."""
+        return (int(point[0] / self.scale), int(point[1] / self.scale))
+
+    def region(self, x0, y0, x1, y1):
+        """Full-resolution BGR pixels for a rectangle given in original image coordinates.
+
+        Only the crop is kept; the full decode is released straight away.
+        """
+        height, width = self.full_shape[:2]
+        x0, x1 = max(0, int(x0)), min(width, int(x1))
+        y0, y1 = max(0, int(y0)), min(height, int(y1))
+        key = (x0, y0, x1, y1)
+        if key not in self._regions:
+            if self.scale == 1:
+                self._regions[key] = self.pixels[y0:y1, x0:x1]
+            else:
+                data = self.data if self.data is not None else np.fromfile(self.path, dtype=np.uint8)
+                full = cv2.imdecode(data, cv2.IMREAD_COLOR)
+                self._regions[key] = full[y0:y1, x0:x1].copy()
+                del full
+        return self._regions[key]
+
+
+@instrumentation.timed("decode")
+def load_image(path, working_size=WORKING_SIZE, data=None):
+    """Decode an image at the smallest native reduction that keeps working_size pixels.
+
+    Pass the encoded bytes as data when they are already in memory (for
+    example because they were hashed for the keypoint cache); they are then
+    kept for later region decodes. Returns None if the file cannot be decoded.
+    """
+    if data is None:
+        with open(path, "rb") as file:
+            header = file.read(_HEADER_BYTES)
+    else:
+        header = data
+    size = read_image_size(header)
+    factor = select_reduction(size, working_size)
+
+    if data is None:
+        pixels = cv2.imread(path, _REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    else:
+        pixels = cv2.imdecode(data, _REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR))
+    if pixels is None:
+        return None
+
+    if size is None:
+        full_height, full_width = pixels.shape[:2]
+    else:
+        full_height, full_width = size
+        # EXIF rotation is applied while decoding, so follow the decoded orientation
+        if (full_height > full_width) != (pixels.shape[0] > pixels.shape[1]):
+            full_height, full_width = full_width, full_height
+    return LoadedImage(path, data, pixels, (full_height, full_width, pixels.shape[2]))
@@ -0,0 +1,207 @@
+"""Per-stage timing for the measurement pipeline.
+
+Code marks its stages with named spans:
+
+    with instrumentation.span("pose_inference"):
+        results = pose.process(rgb)
+
+    @instrumentation.timed("csv_export")
+    def export_to_csv(...):
+
+Each span's duration (time.perf_counter, so monotonic) goes into a
+histogram per stage name. Instrumentation is off by default, and a span
+is then a shared do-nothing object, so leaving spans in hot paths costs
+about a function call. Setting MANNEQUIN_METRICS=<path> turns it on for
+any tool, GUI or headless, and writes the histograms to that path at
+exit: JSON when the path ends in .json, Prometheus text otherwise.
+
+Stages used across the tools: decode, resize, color_convert, letterbox,
+pose_inference, silhouette, map_keypoints, measurement_math, estimate,
+csv_export.
+"""
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+
+ENV_VAR = "MANNEQUIN_METRICS"
+METRIC_NAME = "mannequin_stage_seconds"
+# Bucket upper bounds in seconds, from 50 microseconds to 10 seconds
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+           0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Count, sum, extremes and bucket counts of one stage's durations."""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (the max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.min if self.count else 0.0,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], self.buckets)),
+        }
+
+
+class Registry:
+    """Histograms by stage name, safe to feed from any thread."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        lines = [f"# HELP {METRIC_NAME} Time spent in each measurement pipeline stage.",
+                 f"# TYPE {METRIC_NAME} histogram"]
+        for name, stats in self.snapshot().items():
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {stats["sum"]}')
+            lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write JSON (for .json paths) or Prometheus text, replacing the file atomically."""
+        text = self.to_json() if path.endswith(".json") else self.to_prometheus()
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w") as file:
+            file.write(text)
+        os.replace(temp_path, path)
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+registry = Registry()
+_NULL_SPAN = _NullSpan()
+_enabled = False
+_export_paths = set()
+
+
+def span(name):
+    """Context manager timing one run of a stage; does nothing while disabled."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def timed(name):
+    """Decorator timing every call of a function as the named stage."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def enabled():
+    return _enabled
+
+
+def enable(export_path=None):
+    """Start recording spans; with export_path, write the histograms there at exit."""
+    global _enabled
+    _enabled = True
+    if export_path and export_path not in _export_paths:
+        _export_paths.add(export_path)
+        atexit.register(registry.write, export_path)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def snapshot():
+    return registry.snapshot()
+
+
+def write(path):
+    registry.write(path)
+
+
+def reset():
+    registry.reset()
+
+
+if os.environ.get(ENV_VAR):
+    enable(os.environ[ENV_VAR])
@@ -0,0 +1,143 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import uuid
+
+import numpy as np
+
+# magic, format version, landmark count, values per landmark, image height, image width
+_HEADER = struct.Struct("<4sBHHII")
+_MAGIC = b"MKPC"
+_VERSION = 1
+_SUFFIX = ".kpc"
+
+
+class KeypointCache:
+    """On-disk cache of pose landmarks keyed by image content and model settings.
+
+    Each entry is one small binary file: a fixed header followed by the
+    landmarks as little-endian float32. Entries are evicted least recently
+    used first once the directory grows past max_bytes. A detection that
+    found no person is cached too, so it is not retried.
+    """
+
+    def __init__(self, directory, settings=None, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.settings = dict(settings or {})
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # key -> [last use, size], rebuilt from the directory so the cache survives restarts
+        self._entries = {}
+        self._total_bytes = 0
+        for entry in os.scandir(directory):
+            if entry.name.endswith(_SUFFIX):
+                stat = entry.stat()
+                self._entries[entry.name[:-len(_SUFFIX)]] = [stat.st_mtime, stat.st_size]
+                self._total_bytes += stat.st_size
+
+    def make_key(self, image_bytes):
+        """Hash the encoded image bytes together with the detection settings."""
+        digest = hashlib.sha256()
+        digest.update(repr(sorted(self.settings.items())).encode())
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key):
+        """Return (landmarks, (height, width)) for a cached key, or None on a miss.
+
+        landmarks is None when the cached detection found no person.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+
+        magic, version, count, channels, height, width = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            with self._lock:
+                self.misses += 1
+            return None
+        landmarks = None
+        if count:
+            landmarks = np.frombuffer(data, dtype="<f4", count=count * channels,
+                                      offset=_HEADER.size).reshape(count, channels)
+
+        # Touch the file so eviction order survives restarts
+        now = time.time()
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+            if key not in self._entries:
+                self._entries[key] = [now, len(data)]
+                self._total_bytes += len(data)
+            self._entries[key][0] = now
+        return landmarks, (height, width)
+
+    def put(self, key, landmarks, image_shape):
+        """Store landmarks (or None for no detection) for an image of the given shape."""
+        height, width = image_shape[:2]
+        if landmarks is None:
+            count, channels, body = 0, 0, b""
+        else:
+            array = np.ascontiguousarray(landmarks, dtype="<f4")
+            count, channels = array.shape
+            body = array.tobytes()
+        data = _HEADER.pack(_MAGIC, _VERSION, count, channels, height, width) + body
+
+        # Write to a temporary name first so readers never see a partial entry
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = [time.time(), len(data)]
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _forget(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def _evict(self):
+        if self._total_bytes <= self.max_bytes:
+            return
+        # Trim a little below the limit so eviction does not run on every put
+        target = self.max_bytes * 0.9
+        for key, _ in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if self._total_bytes <= target:
+                break
+            self._forget(key)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._forget(key)
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,248 @@
+"""Parametric mannequin mesh built from body measurements.
+
+The body is a handful of lofted tubes (torso with neck and head, two legs,
+two arms). Each tube is a template of elliptical cross sections whose
+sizes come from the measurements; the sections are interpolated to the
+requested resolution and swept into a ring grid with array broadcasting,
+so no Python loop ever runs per vertex. The mesh is written as a binary
+glTF (.glb) in metres with +Y up, ready for three.js.
+
+    python mannequin_mesh.py --height 175 --chest 100 --waist 85 --gender Male --output mannequin.glb
+"""
+import argparse
+import sys
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+import coefficient_model
+import gltf_writer
+
+BODY_NAMES = (
+    "Height", "Chest Circumference", "Waist Circumference", "Hip Circumference",
+    "Neck Circumference", "Shoulder Width", "Thigh Circumference", "Inseam Length", "Arm Length"
+)
+SEGMENTS = 48
+TORSO_RINGS = 64
+LEG_RINGS = 40
+ARM_RINGS = 32
+ARM_ANGLE = np.radians(10)  # arms hang slightly away from the body
+
+_HIP_RATIO = 0.75
+_LEG_HEIGHTS = np.array([0.285, 0.20, 0.05, 0.0])           # knee, calf, ankle, sole as fractions of height
+_LEG_SIZES = np.array([1.05, 1.0, 0.62, 0.63, 0.38, 0.45])  # fractions of thigh circumference
+_LEG_RATIOS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 1.4])
+_ARM_POSITIONS = np.array([-0.06, 0.0, 0.12, 0.45, 0.6, 0.85, 0.92, 1.0])   # along the arm
+_ARM_SIZES = np.array([0.24, 0.32, 0.30, 0.24, 0.25, 0.16, 0.22, 0.12])     # fractions of chest
+_ARM_RATIOS = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 1.4, 2.2, 2.0])
+
+
+def body_measurements(height, chest_circumference, waist_circumference, gender,
+                      coefficient_set="default"):
+    """Everything build_mannequin needs, from the measured values plus the estimates."""
+    model = coefficient_model.get_model(coefficient_set)
+    values = model.evaluate_one(height, chest_circumference, waist_circumference, gender)
+    values.update({
+        "Height": height,
+        "Chest Circumference": chest_circumference,
+        "Waist Circumference": waist_circumference,
+    })
+    return {name: values[name] for name in BODY_NAMES}
+
+
+def ellipse_half_axes(circumference, depth_ratio):
+    """Half width and half depth of ellipses with the given circumference and depth/width ratio."""
+    ratio = np.asarray(depth_ratio, dtype=np.float64)
+    h = ((1 - ratio) / (1 + ratio)) ** 2
+    unit_perimeter = np.pi * (1 + ratio) * (1 + 3 * h / (10 + np.sqrt(4 - 3 * h)))
+    half_width = np.asarray(circumference, dtype=np.float64) / unit_perimeter
+    return half_width, half_width * ratio
+
+
+class Mesh:
+    """Triangle mesh as contiguous float32 positions/normals and uint32 indices."""
+
+    def __init__(self, positions, indices, normals=None):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32).reshape(-1, 3)
+        self.normals = normals if normals is not None else vertex_normals(self.positions, self.indices)
+
+    @property
+    def vertex_count(self):
+        return len(self.positions)
+
+    @property
+    def triangle_count(self):
+        return len(self.indices)
+
+    def to_glb(self, name="mannequin"):
+        builder = gltf_writer.GltfBuilder()
+        add_mesh(builder, self, name)
+        return builder.to_glb()
+
+    def write_glb(self, path, name="mannequin"):
+        data = self.to_glb(name)
+        with open(path, "wb") as file:
+            file.write(data)
+        return len(data)
+
+
+def add_mesh(builder, mesh, name=None):
+    """Add a Mesh to a GltfBuilder as one node and return the node index."""
+    index_type = np.uint16 if mesh.vertex_count <= 0xFFFF else np.uint32
+    attributes = {
+        "POSITION": builder.add_accessor(mesh.positions, gltf_writer.ARRAY_BUFFER, bounds=True),
+        "NORMAL": builder.add_accessor(mesh.normals, gltf_writer.ARRAY_BUFFER),
+    }
+    indices = builder.add_accessor(mesh.indices.astype(index_type).ravel(), gltf_writer.ELEMENT_ARRAY_BUFFER)
+    return builder.add_node(builder.add_mesh(attributes, indices, name), name)
+
+
+def vertex_normals(positions, indices):
+    """Area-weighted vertex normals, accumulated with bincount instead of a loop."""
+    corners = positions[indices]
+    face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    flat_indices = indices.ravel()
+    normals = np.empty_like(positions)
+    for axis in range(3):
+        normals[:, axis] = np.bincount(flat_indices, np.repeat(face_normals[:, axis], 3),
+                                       minlength=len(positions))
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    np.divide(normals, lengths, out=normals, where=lengths > 0)
+    return np.ascontiguousarray(normals, dtype=np.float32)
+
+
+def loft(stations, centers, half_widths, half_depths, width_axis, depth_axis, rings, segments):
+    """Sweep elliptical sections along a path into a capped tube.
+
+    stations is the increasing path parameter of each template section;
+    the sections are resampled to rings sections with a monotone cubic so
+    the surface is smooth without overshooting. Returns (positions, triangles).
+    """
+    profile = np.column_stack([centers, half_widths, half_depths])
+    samples = PchipInterpolator(stations, profile, axis=0)(np.linspace(stations[0], stations[-1], rings))
+    ring_centers, a, b = samples[:, :3], samples[:, 3], samples[:, 4]
+
+    angles = np.linspace(0, 2 * np.pi, segments, endpoint=False)
+    offsets = (np.cos(angles)[None, :, None] * a[:, None, None] * width_axis
+               + np.sin(angles)[None, :, None] * b[:, None, None] * depth_axis)
+    ring_vertices = (ring_centers[:, None, :] + offsets).reshape(-1, 3)
+    positions = np.concatenate([ring_vertices, ring_centers[[0, -1]]])
+
+    # Two triangles per grid quad, wrapping around each ring
+    ring = np.arange(rings - 1)[:, None] * segments
+    here = np.arange(segments)[None, :]
+    after = (here + 1) % segments
+    v00, v01 = ring + here, ring + after
+    v10, v11 = v00 + segments, v01 + segments
+    sides = np.stack([np.stack([v00, v10, v01], -1), np.stack([v01, v10, v11], -1)], 2).reshape(-1, 3)
+
+    start, end = len(ring_vertices), len(ring_vertices) + 1
+    last = (rings - 1) * segments
+    start_cap = np.column_stack([np.full(segments, start), here.ravel(), after.ravel()])
+    end_cap = np.column_stack([np.full(segments, end), last + after.ravel(), last + here.ravel()])
+    triangles = np.concatenate([sides, start_cap, end_cap])
+
+    # The winding above faces outward when the sections sweep along -(width x depth)
+    direction = ring_centers[-1] - ring_centers[0]
+    if np.dot(np.cross(width_axis, depth_axis), direction) > 0:
+        triangles = triangles[:, ::-1]
+    return positions, triangles
+
+
+def torso_part(m, rings, segments):
+    height = m["Height"]
+    crotch = np.clip(m["Inseam Length"], 0.35 * height, 0.55 * height)
+    waist_y, chest_y, shoulder_y = 0.62 * height, 0.72 * height, 0.80 * height
+    hip, head = m["Hip Circumference"], 0.325 * height
+    # (height, circumference, depth/width ratio) from below the crotch to the top of the head
+    sections = np.array([
+        (crotch - 0.015 * height, 0.55 * hip, 0.80),
+        (crotch, 0.85 * hip, 0.80),
+        (crotch + 0.35 * (waist_y - crotch), hip, _HIP_RATIO),
+        (waist_y, m["Waist Circumference"], 0.72),
+        (chest_y, m["Chest Circumference"], 0.68),
+        (shoulder_y, 0.0, 0.60),  # sized from the shoulder width below
+        (0.835 * height, 1.25 * m["Neck Circumference"], 0.85),
+        (0.86 * height, m["Neck Circumference"], 0.90),
+        (0.875 * height, 0.85 * head, 1.15),
+        (0.93 * height, head, 1.20),
+        (0.975 * height, 0.75 * head, 1.10),
+        (0.993 * height, 0.45 * head, 1.00),
+        (height, 0.05 * head, 1.00),
+    ])
+    heights = sections[:, 0]
+    a, b = ellipse_half_axes(sections[:, 1], sections[:, 2])
+    shoulder = 5
+    arm_radius = ellipse_half_axes(_ARM_SIZES[1] * m["Chest Circumference"], 1.0)[0]
+    a[shoulder] = max(m["Shoulder Width"] / 2 - 0.5 * arm_radius, a[shoulder - 1])
+    b[shoulder] = 0.85 * b[shoulder - 1]
+    centers = np.column_stack([np.zeros_like(heights), heights, np.zeros_like(heights)])
+    return loft(heights, centers, a, b, np.array([1.0, 0, 0]), np.array([0, 0, 1.0]), rings, segments)
+
+
+def leg_part(m, side, rings, segments):
+    height = m["Height"]
+    crotch = np.clip(m["Inseam Length"], 0.35 * height, 0.55 * height)
+    hip_half_width = ellipse_half_axes(m["Hip Circumference"], _HIP_RATIO)[0]
+    a, b = ellipse_half_axes(_LEG_SIZES * m["Thigh Circumference"], _LEG_RATIOS)
+    # Each leg starts inside the hips so the joint is hidden
+    heights = np.concatenate([[crotch + 0.05 * height, crotch - 0.05 * height], _LEG_HEIGHTS * height])
+    x = side * (hip_half_width - a[1]) * np.linspace(1.0, 0.85, len(heights))
+    # The foot section sits forward of the ankle
+    z = np.where(heights == 0, 0.3 * b[-1], 0.0)
+    centers = np.column_stack([x, heights, z])
+    return loft(-heights, centers, a, b, np.array([1.0, 0, 0]), np.array([0, 0, 1.0]), rings, segments)
+
+
+def arm_part(m, side, rings, segments):
+    height = m["Height"]
+    a, b = ellipse_half_axes(_ARM_SIZES * m["Chest Circumference"], _ARM_RATIOS)
+    direction = np.array([side * np.sin(ARM_ANGLE), -np.cos(ARM_ANGLE), 0.0])
+    shoulder = np.array([side * (m["Shoulder Width"] / 2 - 0.5 * a[1]), 0.80 * height - 0.5 * a[1], 0.0])
+    centers = shoulder + _ARM_POSITIONS[:, None] * m["Arm Length"] * direction
+    depth_axis = np.array([0, 0, 1.0])
+    width_axis = np.cross(direction, depth_axis)
+    return loft(_ARM_POSITIONS, centers, a, b, width_axis, depth_axis, rings, segments)
+
+
+def build_mannequin(measurements, segments=SEGMENTS, detail=1.0):
+    """Mesh for a dict of BODY_NAMES measurements in cm; detail scales the ring counts."""
+    missing = [name for name in BODY_NAMES if name not in measurements]
+    if missing:
+        raise ValueError(f"Measurements are missing {', '.join(missing)}")
+    m = {name: float(measurements[name]) for name in BODY_NAMES}
+    torso_rings = max(4, int(TORSO_RINGS * detail))
+    leg_rings = max(4, int(LEG_RINGS * detail))
+    arm_rings = max(4, int(ARM_RINGS * detail))
+    parts = [torso_part(m, torso_rings, segments)]
+    for side in (-1, 1):
+        parts.append(leg_part(m, side, leg_rings, segments))
+        parts.append(arm_part(m, side, arm_rings, segments))
+
+    offsets = np.cumsum([0] + [len(positions) for positions, _ in parts[:-1]])
+    positions = np.concatenate([positions for positions, _ in parts]) / 100.0  # cm -> m
+    indices = np.concatenate([triangles + offset for (_, triangles), offset in zip(parts, offsets)])
+    return Mesh(positions, indices)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a mannequin .glb from body measurements.")
+    parser.add_argument("--height", type=float, required=True, help="cm")
+    parser.add_argument("--chest", type=float, required=True, help="chest circumference in cm")
+    parser.add_argument("--waist", type=float, required=True, help="waist circumference in cm")
+    parser.add_argument("--gender", choices=("Male", "Female"), required=True)
+    parser.add_argument("--coefficient-set", default="default")
+    parser.add_argument("--output", default="mannequin.glb")
+    args = parser.parse_args(argv)
+
+    measurements = body_measurements(args.height, args.chest, args.waist, args.gender, args.coefficient_set)
+    mesh = build_mannequin(measurements)
+    size = mesh.write_glb(args.output)
+    print(f"Wrote {mesh.vertex_count} vertices, {mesh.triangle_count} triangles "
+          f"({size / 1024:.0f} KB) to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,17 +4,23 @@ import numpy as np
 import math
 import csv
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QLabel, QPushButton, QVBoxLayout,
+    QApplication, QMainWindow, QWidget, QPushButton, QVBoxLayout,
     QHBoxLayout, QFileDialog, QMessageBox, QInputDialog
 )
-from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import Qt
+import coefficient_model
+import image_loader
+import instrumentation
+from measurement_store import MeasurementStore
+from tiled_viewer import TiledImageView
 
 class MeasurementTool(QMainWindow):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Measurement Tool")
 
+        # Every calculation is appended here as well as written to the CSV
+        self.measurement_store = MeasurementStore(buffer_size=1)
+
         # Variables to hold images, points, and scale factor
         self.front_image = None
         self.side_image = None
@@ -45,9 +51,9 @@ class MeasurementTool(QMainWindow):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
 
-        self.image_label = QLabel()
-        self.image_label.setFixedSize(800, 600)
-        self.image_label.setStyleSheet("background-color: black;")
+        # Scroll to zoom, right-drag to pan; clicks arrive in original image coordinates
+        self.image_view = TiledImageView()
+        self.image_view.setFixedSize(800, 600)
 
         load_front_btn = QPushButton("Load Front Image")
         load_front_btn.clicked.connect(self.load_front_image)
@@ -68,20 +74,24 @@ class MeasurementTool(QMainWindow):
         button_layout.addWidget(calculate_btn)
 
         main_layout = QVBoxLayout()
-        main_layout.addWidget(self.image_label)
+        main_layout.addWidget(self.image_view)
         main_layout.addLayout(button_layout)
 
         central_widget.setLayout(main_layout)
-        self.image_label.mousePressEvent = self.mouse_press_event
+        self.image_view.point_clicked.connect(self.place_point)
 
     def load_front_image(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Front Image", "", "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.front_image = cv2.imread(filename)
-            self.current_image = self.front_image.copy()
+            self.front_image = image_loader.load_image(filename)
+            if self.front_image is None:
+                QMessageBox.warning(self, "Load Failed", "Could not read the image.")
+                return
+            self.current_image = self.front_image.pixels
             self.front_points.clear()
             self.point_idx = 0
             self.image_type = 'front'
+            self.image_view.set_image(self.front_image)
             self.display_image()
             if self.user_height is None:
                 self.get_user_height()  # Prompt user for their height
@@ -92,11 +102,15 @@ class MeasurementTool(QMainWindow):
     def load_side_image(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Side Image", "", "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.side_image = cv2.imread(filename)
-            self.current_image = self.side_image.copy()
+            self.side_image = image_loader.load_image(filename)
+            if self.side_image is None:
+                QMessageBox.warning(self, "Load Failed", "Could not read the image.")
+                return
+            self.current_image = self.side_image.pixels
             self.side_points.clear()
             self.point_idx = 0
             self.image_type = 'side'
+            self.image_view.set_image(self.side_image)
             self.display_image()
             if self.user_height is None:
                 self.get_user_height()  # Prompt user for their height
@@ -127,41 +141,21 @@ class MeasurementTool(QMainWindow):
 
     def display_image(self):
         if self.current_image is not None:
-            height, width, channel = self.current_image.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(self.current_image.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-            pixmap = QPixmap.fromImage(q_img)
-            self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio))
-
-    def mouse_press_event(self, event):
-        if event.button() == Qt.LeftButton and self.current_image is not None:
-            x = event.pos().x()
-            y = event.pos().y()
-            pixmap = self.image_label.pixmap()
-            if pixmap is None:
-                return
-            pixmap_size = pixmap.size()
-            label_size = self.image_label.size()
-            ratio_w = self.current_image.shape[1] / pixmap_size.width()
-            ratio_h = self.current_image.shape[0] / pixmap_size.height()
-            img_x = int(x * ratio_w)
-            img_y = int(y * ratio_h)
-            cv2.circle(self.current_image, (img_x, img_y), 5, (0, 0, 255), -1)
+            if self.image_type == 'front':
+                self.image_view.set_points(self.front_points, self.point_front_labels)
+            else:
+                self.image_view.set_points(self.side_points, self.point_side_labels)
 
+    def place_point(self, img_x, img_y):
+        if self.current_image is not None:
             if self.image_type == 'front':
                 if self.point_idx < len(self.point_front_labels):
-                    label = self.point_front_labels[self.point_idx]
-                    cv2.putText(self.current_image, label, (img_x + 10, img_y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
                     self.front_points.append((img_x, img_y))
                     self.point_idx += 1
                     self.display_image()
                     self.next_point()
             elif self.image_type == 'side':
                 if self.point_idx < len(self.point_side_labels):
-                    label = self.point_side_labels[self.point_idx]
-                    cv2.putText(self.current_image, label, (img_x + 10, img_y - 10),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
                     self.side_points.append((img_x, img_y))
                     self.point_idx += 1
                     self.display_image()
@@ -196,28 +190,29 @@ class MeasurementTool(QMainWindow):
             QMessageBox.warning(self, "Warning", "Not all side points have been selected.")
             return
 
-        # Calculate scale factors for front and side images
-        front_pixel_height = self.calculate_distance(self.front_points[0], self.front_points[-1])
-        side_pixel_height = self.calculate_distance(self.side_points[0], self.side_points[-1])
-        avg_pixel_height = (front_pixel_height + side_pixel_height) / 2
+        with instrumentation.span("measurement_math"):
+            # Calculate scale factors for front and side images
+            front_pixel_height = self.calculate_distance(self.front_points[0], self.front_points[-1])
+            side_pixel_height = self.calculate_distance(self.side_points[0], self.side_points[-1])
+            avg_pixel_height = (front_pixel_height + side_pixel_height) / 2
 
-        self.scale_factor = self.user_height / avg_pixel_height  # cm per pixel
+            self.scale_factor = self.user_height / avg_pixel_height  # cm per pixel
 
-        # Calculate chest measurements
-        chest_width_pixels = self.calculate_distance(self.front_points[1], self.front_points[2])
-        chest_depth_pixels = self.calculate_distance(self.side_points[1], self.side_points[2])
-        chest_width_cm = chest_width_pixels * self.scale_factor
-        chest_depth_cm = chest_depth_pixels * self.scale_factor
+            # Calculate chest measurements
+            chest_width_pixels = self.calculate_distance(self.front_points[1], self.front_points[2])
+            chest_depth_pixels = self.calculate_distance(self.side_points[1], self.side_points[2])
+            chest_width_cm = chest_width_pixels * self.scale_factor
+            chest_depth_cm = chest_depth_pixels * self.scale_factor
 
-        chest_circumference = self.calculate_ellipse_circumference(chest_width_cm, chest_depth_cm) * 1.1
+            chest_circumference = self.calculate_ellipse_circumference(chest_width_cm, chest_depth_cm) * 1.1
 
-        # Calculate waist measurements
-        waist_width_pixels = self.calculate_distance(self.front_points[3], self.front_points[4])
-        waist_depth_pixels = self.calculate_distance(self.side_points[3], self.side_points[4])
-        waist_width_cm = waist_width_pixels * self.scale_factor
-        waist_depth_cm = waist_depth_pixels * self.scale_factor
+            # Calculate waist measurements
+            waist_width_pixels = self.calculate_distance(self.front_points[3], self.front_points[4])
+            waist_depth_pixels = self.calculate_distance(self.side_points[3], self.side_points[4])
+            waist_width_cm = waist_width_pixels * self.scale_factor
+            waist_depth_cm = waist_depth_pixels * self.scale_factor
 
-        waist_circumference = self.calculate_ellipse_circumference(waist_width_cm, waist_depth_cm) * 1.1
+            waist_circumference = self.calculate_ellipse_circumference(waist_width_cm, waist_depth_cm) * 1.1
 
         # Collect measurements
         measurements = []
@@ -229,9 +224,17 @@ class MeasurementTool(QMainWindow):
 
         # Export to CSV
         self.export_to_csv("output_measurements.csv", measurements, estimated_measurements)
+        self.store_measurements(measurements, estimated_measurements)
 
         QMessageBox.information(self, "Calculations Complete", "Measurements calculated and saved.")
 
+    def store_measurements(self, measurements, estimated_measurements):
+        values = dict(measurements, **estimated_measurements)
+        values["Scale Factor"] = self.scale_factor
+        self.measurement_store.append(None, self.gender, self.user_height, self.front_points,
+                                      self.side_points, values, source="manual_set",
+                                      coefficient_set="manual_set")
+
     def calculate_distance(self, p1, p2):
         return math.hypot(p1[0] - p2[0], p1[1] - p2[1])
 
@@ -243,89 +246,13 @@ class MeasurementTool(QMainWindow):
         circumference = math.pi * (a + b) * (1 + (3 * h) / (10 + math.sqrt(4 - 3 * h)))
         return circumference
 
+    @instrumentation.timed("estimate")
     def estimate_measurements(self, chest_circumference, waist_circumference):
-        measurements = {}
-
-        if self.gender == 'Male':
-            # Using the estimation formulas provided for males
-
-            # Hip Circumference
-            hip_circumference = ((chest_circumference + waist_circumference) / 2) * 1.05
-            measurements['Hip Circumference'] = hip_circumference
-
-            # Shoulder Width
-            shoulder_width = (chest_circumference * 0.25) * 1.8
-            measurements['Shoulder Width'] = shoulder_width
-
-            # Sleeve Length
-            sleeve_length = (self.user_height * 0.25) * 1.4
-            measurements['Sleeve Length'] = sleeve_length
-
-            # Inseam Length
-            inseam_length = self.user_height * 0.45
-            measurements['Inseam Length'] = inseam_length
-
-            # Neck Circumference
-            neck_circumference = chest_circumference * 0.37
-            measurements['Neck Circumference'] = neck_circumference
-
-            # Arm Length
-            arm_length = self.user_height * 0.28
-            measurements['Arm Length'] = arm_length
-
-            # Thigh Circumference
-            thigh_circumference = waist_circumference * 0.68
-            measurements['Thigh Circumference'] = thigh_circumference
-
-            # Torso Length
-            torso_length = self.user_height * 0.27
-            measurements['Torso Length'] = torso_length
-
-            # Leg Length
-            leg_length = self.user_height * 0.53
-            measurements['Leg Length'] = leg_length
-
-        elif self.gender == 'Female':
-            # Adjusted estimation formulas for females
-
-            # Hip Circumference (generally larger in females)
-            hip_circumference = ((chest_circumference + waist_circumference) / 2) * 1.15
-            measurements['Hip Circumference'] = hip_circumference
-
-            # Shoulder Width (generally narrower in females)
-            shoulder_width = (chest_circumference * 0.25) * 1.6
-            measurements['Shoulder Width'] = shoulder_width
-
-            # Sleeve Length (slightly shorter)
-            sleeve_length = (self.user_height * 0.24) * 1.4
-            measurements['Sleeve Length'] = sleeve_length
-
-            # Inseam Length (slightly shorter)
-            inseam_length = self.user_height * 0.44
-            measurements['Inseam Length'] = inseam_length
-
-            # Neck Circumference (slightly smaller)
-            neck_circumference = chest_circumference * 0.35
-            measurements['Neck Circumference'] = neck_circumference
-
-            # Arm Length (slightly shorter)
-            arm_length = self.user_height * 0.30
-            measurements['Arm Length'] = arm_length
-
-            # Thigh Circumference (slightly larger)
-            thigh_circumference = waist_circumference * 0.75
-            measurements['Thigh Circumference'] = thigh_circumference
-
-            # Torso Length (slightly longer)
-            torso_length = self.user_height * 0.28
-            measurements['Torso Length'] = torso_length
-
-            # Leg Length (slightly shorter)
-            leg_length = self.user_height * 0.55
-            measurements['Leg Length'] = leg_length
-
-        return measurements
+        # This tool keeps its own coefficients, see the manual_set rows in coefficients.csv
+        model = coefficient_model.get_model("manual_set")
+        return model.evaluate_one(self.user_height, chest_circumference, waist_circumference, self.gender)
 
+    @instrumentation.timed("csv_export")
     def export_to_csv(self, filename, measurements, estimated_measurements):
         with open(filename, mode='w', newline='') as file:
             writer = csv.writer(file)
@@ -0,0 +1,466 @@
+"""Local HTTP measurement service for the web frontend.
+
+POST /measure takes a multipart/form-data upload with front and side
+image files and height (cm) and gender fields (subject_id is
+optional) and answers with the measurements as JSON.
+GET /health and GET /metrics report the queue and batching state.
+
+Pose detection is the expensive step, so images from concurrent requests
+are coalesced into micro-batches: a batch closes once it holds
+--max-batch images or the first image in it has waited --max-wait-ms,
+and the next batch collects while the current one runs. Once
+--max-queue images are waiting, new requests get 503 with Retry-After
+instead of piling up. Binds to 127.0.0.1 only.
+
+With --workers N, detection runs in N worker processes that each run
+their own batches; decoded frames reach them through shared memory (see
+shared_frames.py) rather than being pickled.
+
+    python measure_service.py --port 8765
+    python measure_service.py --workers 4 --max-queue 128
+    python measure_service.py --backend onnx --onnx-model pose_landmark_full.onnx --int8 --max-batch 32
+    curl -F front=@front.jpg -F side=@side.jpg -F height=175 -F gender=Male http://127.0.0.1:8765/measure
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import image_loader
+import instrumentation
+import measurement
+import pose_backends
+import silhouette
+from shared_frames import SharedFrameDetector
+from batch_measure import Subject, measure_points, parse_gender, parse_inference_size, result_fields
+
+HOST = "127.0.0.1"
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_HEADER_COUNT = 100
+RETRY_AFTER_SECONDS = 1
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+    500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def header_params(value):
+    """('multipart/form-data', {'boundary': ...}) from a header value with ;-separated parameters."""
+    main, *params = value.split(";")
+    parsed = {}
+    for param in params:
+        name, _, param_value = param.strip().partition("=")
+        parsed[name.lower()] = param_value.strip().strip('"')
+    return main.strip().lower(), parsed
+
+
+def parse_multipart(body, content_type):
+    """Field name -> bytes for every part of a multipart/form-data body."""
+    kind, params = header_params(content_type)
+    boundary = params.get("boundary")
+    if kind != "multipart/form-data" or not boundary:
+        raise HttpError(400, "Expected a multipart/form-data upload.")
+    # Every delimiter but the first is preceded by CRLF; prepending one makes them uniform
+    parts = (b"\r\n" + body).split(b"\r\n--" + boundary.encode("latin-1"))
+    fields = {}
+    for part in parts[1:]:
+        if part.startswith(b"--"):
+            break
+        head, separator, content = part.partition(b"\r\n\r\n")
+        if not separator:
+            raise HttpError(400, "Malformed multipart part.")
+        name = None
+        for line in head.decode("latin-1").split("\r\n"):
+            header, _, value = line.partition(":")
+            if header.strip().lower() == "content-disposition":
+                name = header_params(value)[1].get("name")
+        if name:
+            fields[name] = content
+    return fields
+
+
+class MicroBatcher:
+    """Coalesces detect requests from many coroutines into detect_batch calls.
+
+    detect_batch runs on the executor, so the event loop keeps accepting
+    requests while a batch is in flight; up to concurrency batches run at
+    once (one per worker process). pending counts images submitted but not
+    yet answered, which is what max_queue bounds.
+    """
+
+    def __init__(self, detect_batch, max_batch_size=16, max_wait=0.01, max_queue=64,
+                 executor=None, with_mask=False, concurrency=1):
+        self.detect_batch = detect_batch
+        self.concurrency = concurrency
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.executor = executor
+        self.with_mask = with_mask
+        self.pending = 0
+        self.batches = 0
+        self.images = 0
+        self.rejected = 0
+        self.largest_batch = 0
+        self.detect_seconds = 0.0
+        self._queue = None
+        self._task = None
+        self._running = set()
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def has_room(self, count=1):
+        return self.pending + count <= self.max_queue
+
+    async def detect(self, images):
+        """Detection results for the images, raising QueueFull when the queue is at its limit."""
+        if not self.has_room(len(images)):
+            self.rejected += 1
+            raise QueueFull()
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in images]
+        self.pending += len(images)
+        for image, future in zip(images, futures):
+            self._queue.put_nowait((image, future))
+        try:
+            return await asyncio.gather(*futures)
+        finally:
+            self.pending -= len(images)
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        free = asyncio.Semaphore(self.concurrency)
+        while True:
+            # Images keep queueing while every runner is busy, so the next batch starts full
+            await free.acquire()
+            batch = await self._collect()
+            # Requests that gave up (client went away) need no inference
+            batch = [(image, future) for image, future in batch if not future.done()]
+            if not batch:
+                free.release()
+                continue
+            task = loop.create_task(self._detect(batch, free))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _detect(self, batch, free):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self.detect_batch, [image for image, _ in batch], self.with_mask)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            free.release()
+        self.detect_seconds += time.perf_counter() - start
+        self.batches += 1
+        self.images += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def metrics(self):
+        return {
+            "queue_depth": self.pending,
+            "max_queue": self.max_queue,
+            "batches": self.batches,
+            "images": self.images,
+            "rejected": self.rejected,
+            "mean_batch_size": self.images / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "mean_batch_ms": self.detect_seconds / self.batches * 1000 if self.batches else 0.0,
+        }
+
+
+class MeasurementService:
+    """HTTP/1.1 front end around the headless measurement path of batch_measure."""
+
+    def __init__(self, batcher, coefficient_set="default", use_silhouette=False,
+                 max_body_bytes=MAX_BODY_BYTES):
+        self.batcher = batcher
+        self.coefficient_set = coefficient_set
+        self.use_silhouette = use_silhouette
+        self.max_body_bytes = max_body_bytes
+        self.requests = 0
+        self.failures = 0
+        self.started = time.time()
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.read_head(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except HttpError as error:
+                    await self.respond(writer, error.status, {"error": str(error)}, {}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, payload, extra = await self.dispatch(method, path, headers, reader)
+                except HttpError as error:
+                    status, payload, extra = error.status, {"error": str(error)}, error.headers
+                    # Raised before the body was read, so the connection cannot be reused
+                    keep_alive = False
+                except Exception as error:
+                    status, payload, extra = 500, {"error": str(error)}, {}
+                    keep_alive = False
+                await self.respond(writer, status, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def read_head(self, reader):
+        """(method, path, lower-cased headers) of the next request, or None at end of stream."""
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line.")
+        headers = {}
+        for _ in range(MAX_HEADER_COUNT):
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                return method.upper(), path.split("?", 1)[0], headers
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        raise HttpError(400, "Too many headers.")
+
+    async def dispatch(self, method, path, headers, reader):
+        if path == "/health":
+            return 200, {"status": "ok", "queue_depth": self.batcher.pending}, {}
+        if path == "/metrics":
+            metrics = dict(self.batcher.metrics(), requests=self.requests, failures=self.failures,
+                           uptime_seconds=time.time() - self.started)
+            if instrumentation.enabled():
+                metrics["stages"] = instrumentation.snapshot()
+            return 200, metrics, {}
+        if path != "/measure":
+            raise HttpError(404, f"No such endpoint {path}")
+        if method != "POST":
+            raise HttpError(405, "Use POST.", {"Allow": "POST"})
+
+        # Shed load before reading a multi-megabyte body that would only be rejected
+        if not self.batcher.has_room(2):
+            self.batcher.rejected += 1
+            raise HttpError(503, "Measurement queue is full, retry shortly.",
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        length = headers.get("content-length")
+        if length is None:
+            raise HttpError(411, "Content-Length is required.")
+        if not length.isdigit() or int(length) > self.max_body_bytes:
+            raise HttpError(413, f"Uploads are limited to {self.max_body_bytes} bytes.")
+        body = await reader.readexactly(int(length))
+        self.requests += 1
+        try:
+            return 200, await self.measure(parse_multipart(body, headers.get("content-type", ""))), {}
+        except HttpError as error:
+            self.failures += 1
+            return error.status, {"error": str(error)}, error.headers
+
+    async def measure(self, fields):
+        start = time.perf_counter()
+        missing = [name for name in ("front", "side", "height", "gender") if name not in fields]
+        if missing:
+            raise HttpError(400, f"Missing fields: {', '.join(missing)}")
+        try:
+            height = float(fields["height"].decode())
+            gender = parse_gender(fields["gender"].decode())
+        except ValueError as error:
+            raise HttpError(400, str(error))
+        if not height > 0:
+            raise HttpError(400, "Height must be positive.")
+        subject_id = fields.get("subject_id", b"").decode() or "request"
+
+        loop = asyncio.get_running_loop()
+        views = ("front", "side")
+        loaded = await asyncio.gather(*(
+            loop.run_in_executor(None, image_loader.load_image, None, image_loader.WORKING_SIZE,
+                                 np.frombuffer(fields[view], dtype=np.uint8))
+            for view in views))
+        for view, image in zip(views, loaded):
+            if image is None:
+                raise HttpError(400, f"Could not decode the {view} image.")
+        decoded = time.perf_counter()
+
+        try:
+            results = await self.batcher.detect([image.pixels for image in loaded])
+        except QueueFull:
+            raise HttpError(503, "Measurement queue is full, retry shortly.",
+                            {"Retry-After": str(RETRY_AFTER_SECONDS)})
+        detected = time.perf_counter()
+
+        points = {}
+        for view, image, result in zip(views, loaded, results):
+            landmarks, mask = result if self.use_silhouette else (result, None)
+            if landmarks is None:
+                raise HttpError(422, f"No person detected in the {view} image.")
+            points[view] = measurement.map_landmarks(landmarks, view, image.full_shape)
+            if mask is not None:
+                points[view] = silhouette.silhouette_points(mask, landmarks, points[view], image.full_shape)
+        subject = Subject(subject_id, None, None, height, gender)
+        try:
+            row = measure_points(subject, points["front"], points["side"], self.coefficient_set)
+        except ValueError as error:
+            raise HttpError(422, str(error))
+
+        names = [name for name in result_fields(self.coefficient_set)[4:] if not name.startswith(("Front ", "Side "))]
+        return {
+            "subject_id": subject_id,
+            "gender": gender,
+            "height": height,
+            "measurements": {name: float(row[name]) for name in names if name in row},
+            "front_points": [list(map(int, point)) for point in points["front"]],
+            "side_points": [list(map(int, point)) for point in points["side"]],
+            "timing_ms": {
+                "decode": (decoded - start) * 1000,
+                "detect": (detected - decoded) * 1000,
+                "total": (time.perf_counter() - start) * 1000,
+            },
+        }
+
+    async def respond(self, writer, status, payload, headers, keep_alive):
+        body = json.dumps(payload).encode()
+        lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                 "Content-Type: application/json",
+                 f"Content-Length: {len(body)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve(args, backend):
+    # One inference thread per batch runner: in-process there is one, and
+    # batches run back to back while the next one fills
+    runners = max(1, args.workers)
+    executor = ThreadPoolExecutor(max_workers=runners, thread_name_prefix="inference")
+    batcher = MicroBatcher(backend.detect_batch, args.max_batch, args.max_wait_ms / 1000,
+                           args.max_queue, executor, args.silhouette, runners)
+    batcher.start()
+    service = MeasurementService(batcher, args.coefficient_set, args.silhouette)
+    server = await asyncio.start_server(service.handle_connection, HOST, args.port, backlog=args.backlog)
+    print(f"Listening on http://{HOST}:{args.port}", file=sys.stderr)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.stop()
+        executor.shutdown(wait=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve measurements over HTTP on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--backlog", type=int, default=256, help="pending TCP connections")
+    parser.add_argument("--max-batch", type=int, default=16, help="images per pose inference batch")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0,
+                        help="longest an image waits for its batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64,
+                        help="images waiting or in flight before requests are turned away with 503")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="detection processes fed through shared memory; 0 detects in-process")
+    parser.add_argument("--backend", default="mediapipe", choices=pose_backends.BACKENDS)
+    parser.add_argument("--onnx-model", default=None)
+    parser.add_argument("--int8", action="store_true")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--model-complexity", type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument("--min-detection-confidence", type=float, default=0.5)
+    parser.add_argument("--inference-size", type=parse_inference_size, default="auto")
+    parser.add_argument("--silhouette", action="store_true",
+                        help="measure chest and waist from the person mask")
+    parser.add_argument("--coefficient-set", default="default")
+    args = parser.parse_args(argv)
+    if args.backend == "onnx" and not args.onnx_model:
+        parser.error("--backend onnx requires --onnx-model")
+    if args.max_queue < 2:
+        parser.error("--max-queue must hold at least one request (2 images)")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend_options = dict(
+        name=args.backend, model_complexity=args.model_complexity,
+        min_detection_confidence=args.min_detection_confidence, inference_size=args.inference_size,
+        enable_segmentation=args.silhouette, model_path=args.onnx_model, quantized=args.int8,
+        intra_op_threads=args.intra_op_threads, inter_op_threads=args.inter_op_threads,
+        batch_size=args.max_batch)
+    if args.workers:
+        # Every queued image can sit in a slot, so put() never waits on the ring
+        backend = SharedFrameDetector(args.workers, backend_options, slot_count=args.max_queue)
+    else:
+        backend = pose_backends.create_backend(**backend_options)
+        backend.warm_up()
+    with backend:
+        try:
+            asyncio.run(serve(args, backend))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
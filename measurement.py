@@ -0,0 +1,296 @@
+import math
+
+import cv2
+import numpy as np
+
+import coefficient_model
+import image_loader
+import instrumentation
+import measurement_batch
+import silhouette
+
+# Point labels shared by every tool
+POINT_FRONT_LABELS = [
+    "Top of Head", "Left Chest", "Right Chest",
+    "Left Waist", "Right Waist", "Bottom of Feet"
+]
+POINT_SIDE_LABELS = [
+    "Top of Head", "Chest Front", "Chest Back",
+    "Waist Front", "Waist Back", "Bottom of Feet"
+]
+
+# Long side in pixels that detection runs at when the inference size is "auto".
+# The pose model itself works on a 256px crop, so larger inputs only cost time.
+AUTO_INFERENCE_SIZE = 1024
+
+
+def select_inference_size(image_shape, inference_size="auto"):
+    """Return the long side to downscale to before detection, or None to keep the image as-is.
+
+    inference_size is "auto", a long side in pixels, or 0/None for full resolution.
+    """
+    if inference_size == "auto":
+        inference_size = AUTO_INFERENCE_SIZE
+        # Not worth resampling images that are only slightly larger
+        if max(image_shape[:2]) <= inference_size * 1.25:
+            return None
+    if not inference_size or max(image_shape[:2]) <= inference_size:
+        return None
+    return int(inference_size)
+
+
+def detect_landmarks(pose, image, inference_size="auto", with_mask=False):
+    """Run a MediaPipe Pose instance, or any backend from pose_backends, on a BGR image.
+
+    Large images are downscaled to the inference size first. The landmarks
+    are normalized, so they map straight back onto the full-resolution image.
+
+    Returns a (33, 4) float array of normalized x, y, z and visibility,
+    or None when no person was found. With with_mask (the pose needs
+    enable_segmentation) returns (landmarks, mask) instead, the mask being
+    a float array at the size detection ran at.
+    """
+    if hasattr(pose, "detect_batch"):
+        return pose.detect_batch([image], with_mask)[0]
+    long_side = select_inference_size(image.shape, inference_size)
+    if long_side is not None:
+        height, width = image.shape[:2]
+        scale = long_side / max(height, width)
+        with instrumentation.span("resize"):
+            image = cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+    with instrumentation.span("color_convert"):
+        rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    with instrumentation.span("pose_inference"):
+        results = pose.process(rgb)
+    if not results.pose_landmarks:
+        return (None, None) if with_mask else None
+    landmarks = np.array(
+        [(lm.x, lm.y, lm.z, lm.visibility) for lm in results.pose_landmarks.landmark],
+        dtype=np.float32
+    )
+    if with_mask:
+        mask = results.segmentation_mask
+        return landmarks, None if mask is None else np.asarray(mask)
+    return landmarks
+
+
+def landmarks_to_keypoints(landmarks, image_shape):
+    """Convert normalized landmarks into a dict of integer pixel coordinates."""
+    height, width = image_shape[:2]
+    keypoints = {}
+    for idx, (x, y) in enumerate(landmarks[:, :2]):
+        keypoints[idx] = (int(x * width), int(y * height))
+    return keypoints
+
+
+def detect_image_points(pose, path, view, cache=None, inference_size="auto", use_silhouette=False):
+    """Load an image and map its detected keypoints to the six points for the given view.
+
+    The image is decoded at reduced scale, but the points are in original
+    image coordinates. With a KeypointCache, landmarks for previously seen
+    image bytes are returned without decoding the image or running the pose model.
+    With use_silhouette the chest and waist points are moved to the edges of
+    the person mask; that needs a pose with enable_segmentation and skips the cache.
+    """
+    if path is None:
+        raise ValueError(f"missing {view} image")
+    if use_silhouette:
+        loaded = image_loader.load_image(path)
+        if loaded is None:
+            raise ValueError(f"could not read {view} image {path}")
+        landmarks, mask = detect_landmarks(pose, loaded.pixels, inference_size, with_mask=True)
+        if landmarks is None:
+            raise ValueError(f"no person detected in {view} image")
+        if mask is None:
+            raise ValueError("silhouette measurement needs a pose with enable_segmentation")
+        points = map_landmarks(landmarks, view, loaded.full_shape)
+        return silhouette.silhouette_points(mask, landmarks, points, loaded.full_shape)
+    if cache is None:
+        loaded = image_loader.load_image(path)
+        if loaded is None:
+            raise ValueError(f"could not read {view} image {path}")
+        landmarks = detect_landmarks(pose, loaded.pixels, inference_size)
+        image_shape = loaded.full_shape
+    else:
+        landmarks, image_shape = detect_cached(
+            pose, np.fromfile(path, dtype=np.uint8), cache, view, inference_size)
+    if landmarks is None:
+        raise ValueError(f"no person detected in {view} image")
+    return map_landmarks(landmarks, view, image_shape)
+
+
+def map_landmarks(landmarks, view, image_shape):
+    """The six points of a view from normalized landmarks.
+
+    Back and three-quarter views are mapped like the front; their widths
+    are better taken from the silhouette.
+    """
+    keypoints = landmarks_to_keypoints(landmarks, image_shape)
+    if view == "side":
+        return map_keypoints_side(keypoints, landmarks, image_shape)
+    return map_keypoints_front(keypoints, image_shape)
+
+
+def detect_cached(pose, image_bytes, cache, view="image", inference_size="auto", loaded=None):
+    """Return (landmarks, full image shape) for encoded image bytes, consulting the cache first.
+
+    Pass the LoadedImage when the bytes have already been decoded so a miss
+    does not decode them again.
+    """
+    key = cache.make_key(image_bytes)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    if loaded is None:
+        loaded = image_loader.load_image(None, data=image_bytes)
+        if loaded is None:
+            raise ValueError(f"could not decode {view} image")
+    landmarks = detect_landmarks(pose, loaded.pixels, inference_size)
+    cache.put(key, landmarks, loaded.full_shape)
+    return landmarks, loaded.full_shape
+
+
+def calculate_distance(p1, p2):
+    if not p1 or not p2:
+        return 0
+    return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+
+
+@instrumentation.timed("map_keypoints")
+def map_keypoints_front(keypoints, image_shape):
+    """Map detected keypoints to the six front image points."""
+    image_height = image_shape[0]
+
+    # Top of Head: Move upward from the nose by a proportion of the distance between eyes
+    left_eye = keypoints[2]
+    right_eye = keypoints[5]
+    eye_distance = calculate_distance(left_eye, right_eye)
+    nose = keypoints[0]
+    top_of_head = (nose[0], max(0, nose[1] - int(eye_distance * 2)))
+
+    # Left Chest: Offset downward and inward from Left Shoulder
+    left_shoulder = keypoints[11]
+    left_hip = keypoints[23]
+    shoulder_to_hip_distance = calculate_distance(left_shoulder, left_hip)
+    left_chest = (
+        left_shoulder[0] + int((left_hip[0] - left_shoulder[0]) * 0.3),
+        left_shoulder[1] + int(shoulder_to_hip_distance * 0.05)
+    )
+
+    # Right Chest: Similar to Left Chest but for Right Shoulder
+    right_shoulder = keypoints[12]
+    right_hip = keypoints[24]
+    shoulder_to_hip_distance = calculate_distance(right_shoulder, right_hip)
+    right_chest = (
+        right_shoulder[0] + int((right_hip[0] - right_shoulder[0]) * 0.35),
+        right_shoulder[1] + int(shoulder_to_hip_distance * 0.05)
+    )
+
+    # Waist: Offset from each hip upward slightly
+    left_waist = (left_hip[0], left_hip[1] - int(image_height * 0.01))
+    right_waist = (right_hip[0], right_hip[1] - int(image_height * 0.01))
+
+    # Bottom of Feet: Use the lower heel and the average heel x
+    left_heel = keypoints[29]
+    right_heel = keypoints[30]
+    bottom_of_feet = (
+        int((left_heel[0] + right_heel[0]) / 2),
+        max(left_heel[1], right_heel[1])
+    )
+
+    return [top_of_head, left_chest, right_chest, left_waist, right_waist, bottom_of_feet]
+
+
+@instrumentation.timed("map_keypoints")
+def map_keypoints_side(keypoints, landmarks, image_shape):
+    """Map detected keypoints to the six side image points."""
+    image_height, image_width = image_shape[:2]
+
+    # Top of Head: highest landmark, at the nose x-coordinate
+    top_of_head = (
+        int(landmarks[0, 0] * image_width),
+        int(landmarks[:, 1].min() * image_height)
+    )
+
+    # Assume the person is facing left; adjust if necessary
+    chest_front = keypoints[12]  # Right Shoulder
+    chest_back = keypoints[11]   # Left Shoulder
+    waist_front = keypoints[24]  # Right Hip
+    waist_back = keypoints[23]   # Left Hip
+
+    left_heel = keypoints[29]
+    right_heel = keypoints[30]
+    bottom_of_feet = (
+        int((left_heel[0] + right_heel[0]) / 2),
+        max(left_heel[1], right_heel[1])
+    )
+
+    return [top_of_head, chest_front, chest_back, waist_front, waist_back, bottom_of_feet]
+
+
+def calculate_ellipse_circumference(width_cm, depth_cm):
+    a = width_cm / 2
+    b = depth_cm / 2
+    if a + b == 0:
+        return 0.0
+    h = ((a - b) ** 2) / ((a + b) ** 2)
+    return math.pi * (a + b) * (1 + (3 * h) / (10 + math.sqrt(4 - 3 * h)))
+
+
+@instrumentation.timed("measurement_math")
+def calculate_measurements(front_points, side_points, user_height):
+    """Compute the scale factor and chest/waist circumferences from front and side points.
+
+    Returns (scale_factor, chest_circumference, waist_circumference).
+    """
+    # Calculate scale factors
+    front_pixel_height = calculate_distance(front_points[0], front_points[-1])
+    side_pixel_height = calculate_distance(side_points[0], side_points[-1])
+    avg_pixel_height = (front_pixel_height + side_pixel_height) / 2
+    if avg_pixel_height == 0:
+        raise ValueError("Top of head and bottom of feet coincide.")
+    scale_factor = user_height / avg_pixel_height
+
+    # Calculate primary measurements
+    chest_width_cm = calculate_distance(front_points[1], front_points[2]) * scale_factor
+    chest_depth_cm = calculate_distance(side_points[1], side_points[2]) * scale_factor
+    chest_circumference = calculate_ellipse_circumference(chest_width_cm, chest_depth_cm) * 1.1
+
+    waist_width_cm = calculate_distance(front_points[3], front_points[4]) * scale_factor
+    waist_depth_cm = calculate_distance(side_points[3], side_points[4]) * scale_factor
+    waist_circumference = calculate_ellipse_circumference(waist_width_cm, waist_depth_cm) * 1.2
+
+    return scale_factor, chest_circumference, waist_circumference
+
+
+@instrumentation.timed("measurement_math")
+def calculate_multiview_measurements(view_points, user_height):
+    """calculate_measurements over any views of one subject, see measurement_batch.fuse_views.
+
+    view_points maps view names from measurement_batch.VIEW_ANGLES to six
+    points each. Returns (scale_factor, chest_circumference, waist_circumference).
+    """
+    unknown = [view for view in view_points if view not in measurement_batch.VIEW_ANGLES]
+    if unknown:
+        raise ValueError(f"Unknown view: {', '.join(unknown)}")
+    views = list(view_points)
+    result = measurement_batch.fuse_views(
+        [[view_points[view] for view in views]],
+        [measurement_batch.VIEW_ANGLES[view] for view in views],
+        [user_height]
+    )
+    if np.isnan(result['Scale Factor'][0]):
+        raise ValueError("Top of head and bottom of feet coincide.")
+    if np.isnan(result['Chest Circumference'][0]):
+        raise ValueError("These views cannot tell body width from depth; add a side view.")
+    return (float(result['Scale Factor'][0]), float(result['Chest Circumference'][0]),
+            float(result['Waist Circumference'][0]))
+
+
+@instrumentation.timed("estimate")
+def estimate_measurements(chest_circumference, waist_circumference, user_height, gender,
+                          coefficient_set="default"):
+    """Derived measurements from the coefficient table, see coefficient_model."""
+    model = coefficient_model.get_model(coefficient_set)
+    return model.evaluate_one(user_height, chest_circumference, waist_circumference, gender)
@@ -0,0 +1,142 @@
+"""Vectorized measurement engine.
+
+Computes the same results as measurement.calculate_measurements and
+measurement.estimate_measurements for N subjects at once. Points are
+(N, 6, 2) arrays in the POINT_FRONT_LABELS / POINT_SIDE_LABELS order.
+"""
+import numpy as np
+
+import coefficient_model
+
+# Yaw of each supported view in degrees: 0 faces the camera, 90 is side-on
+VIEW_ANGLES = {"front": 0.0, "three_quarter": 45.0, "side": 90.0, "back": 180.0}
+
+
+def distances(points, first, second):
+    """Euclidean distance between two point indices for every subject."""
+    delta = points[:, first, :] - points[:, second, :]
+    return np.sqrt(np.einsum('ij,ij->i', delta, delta))
+
+
+def ellipse_circumference(width, depth):
+    """Ramanujan's approximation for arrays of ellipse widths and depths."""
+    a = width / 2
+    b = depth / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # A zero-size section has zero circumference, as in measurement.calculate_ellipse_circumference
+        h = np.where(a + b > 0, (a - b) ** 2 / (a + b) ** 2, 0.0)
+    return np.pi * (a + b) * (1 + (3 * h) / (10 + np.sqrt(4 - 3 * h)))
+
+
+def calculate_measurements(front_points, side_points, heights):
+    """Scale factors and chest/waist sizes for N subjects.
+
+    Returns a dict of (N,) float arrays. Subjects whose head and feet
+    points coincide get NaN instead of raising.
+    """
+    front = np.asarray(front_points, dtype=np.float64)
+    side = np.asarray(side_points, dtype=np.float64)
+    heights = np.asarray(heights, dtype=np.float64)
+
+    avg_pixel_height = (distances(front, 0, 5) + distances(side, 0, 5)) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale_factor = np.where(avg_pixel_height > 0, heights / avg_pixel_height, np.nan)
+
+    chest_width = distances(front, 1, 2) * scale_factor
+    chest_depth = distances(side, 1, 2) * scale_factor
+    waist_width = distances(front, 3, 4) * scale_factor
+    waist_depth = distances(side, 3, 4) * scale_factor
+
+    return {
+        'Scale Factor': scale_factor,
+        'Chest Width': chest_width,
+        'Chest Depth': chest_depth,
+        'Waist Width': waist_width,
+        'Waist Depth': waist_depth,
+        'Chest Circumference': ellipse_circumference(chest_width, chest_depth) * 1.1,
+        'Waist Circumference': ellipse_circumference(waist_width, waist_depth) * 1.2,
+    }
+
+
+def fuse_views(points, angles, heights, valid=None):
+    """Scale factors and chest/waist ellipses fitted to N subjects seen from V views each.
+
+    points is (N, V, 6, 2) in the six-point layout, angles the yaw of each
+    view in degrees as (V,) or (N, V), and valid an optional (N, V) mask
+    of the views each subject actually has.
+
+    A body cross-section is an ellipse with half width a and half depth b;
+    a view at yaw t sees it half as wide as sqrt(A cos^2 t + B sin^2 t)
+    with A = a^2, B = b^2. The shared scale factor is the least-squares fit
+    of every view's pixel height to the real height, and A and B are then
+    the least-squares fit over the views of the scaled half widths
+    squared, solved as one batch of 2x2 normal equations. Front plus side
+    gives exactly calculate_measurements. Subjects whose views cannot
+    separate width from depth (e.g. only front and back) get NaN.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    count, views = points.shape[:2]
+    heights = np.asarray(heights, dtype=np.float64)
+    weights = np.ones((count, views)) if valid is None else np.asarray(valid, dtype=np.float64)
+    theta = np.radians(np.broadcast_to(np.asarray(angles, dtype=np.float64), (count, views)))
+
+    flat = points.reshape(count * views, 6, 2)
+    pixel_heights = distances(flat, 0, 5).reshape(count, views)
+    view_counts = weights.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_height = (weights * pixel_heights).sum(axis=1) / view_counts
+        scale_factor = np.where(mean_height > 0, heights / mean_height, np.nan)
+
+    # Scaled half widths, (N, V, 2) for chest and waist
+    half_widths = np.stack([distances(flat, 1, 2), distances(flat, 3, 4)], axis=-1).reshape(count, views, 2)
+    half_widths *= scale_factor[:, None, None] / 2
+    design = np.stack([np.cos(theta) ** 2, np.sin(theta) ** 2], axis=-1)
+    weighted = design * weights[..., None]
+    normal = np.einsum('nvi,nvj->nij', weighted, design)
+    rhs = np.einsum('nvi,nvk->nik', weighted, half_widths ** 2)
+
+    det = normal[:, 0, 0] * normal[:, 1, 1] - normal[:, 0, 1] * normal[:, 1, 0]
+    solvable = det > 1e-6 * np.maximum(view_counts, 1) ** 2
+    inverse = np.stack([np.stack([normal[:, 1, 1], -normal[:, 0, 1]], -1),
+                        np.stack([-normal[:, 1, 0], normal[:, 0, 0]], -1)], 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse /= np.where(solvable, det, np.nan)[:, None, None]
+    squared_axes = np.maximum(np.einsum('nij,njk->nik', inverse, rhs), 0)  # (N, [A, B], [chest, waist])
+
+    predicted = np.sqrt(np.einsum('nvi,nik->nvk', design, squared_axes))
+    residual = (predicted - half_widths) ** 2 * weights[..., None]
+    with np.errstate(invalid='ignore'):
+        fit_rms = np.sqrt(residual.sum(axis=(1, 2)) / (2 * view_counts))
+
+    widths = 2 * np.sqrt(squared_axes[:, 0, :])
+    depths = 2 * np.sqrt(squared_axes[:, 1, :])
+    return {
+        'Scale Factor': scale_factor,
+        'Chest Width': widths[:, 0],
+        'Chest Depth': depths[:, 0],
+        'Waist Width': widths[:, 1],
+        'Waist Depth': depths[:, 1],
+        'Chest Circumference': ellipse_circumference(widths[:, 0], depths[:, 0]) * 1.1,
+        'Waist Circumference': ellipse_circumference(widths[:, 1], depths[:, 1]) * 1.2,
+        'Fit RMS': fit_rms,
+    }
+
+
+def estimate_measurements(chest_circumference, waist_circumference, heights, genders,
+                          coefficient_set="default"):
+    """Derived measurements for N subjects, as a dict of (N,) arrays.
+
+    genders holds profile names ('Male'/'Female') or a boolean is-male mask.
+    """
+    model = coefficient_model.get_model(coefficient_set)
+    values = model.evaluate(heights, chest_circumference, waist_circumference, genders)
+    return {name: values[:, i] for i, name in enumerate(model.names)}
+
+
+def measure_all(front_points, side_points, heights, genders, coefficient_set="default"):
+    """Measured and estimated values for N subjects in one vectorized pass."""
+    results = calculate_measurements(front_points, side_points, heights)
+    results.update(estimate_measurements(
+        results['Chest Circumference'], results['Waist Circumference'], heights, genders,
+        coefficient_set))
+    return results
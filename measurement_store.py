@@ -0,0 +1,159 @@
+"""SQLite store of measurement results, one row per subject.
+
+Every tool appends to the same table instead of overwriting a CSV, so
+results from many sessions and batch runs can be queried together.
+Point lists are stored as float32 blobs and every measured and estimated
+value has its own REAL column. Rows are buffered and written with
+executemany in a single transaction per flush.
+"""
+import sqlite3
+import time
+
+import numpy as np
+
+DEFAULT_PATH = "measurements.db"
+
+MEASURED_NAMES = ("Scale Factor", "Chest Circumference", "Waist Circumference")
+ESTIMATED_NAMES = (
+    "Neck Circumference", "Shoulder Width", "Arm Length", "Sleeve Length", "Hip Circumference",
+    "Thigh Circumference", "Inseam Length", "Torso Length", "Leg Length"
+)
+
+
+def column_name(name):
+    """'Chest Circumference' -> 'chest_circumference'."""
+    return name.lower().replace(" ", "_")
+
+
+def points_to_blob(points):
+    if points is None:
+        return None
+    return np.asarray(points, dtype="<f4").tobytes()
+
+
+def blob_to_points(blob):
+    if blob is None:
+        return None
+    return np.frombuffer(blob, dtype="<f4").reshape(-1, 2)
+
+
+VALUE_NAMES = MEASURED_NAMES + ESTIMATED_NAMES
+COLUMNS = (
+    ["recorded_at", "source", "subject_id", "status", "gender", "height", "coefficient_set",
+     "front_points", "side_points"]
+    + [column_name(name) for name in VALUE_NAMES]
+)
+_INSERT = (f"INSERT INTO measurements ({', '.join(COLUMNS)}) "
+           f"VALUES ({', '.join('?' * len(COLUMNS))})")
+
+
+class MeasurementStore:
+    """Buffered appends to the measurements table of a SQLite database.
+
+    Rows collect in memory until buffer_size of them are pending, then go
+    out in one transaction. Call flush() to write earlier, and close() (or
+    leave the with block) to write the rest.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, buffer_size=1000):
+        self.path = path
+        self.buffer_size = max(1, buffer_size)
+        self._pending = []
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        value_columns = ", ".join(f"{column_name(name)} REAL" for name in VALUE_NAMES)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS measurements ("
+                "id INTEGER PRIMARY KEY, recorded_at REAL NOT NULL, source TEXT, subject_id TEXT, "
+                "status TEXT NOT NULL, gender TEXT, height REAL, coefficient_set TEXT, "
+                f"front_points BLOB, side_points BLOB, {value_columns})"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS measurements_subject ON measurements (subject_id)")
+
+    def append(self, subject_id, gender, height, front_points=None, side_points=None,
+               values=None, source="", status="ok", coefficient_set="default"):
+        """Queue one subject. values maps measured/estimated names to numbers."""
+        values = values or {}
+        unknown = set(values) - set(VALUE_NAMES)
+        if unknown:
+            raise ValueError(f"No column for {', '.join(sorted(unknown))}")
+        row = [time.time(), source, subject_id, status, gender,
+               None if height is None else float(height), coefficient_set,
+               points_to_blob(front_points), points_to_blob(side_points)]
+        row += [None if values.get(name) is None else float(values[name]) for name in VALUE_NAMES]
+        self._pending.append(row)
+        if len(self._pending) >= self.buffer_size:
+            self.flush()
+
+    def append_batch(self, subject_ids, genders, heights, front_points, side_points, results,
+                     source="", coefficient_set="default"):
+        """Write N subjects in one transaction, e.g. the dict from measurement_batch.measure_all.
+
+        front_points and side_points are (N, 6, 2) arrays and results maps
+        names to (N,) arrays. Subjects with a NaN scale factor get status 'error'.
+        """
+        self.flush()
+        count = len(subject_ids)
+        front = np.asarray(front_points, dtype="<f4")
+        side = np.asarray(side_points, dtype="<f4")
+        heights = np.asarray(heights, dtype=np.float64)
+        value_columns = [
+            np.asarray(results[name], dtype=np.float64).tolist() if name in results else [None] * count
+            for name in VALUE_NAMES
+        ]
+        scale = np.asarray(results.get("Scale Factor", np.zeros(count)), dtype=np.float64)
+        statuses = np.where(np.isnan(scale), "error", "ok").tolist()
+        now = time.time()
+        rows = (
+            [now, source, str(subject_ids[i]), statuses[i], genders[i], heights[i].item(),
+             coefficient_set, front[i].tobytes(), side[i].tobytes()]
+            + [column[i] for column in value_columns]
+            for i in range(count)
+        )
+        with self.connection:
+            self.connection.executemany(_INSERT, rows)
+
+    def flush(self):
+        if not self._pending:
+            return
+        rows, self._pending = self._pending, []
+        with self.connection:
+            self.connection.executemany(_INSERT, rows)
+
+    def read_columns(self, names=None, where="", params=()):
+        """Selected columns as a dict of arrays; point blobs come back as (N, 6, 2) float32."""
+        self.flush()
+        names = list(names or COLUMNS)
+        query = f"SELECT {', '.join(names)} FROM measurements"
+        if where:
+            query += f" WHERE {where}"
+        rows = self.connection.execute(query + " ORDER BY id", params).fetchall()
+        columns = list(zip(*rows)) if rows else [()] * len(names)
+        result = {}
+        for name, column in zip(names, columns):
+            if name in ("front_points", "side_points"):
+                result[name] = [blob_to_points(blob) for blob in column]
+                if all(points is not None for points in result[name]) and result[name]:
+                    result[name] = np.stack(result[name])
+            elif name in ("source", "subject_id", "status", "gender", "coefficient_set"):
+                result[name] = list(column)
+            else:
+                result[name] = np.array([np.nan if v is None else v for v in column], dtype=np.float64)
+        return result
+
+    def __len__(self):
+        self.flush()
+        return self.connection.execute("SELECT COUNT(*) FROM measurements").fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
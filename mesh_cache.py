@@ -0,0 +1,237 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+import mannequin_mesh
+
+# magic, format version, vertex count, triangle count
+_HEADER = struct.Struct("<4sBII")
+_MAGIC = b"MMSH"
+_VERSION = 1
+_SUFFIX = ".mesh"
+
+DEFAULT_TOLERANCE = 1.0  # cm per bucket for every measurement without its own tolerance
+OUTCOMES = ("memory", "disk", "blend", "build")
+
+
+class MeshCache:
+    """Mannequin meshes reused across customers with nearly the same measurements.
+
+    Measurements are quantized into buckets of the given tolerance (in cm)
+    and each bucket is built once, at its centre. A request is answered
+    from the in-memory LRU, then from the optional on-disk tier, then by
+    blending cached neighbours in adjacent buckets (every mesh shares one
+    topology, so this is a weighted average of vertex positions), and only
+    then by building a new mesh.
+    """
+
+    def __init__(self, tolerances=None, max_entries=256, directory=None,
+                 max_disk_bytes=512 * 1024 * 1024, blend=True, min_neighbors=2,
+                 segments=mannequin_mesh.SEGMENTS, detail=1.0):
+        tolerances = tolerances or {}
+        self.names = mannequin_mesh.BODY_NAMES
+        self.tolerances = np.array([tolerances.get(name, DEFAULT_TOLERANCE) for name in self.names])
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.blend = blend
+        self.min_neighbors = min_neighbors
+        self.segments = segments
+        self.detail = detail
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # bucket -> Mesh, least recently used first
+        self._indices = None          # topology shared by every mesh
+        self._counts = dict.fromkeys(OUTCOMES, 0)
+        self._seconds = dict.fromkeys(OUTCOMES, 0.0)
+        self.evictions = 0
+
+        self._disk = {}  # file key -> [last use, size]
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            for entry in os.scandir(directory):
+                if entry.name.endswith(_SUFFIX):
+                    stat = entry.stat()
+                    self._disk[entry.name[:-len(_SUFFIX)]] = [stat.st_mtime, stat.st_size]
+                    self._disk_bytes += stat.st_size
+
+    def bucket(self, measurements):
+        """Integer bucket coordinates of a measurement dict."""
+        missing = [name for name in self.names if name not in measurements]
+        if missing:
+            raise ValueError(f"Measurements are missing {', '.join(missing)}")
+        values = np.array([float(measurements[name]) for name in self.names])
+        return tuple(np.rint(values / self.tolerances).astype(np.int64).tolist())
+
+    def get(self, measurements):
+        """Mesh for the measurements' bucket, built only if nothing close enough is cached."""
+        start = time.perf_counter()
+        bucket = self.bucket(measurements)
+        outcome = "memory"
+        with self._lock:
+            mesh = self._memory.get(bucket)
+            if mesh is not None:
+                self._memory.move_to_end(bucket)
+        if mesh is None:
+            outcome = "disk"
+            mesh = self._read_disk(bucket)
+            if mesh is not None:
+                self._remember(bucket, mesh)
+        if mesh is None and self.blend:
+            outcome = "blend"
+            mesh = self._blend(bucket)
+        if mesh is None:
+            outcome = "build"
+            mesh = self._build(bucket)
+            self._remember(bucket, mesh)
+            self._write_disk(bucket, mesh)
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._counts[outcome] += 1
+            self._seconds[outcome] += elapsed
+        return mesh
+
+    def _build(self, bucket):
+        centre = np.array(bucket) * self.tolerances
+        mesh = mannequin_mesh.build_mannequin(dict(zip(self.names, centre)), self.segments, self.detail)
+        with self._lock:
+            if self._indices is not None and np.array_equal(self._indices, mesh.indices):
+                mesh.indices = self._indices
+            else:
+                self._indices = mesh.indices
+        return mesh
+
+    def _remember(self, bucket, mesh):
+        with self._lock:
+            self._memory[bucket] = mesh
+            self._memory.move_to_end(bucket)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self.evictions += 1
+
+    def _blend(self, bucket):
+        """Inverse-distance blend of cached meshes in the buckets adjacent to this one."""
+        with self._lock:
+            if len(self._memory) < self.min_neighbors:
+                return None
+            keys = np.array(list(self._memory))
+            meshes = list(self._memory.values())
+        offsets = keys - np.array(bucket)
+        near = np.flatnonzero(np.abs(offsets).max(axis=1) <= 1)
+        if len(near) < self.min_neighbors:
+            return None
+        # Blending only interpolates: neighbours must straddle the bucket on every axis they differ in
+        spread = offsets[near]
+        if np.any((spread.min(axis=0) > 0) | (spread.max(axis=0) < 0)):
+            return None
+
+        distances = np.linalg.norm(spread * self.tolerances, axis=1)
+        weights = 1.0 / distances
+        weights /= weights.sum()
+        positions = np.einsum('k,kij->ij', weights, np.stack([meshes[i].positions for i in near]))
+        return mannequin_mesh.Mesh(positions, meshes[near[0]].indices)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def _file_key(self, bucket):
+        digest = hashlib.sha256(repr((bucket, self.tolerances.tolist(), self.segments, self.detail)).encode())
+        return digest.hexdigest()
+
+    def _read_disk(self, bucket):
+        if not self.directory:
+            return None
+        key = self._file_key(bucket)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        magic, version, vertex_count, triangle_count = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            return None
+        offset = _HEADER.size
+        vertices = np.frombuffer(data, dtype="<f4", count=vertex_count * 6, offset=offset).reshape(-1, 6)
+        offset += vertices.nbytes
+        indices = np.frombuffer(data, dtype="<u4", count=triangle_count * 3, offset=offset).reshape(-1, 3)
+        with self._lock:
+            if self._indices is not None and np.array_equal(self._indices, indices):
+                indices = self._indices
+            now = time.time()
+            if key in self._disk:
+                self._disk[key][0] = now
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return mannequin_mesh.Mesh(vertices[:, :3], indices, np.ascontiguousarray(vertices[:, 3:]))
+
+    def _write_disk(self, bucket, mesh):
+        if not self.directory:
+            return
+        vertices = np.hstack([mesh.positions, mesh.normals]).astype("<f4")
+        data = (_HEADER.pack(_MAGIC, _VERSION, mesh.vertex_count, mesh.triangle_count)
+                + vertices.tobytes() + mesh.indices.astype("<u4").tobytes())
+        key = self._file_key(bucket)
+        path = self._path(key)
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            old = self._disk.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old[1]
+            self._disk[key] = [time.time(), len(data)]
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.max_disk_bytes:
+                target = self.max_disk_bytes * 0.9
+                for old_key, (_, size) in sorted(self._disk.items(), key=lambda item: item[1][0]):
+                    if self._disk_bytes <= target:
+                        break
+                    del self._disk[old_key]
+                    self._disk_bytes -= size
+                    try:
+                        os.remove(self._path(old_key))
+                    except FileNotFoundError:
+                        pass
+
+    def memory_bytes(self):
+        """Bytes held by cached vertex data; the shared index buffer is counted once."""
+        with self._lock:
+            meshes = list(self._memory.values())
+            shared = self._indices
+        total = sum(mesh.positions.nbytes + mesh.normals.nbytes for mesh in meshes)
+        total += sum(mesh.indices.nbytes for mesh in meshes if mesh.indices is not shared)
+        return total + (shared.nbytes if shared is not None else 0)
+
+    def metrics(self):
+        """Request counts, hit rate, mean latency per outcome and memory/disk use."""
+        with self._lock:
+            counts = dict(self._counts)
+            seconds = dict(self._seconds)
+            entries = len(self._memory)
+            disk_entries, disk_bytes = len(self._disk), self._disk_bytes
+        requests = sum(counts.values())
+        metrics = {
+            "requests": requests,
+            "hit_rate": (requests - counts["build"]) / requests if requests else 0.0,
+            "entries": entries,
+            "evictions": self.evictions,
+            "memory_bytes": self.memory_bytes(),
+            "disk_entries": disk_entries,
+            "disk_bytes": disk_bytes,
+        }
+        for outcome in OUTCOMES:
+            metrics[f"{outcome}_count"] = counts[outcome]
+            metrics[f"{outcome}_ms"] = seconds[outcome] / counts[outcome] * 1000 if counts[outcome] else 0.0
+        return metrics
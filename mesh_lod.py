@@ -0,0 +1,287 @@
+"""Level-of-detail meshes for web delivery.
+
+Meshes are simplified with quadric error metrics (Garland & Heckbert).
+Rather than collapsing one edge at a time off a priority queue, every pass
+collapses a whole batch of independent edges at once: each vertex
+nominates its cheapest valid edge, edges nominated by both of their ends
+are collapsed together, and collapses that would flip a triangle are
+refused. Everything is NumPy and sorting, so the result is deterministic.
+
+All LODs are packed into one .glb with KHR_mesh_quantization (int16
+positions, int8 normals) and 16-bit indices where they fit. The finest
+LOD is the scene node and the coarser ones are listed with MSFT_lod.
+With --split every LOD is also written to its own file, so a phone can
+download only the level it will draw.
+
+    python mesh_lod.py --obj reconstruction.obj --output lods.glb --split
+    python mesh_lod.py --height 175 --chest 100 --waist 85 --gender Male --output lods.glb
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+from scipy import sparse
+
+import gltf_writer
+import mannequin_mesh
+
+LOD_RATIOS = (1.0, 0.5, 0.2, 0.08)
+# Screen coverage below which each coarser LOD takes over (MSFT_screencoverage)
+SCREEN_COVERAGE = (0.5, 0.25, 0.1, 0.0)
+MAX_FLIP_COS = 0.2  # a collapse must keep every touched triangle within ~78 degrees of its old normal
+
+
+def face_planes(positions, faces):
+    """Unit normals, plane offsets and areas of triangles."""
+    corners = positions[faces]
+    normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    lengths = np.linalg.norm(normals, axis=1)
+    unit = normals / np.maximum(lengths, 1e-30)[:, None]
+    offsets = -np.einsum('ij,ij->i', unit, corners[:, 0])
+    return unit, offsets, lengths / 2
+
+
+def vertex_quadrics(positions, faces):
+    """(V, 4, 4) sums of the area-weighted plane quadrics around each vertex."""
+    normals, offsets, areas = face_planes(positions, faces)
+    planes = np.column_stack([normals, offsets])
+    face_quadrics = areas[:, None, None] * planes[:, :, None] * planes[:, None, :]
+    quadrics = np.zeros((len(positions), 16))
+    flat = face_quadrics.reshape(len(faces), 16)
+    for corner in range(3):
+        for component in range(16):
+            quadrics[:, component] += np.bincount(faces[:, corner], flat[:, component], minlength=len(positions))
+    return quadrics.reshape(-1, 4, 4)
+
+
+def unique_edges(faces):
+    edges = np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]])
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)
+
+
+def quadric_error(quadrics, points):
+    homogeneous = np.column_stack([points, np.ones(len(points))])
+    return np.einsum('ni,nij,nj->n', homogeneous, quadrics, homogeneous)
+
+
+def collapse_targets(quadrics, positions, edges):
+    """Cheapest position for each edge collapse and its quadric error."""
+    q = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+    a, b = positions[edges[:, 0]], positions[edges[:, 1]]
+    candidates = [a, b, (a + b) / 2]
+    # The optimum solves the 3x3 system of the quadric where it is well conditioned
+    system, rhs = q[:, :3, :3], -q[:, :3, 3]
+    solvable = np.abs(np.linalg.det(system)) > 1e-12
+    optimum = candidates[2].copy()
+    if solvable.any():
+        optimum[solvable] = np.linalg.solve(system[solvable], rhs[solvable][:, :, None])[:, :, 0]
+    candidates.append(optimum)
+    errors = np.stack([quadric_error(q, c) for c in candidates], axis=1)
+    best = errors.argmin(axis=1)
+    targets = np.stack(candidates, axis=1)[np.arange(len(edges)), best]
+    return targets, errors[np.arange(len(edges)), best]
+
+
+def decimate(mesh, target_triangles, max_passes=100):
+    """Simplified copy of a Mesh with at most about target_triangles triangles."""
+    positions = mesh.positions.astype(np.float64)
+    faces = mesh.indices.astype(np.int64)
+    vertex_count = len(positions)
+    quadrics = vertex_quadrics(positions, faces)
+    refused = set()  # edges whose collapse folded the surface; never retried
+
+    for _ in range(max_passes):
+        excess = len(faces) - target_triangles
+        if excess <= 0:
+            break
+        edges = unique_edges(faces)
+        adjacency = sparse.coo_matrix(
+            (np.ones(2 * len(edges)), (edges.ravel(), edges[:, ::-1].ravel())),
+            shape=(vertex_count, vertex_count)).tocsr()
+
+        # Boundary edges have a single triangle; their vertices stay put
+        directed = np.sort(np.concatenate([faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]]]), axis=1)
+        edge_ids = directed[:, 0] * vertex_count + directed[:, 1]
+        ids, uses = np.unique(edge_ids, return_counts=True)
+        boundary = np.zeros(vertex_count, dtype=bool)
+        boundary_edges = ids[uses == 1]
+        boundary[boundary_edges // vertex_count] = True
+        boundary[boundary_edges % vertex_count] = True
+
+        # Link condition: the ends of a collapsible edge share exactly its two opposite vertices
+        common = np.asarray((adjacency[edges[:, 0]].multiply(adjacency[edges[:, 1]])).sum(axis=1)).ravel()
+        edge_keys = edges[:, 0] * vertex_count + edges[:, 1]
+        valid = (common == 2) & ~boundary[edges[:, 0]] & ~boundary[edges[:, 1]]
+        if refused:
+            valid &= ~np.isin(edge_keys, np.fromiter(refused, dtype=np.int64, count=len(refused)))
+        edges, edge_keys = edges[valid], edge_keys[valid]
+        if not len(edges):
+            break
+
+        targets, errors = collapse_targets(quadrics, positions, edges)
+        # Each vertex nominates its cheapest edge (ties go to the lower edge index)
+        order = np.lexsort((np.arange(len(edges)), errors))
+        rank = np.empty(len(edges), dtype=np.int64)
+        rank[order] = np.arange(len(edges))
+        best = np.full(vertex_count, len(edges), dtype=np.int64)
+        np.minimum.at(best, edges[:, 0], rank)
+        np.minimum.at(best, edges[:, 1], rank)
+        chosen = np.flatnonzero((best[edges[:, 0]] == rank) & (best[edges[:, 1]] == rank))
+        # Each collapse removes about two triangles; do only as many as still needed, cheapest first
+        chosen = chosen[np.argsort(rank[chosen])][:max(1, excess // 2)]
+
+        keep, remove = edges[chosen, 0], edges[chosen, 1]
+        remap = np.arange(vertex_count)
+        remap[remove] = keep
+        new_positions = positions.copy()
+        new_positions[keep] = targets[chosen]
+        new_faces = remap[faces]
+
+        # Refuse collapses that turn any surviving triangle over
+        moved = np.zeros(vertex_count, dtype=bool)
+        moved[keep] = True
+        touched = moved[new_faces].any(axis=1)
+        alive = (new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2]) \
+            & (new_faces[:, 2] != new_faces[:, 0])
+        check = np.flatnonzero(touched & alive)
+        old_normals = face_planes(positions, faces[check])[0]
+        new_normals = face_planes(new_positions, new_faces[check])[0]
+        flipped = check[np.einsum('ij,ij->i', old_normals, new_normals) < MAX_FLIP_COS]
+        if len(flipped):
+            owner = np.full(vertex_count, -1, dtype=np.int64)
+            owner[keep] = np.arange(len(chosen))
+            bad = np.unique(owner[new_faces[flipped]])
+            bad = bad[bad >= 0]
+            refused.update(edge_keys[chosen[bad]].tolist())
+            good = np.setdiff1d(np.arange(len(chosen)), bad)
+            keep, remove = keep[good], remove[good]
+            if not len(keep):
+                continue
+            remap = np.arange(vertex_count)
+            remap[remove] = keep
+            new_positions = positions.copy()
+            new_positions[keep] = targets[chosen[good]]
+            new_faces = remap[faces]
+            alive = (new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2]) \
+                & (new_faces[:, 2] != new_faces[:, 0])
+
+        quadrics[keep] += quadrics[remove]
+        positions = new_positions
+        faces = new_faces[alive]
+
+    # Drop vertices no triangle uses any more and renumber the rest
+    used, faces = np.unique(faces, return_inverse=True)
+    return mannequin_mesh.Mesh(positions[used], faces.reshape(-1, 3))
+
+
+def build_lods(mesh, ratios=LOD_RATIOS):
+    """Meshes for each ratio of the original triangle count, finest first."""
+    lods = []
+    source = mesh
+    for ratio in ratios:
+        target = int(mesh.triangle_count * ratio)
+        # Each LOD starts from the previous one, so the work shrinks as the meshes do
+        source = source if target >= source.triangle_count else decimate(source, target)
+        lods.append(source)
+    return lods
+
+
+def quantize(mesh, centre, extent):
+    """int16 positions (normalized into [-extent, extent] around centre) and int8 normals."""
+    positions = np.rint((mesh.positions - centre) / extent * 32767).astype(np.int16)
+    normals = np.rint(np.clip(mesh.normals, -1, 1) * 127).astype(np.int8)
+    return positions, normals
+
+
+def lods_to_glb(lods, name="mannequin", coverage=SCREEN_COVERAGE):
+    """One .glb holding every LOD, quantized; the first LOD is the one in the scene."""
+    builder = gltf_writer.GltfBuilder()
+    builder.use_extension("KHR_mesh_quantization", required=True)
+    builder.use_extension("MSFT_lod")
+
+    low = np.min([lod.positions.min(axis=0) for lod in lods], axis=0)
+    high = np.max([lod.positions.max(axis=0) for lod in lods], axis=0)
+    centre = (low + high) / 2
+    # One uniform scale keeps the dequantized normals correct
+    extent = float(max((high - low).max() / 2, 1e-9))
+    transform = {"translation": centre.tolist(), "scale": [extent] * 3}
+
+    nodes = []
+    for level, lod in enumerate(lods):
+        positions, normals = quantize(lod, centre, extent)
+        index_type = np.uint16 if lod.vertex_count <= 0xFFFF else np.uint32
+        attributes = {
+            "POSITION": builder.add_accessor(positions, gltf_writer.ARRAY_BUFFER, normalized=True, bounds=True),
+            "NORMAL": builder.add_accessor(normals, gltf_writer.ARRAY_BUFFER, normalized=True),
+        }
+        indices = builder.add_accessor(lod.indices.astype(index_type).ravel(), gltf_writer.ELEMENT_ARRAY_BUFFER)
+        mesh_index = builder.add_mesh(attributes, indices, f"{name}_lod{level}")
+        nodes.append(builder.add_node(mesh_index, f"{name}_lod{level}", in_scene=level == 0, **transform))
+
+    if len(nodes) > 1:
+        base = builder.gltf["nodes"][nodes[0]]
+        base["extensions"] = {"MSFT_lod": {"ids": nodes[1:]}}
+        base["extras"] = {"MSFT_screencoverage": list(coverage[:len(nodes)])}
+    return builder.to_glb()
+
+
+def load_obj(path):
+    """Vertices and faces of a Wavefront OBJ (polygons are fanned into triangles)."""
+    vertices, faces = [], []
+    with open(path) as file:
+        for line in file:
+            if line.startswith("v "):
+                vertices.append(line.split()[1:4])
+            elif line.startswith("f "):
+                corners = [int(part.split("/")[0]) for part in line.split()[1:]]
+                for i in range(1, len(corners) - 1):
+                    faces.append((corners[0], corners[i], corners[i + 1]))
+    positions = np.array(vertices, dtype=np.float64)
+    faces = np.array(faces, dtype=np.int64)
+    faces = np.where(faces < 0, faces + len(positions), faces - 1)  # OBJ is 1-based, negatives count back
+    return mannequin_mesh.Mesh(positions, faces)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a quantized multi-LOD .glb of a body mesh.")
+    parser.add_argument("--obj", help="reconstructed mesh to simplify")
+    parser.add_argument("--height", type=float, help="cm, to build a mannequin instead")
+    parser.add_argument("--chest", type=float)
+    parser.add_argument("--waist", type=float)
+    parser.add_argument("--gender", choices=("Male", "Female"))
+    parser.add_argument("--ratios", default=",".join(str(r) for r in LOD_RATIOS),
+                        help="comma-separated triangle ratios, finest first")
+    parser.add_argument("--output", default="mannequin_lods.glb")
+    parser.add_argument("--split", action="store_true", help="also write <output>_lod<N>.glb per LOD")
+    args = parser.parse_args(argv)
+
+    if args.obj:
+        mesh = load_obj(args.obj)
+    elif None not in (args.height, args.chest, args.waist, args.gender):
+        mesh = mannequin_mesh.build_mannequin(
+            mannequin_mesh.body_measurements(args.height, args.chest, args.waist, args.gender))
+    else:
+        parser.error("give --obj or all of --height, --chest, --waist and --gender")
+
+    lods = build_lods(mesh, [float(r) for r in args.ratios.split(",")])
+    data = lods_to_glb(lods)
+    with open(args.output, "wb") as file:
+        file.write(data)
+    plain = len(mesh.to_glb())
+    stem = os.path.splitext(args.output)[0]
+    for level, lod in enumerate(lods):
+        line = f"LOD {level}: {lod.triangle_count} triangles, {lod.vertex_count} vertices"
+        if args.split:
+            level_data = lods_to_glb([lod], f"mannequin_lod{level}")
+            with open(f"{stem}_lod{level}.glb", "wb") as file:
+                file.write(level_data)
+            line += f", {len(level_data) / 1024:.0f} KB ({plain / len(level_data):.1f}x smaller)"
+        print(line)
+    print(f"Wrote {len(data) / 1024:.0f} KB to {args.output} (single float32 mesh: {plain / 1024:.0f} KB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,18 +4,41 @@ import cv2
 import numpy as np
 import math
 import csv
+import os
 import mediapipe as mp  # Added for pose estimation
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QLabel, QPushButton, QVBoxLayout,
-    QHBoxLayout, QFileDialog, QMessageBox, QInputDialog
+    QHBoxLayout, QFileDialog, QMessageBox, QInputDialog, QProgressBar
 )
 from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor
-from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtCore import Qt, QPoint, QThreadPool
+
+import instrumentation
+import measurement
+import pose_backends
+from detection_worker import DetectionTask
+from keypoint_cache import KeypointCache
+from measurement_store import MeasurementStore
+from pose_pool import PoseEstimatorPool
 
 class IntegratedMeasurementTool(QMainWindow):
-    def __init__(self):
+    def __init__(self, pose_pool=None, keypoint_cache=None, measurement_store=None):
         super().__init__()
         self.setWindowTitle("Body Measurement Tool")
+
+        # Long-lived pose estimators, shared across every image we load (any pose_backends backend)
+        self.pose_pool = pose_pool if pose_pool is not None else PoseEstimatorPool()
+        # Landmarks of photos we have already seen, keyed by file content
+        self.keypoint_cache = keypoint_cache
+        # Every calculation is appended here as well as written to the CSV
+        self.measurement_store = measurement_store if measurement_store is not None else MeasurementStore(buffer_size=1)
+
+        # Loading and detection run here so the window stays responsive;
+        # front and side images can be processed at the same time
+        self.thread_pool = QThreadPool()
+        self.thread_pool.setMaxThreadCount(2)
+        self.detection_tasks = {}     # view -> latest task for that view
+        self.running_tasks = set()    # every task not yet finished, so none is collected mid-run
         
         # Image and point variables
         self.front_image = None
@@ -35,21 +58,15 @@ class IntegratedMeasurementTool(QMainWindow):
         self.drag_point_index = -1
         
         # Point labels
-        self.point_front_labels = [
-            "Top of Head", "Left Chest", "Right Chest",
-            "Left Waist", "Right Waist", "Bottom of Feet"
-        ]
-        self.point_side_labels = [
-            "Top of Head", "Chest Front", "Chest Back",
-            "Waist Front", "Waist Back", "Bottom of Feet"
-        ]
+        self.point_front_labels = measurement.POINT_FRONT_LABELS
+        self.point_side_labels = measurement.POINT_SIDE_LABELS
         
         self.current_point_labels = []
         self.point_idx = 0
         self.image_type = 'front'
         
-        # For storing pose estimation results
-        self.pose_results = None
+        # Normalized landmarks from the last pose estimation
+        self.pose_landmarks = None
         
         self.init_ui()
 
@@ -67,11 +84,14 @@ class IntegratedMeasurementTool(QMainWindow):
         load_side_btn = QPushButton("Load Side Image")
         next_point_btn = QPushButton("Next Point")
         calculate_btn = QPushButton("Calculate Measurements")
+        self.cancel_btn = QPushButton("Cancel Detection")
+        self.cancel_btn.setEnabled(False)
         
         load_front_btn.clicked.connect(self.load_front_image)
         load_side_btn.clicked.connect(self.load_side_image)
         next_point_btn.clicked.connect(self.next_point)
         calculate_btn.clicked.connect(self.calculate_measurements)
+        self.cancel_btn.clicked.connect(self.cancel_detection)
         
         # Layouts
         button_layout = QHBoxLayout()
@@ -79,6 +99,7 @@ class IntegratedMeasurementTool(QMainWindow):
         button_layout.addWidget(load_side_btn)
         button_layout.addWidget(next_point_btn)
         button_layout.addWidget(calculate_btn)
+        button_layout.addWidget(self.cancel_btn)
         
         main_layout = QVBoxLayout()
         main_layout.addWidget(self.image_label)
@@ -86,123 +107,46 @@ class IntegratedMeasurementTool(QMainWindow):
         
         central_widget.setLayout(main_layout)
         
+        # Detection progress
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        
         # Mouse events
         self.image_label.mousePressEvent = self.mouse_press_event
         self.image_label.mouseMoveEvent = self.mouse_move_event
         self.image_label.mouseReleaseEvent = self.mouse_release_event
     
-    def detect_keypoints(self, image):
-        """Detect keypoints in the image using MediaPipe Pose."""
-        mp_pose = mp.solutions.pose
-        with mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5) as pose:
-            results = pose.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            if not results.pose_landmarks:
-                QMessageBox.warning(self, "Detection Failed", "Could not detect keypoints.")
-                return None
-            self.pose_results = results  # Store results for later use
-            keypoints = {}
-            for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                keypoints[idx] = (
-                    int(landmark.x * image.shape[1]),
-                    int(landmark.y * image.shape[0])
-                )
-            return keypoints
+    def detect_keypoints(self, image, image_bytes=None):
+        """Detect keypoints in a LoadedImage using the pose backend, in original image coordinates.
+
+        Runs on worker threads, so it must not touch any widgets or state.
+        Returns (landmarks, keypoints), both None when no person was found.
+        """
+        with self.pose_pool.pose() as pose:
+            if self.keypoint_cache is not None and image_bytes is not None:
+                landmarks, _ = measurement.detect_cached(
+                    pose, image_bytes, self.keypoint_cache,
+                    inference_size=self.pose_pool.inference_size, loaded=image)
+            else:
+                landmarks = measurement.detect_landmarks(
+                    pose, image.pixels, self.pose_pool.inference_size)
+        if landmarks is None:
+            return None, None
+        return landmarks, measurement.landmarks_to_keypoints(landmarks, image.full_shape)
 
     def map_keypoints_front(self, keypoints):
         """Map detected keypoints to front image points."""
-        # Front image mapping
-        image_height = self.front_image.shape[0]
-        image_width = self.front_image.shape[1]
-        landmarks = self.pose_results.pose_landmarks.landmark
-
-        # Top of Head: Move upward from the nose by a proportion of the distance between eyes
-        left_eye = keypoints[2]
-        right_eye = keypoints[5]
-        eye_distance = self.calculate_distance(left_eye, right_eye)
-        nose = keypoints[0]
-        top_of_head_x = nose[0]
-        top_of_head_y = max(0, nose[1] - int(eye_distance * 2))  # Adjust upward
-        top_of_head = (top_of_head_x, top_of_head_y)
-
-        # Left Chest: Offset downward and inward from Left Shoulder
-        left_shoulder = keypoints[11]
-        left_hip = keypoints[23]
-        shoulder_to_hip_distance = self.calculate_distance(left_shoulder, left_hip)
-        left_chest_x = left_shoulder[0] + int((left_hip[0] - left_shoulder[0]) * 0.3)  # Move inward
-        left_chest_y = left_shoulder[1] + int(shoulder_to_hip_distance * 0.05)  # Move downward
-        left_chest = (left_chest_x, left_chest_y)
-
-        # Right Chest: Similar to Left Chest but for Right Shoulder
-        right_shoulder = keypoints[12]
-        right_hip = keypoints[24]
-        shoulder_to_hip_distance = self.calculate_distance(right_shoulder, right_hip)
-        right_chest_x = right_shoulder[0] + int((right_hip[0] - right_shoulder[0]) * 0.35)  # Move inward
-        right_chest_y = right_shoulder[1] + int(shoulder_to_hip_distance * 0.05)  # Move downward
-        right_chest = (right_chest_x, right_chest_y)
-
-        # Left Waist: Offset from Left Hip upward slightly
-        left_waist = (left_hip[0], left_hip[1] - int(image_height * 0.01))
-
-        # Right Waist: Offset from Right Hip upward slightly
-        right_waist = (right_hip[0], right_hip[1] - int(image_height * 0.01))
-
-        # Bottom of Feet: Use the average position of both heels
-        left_heel = keypoints[29]
-        right_heel = keypoints[30]
-        bottom_of_feet_y = max(left_heel[1], right_heel[1])
-        bottom_of_feet_x = int((left_heel[0] + right_heel[0]) / 2)
-        bottom_of_feet = (bottom_of_feet_x, bottom_of_feet_y)
-
-        # Assign mapped points
-        self.front_points = [
-            top_of_head,
-            left_chest,
-            right_chest,
-            left_waist,
-            right_waist,
-            bottom_of_feet
-        ]
+        self.front_points = measurement.map_keypoints_front(keypoints, self.front_image.full_shape)
 
     def map_keypoints_side(self, keypoints):
         """Map detected keypoints to side image points."""
-        # Side image mapping
-        image_height = self.side_image.shape[0]
-        landmarks = self.pose_results.pose_landmarks.landmark
-
-        # Top of Head
-        top_of_head_y = min([int(landmark.y * image_height) for landmark in landmarks])
-        top_of_head_x = int(landmarks[0].x * self.side_image.shape[1])  # Use Nose x-coordinate
-        top_of_head = (top_of_head_x, top_of_head_y)
-
-        # Assume the person is facing left; adjust if necessary
-        # Chest Front and Chest Back both use the Shoulder point
-        chest_front = keypoints[12]  # Right Shoulder
-        chest_back = keypoints[11]   # Left Shoulder
-
-        # Waist Front and Waist Back both use the Hip point
-        waist_front = keypoints[24]  # Right Hip
-        waist_back = keypoints[23]   # Left Hip
-
-        # Bottom of Feet
-        left_heel = keypoints[29]
-        right_heel = keypoints[30]
-        bottom_of_feet_y = max(left_heel[1], right_heel[1])
-        bottom_of_feet_x = int((left_heel[0] + right_heel[0]) / 2)
-        bottom_of_feet = (bottom_of_feet_x, bottom_of_feet_y)
-
-        self.side_points = [
-            top_of_head,
-            chest_front,
-            chest_back,
-            waist_front,
-            waist_back,
-            bottom_of_feet
-        ]
+        self.side_points = measurement.map_keypoints_side(
+            keypoints, self.pose_landmarks, self.side_image.full_shape)
 
     def calculate_distance(self, p1, p2):
-        if not p1 or not p2:
-            return 0
-        return math.sqrt((p1[0] - p2[0])**2 + (p1[1] - p2[1])**2)
+        return measurement.calculate_distance(p1, p2)
         
     def display_image(self):
         if self.current_image is not None:
@@ -246,40 +190,104 @@ class IntegratedMeasurementTool(QMainWindow):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Front Image", "", 
                                                 "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.front_image = cv2.imread(filename)
-            keypoints = self.detect_keypoints(self.front_image)
-            if keypoints:
-                self.map_keypoints_front(keypoints)
-                self.current_image = self.front_image.copy()
-                self.current_points = self.front_points
-                self.current_point_labels = self.point_front_labels
-                self.image_type = 'front'
-                self.point_idx = 0
-                
-                if self.user_height is None:
-                    self.get_user_height()
-                if self.gender is None:
-                    self.get_user_gender()
-                    
-                self.display_image()
-                self.draw_points()
+            self.start_detection('front', filename)
+            
+            # Ask for user details while detection runs in the background
+            if self.user_height is None:
+                self.get_user_height()
+            if self.gender is None:
+                self.get_user_gender()
 
     def load_side_image(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Side Image", "", 
                                                 "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.side_image = cv2.imread(filename)
-            keypoints = self.detect_keypoints(self.side_image)
-            if keypoints:
-                self.map_keypoints_side(keypoints)
-                self.current_image = self.side_image.copy()
-                self.current_points = self.side_points
-                self.current_point_labels = self.point_side_labels
-                self.image_type = 'side'
-                self.point_idx = 0
-                
-                self.display_image()
-                self.draw_points()
+            self.start_detection('side', filename)
+
+    def start_detection(self, view, filename):
+        """Queue loading and keypoint detection for one view on the thread pool."""
+        previous = self.detection_tasks.get(view)
+        if previous is not None:
+            previous.cancel()
+        task = DetectionTask(view, filename, self.detect_keypoints)
+        task.signals.progress.connect(self.on_detection_progress)
+        task.signals.finished.connect(self.on_detection_finished)
+        task.signals.failed.connect(self.on_detection_failed)
+        task.signals.cancelled.connect(self.on_detection_cancelled)
+        self.detection_tasks[view] = task
+        self.running_tasks.add(task)
+        self.thread_pool.start(task)
+        self.update_detection_status()
+
+    def cancel_detection(self):
+        for task in self.detection_tasks.values():
+            task.cancel()
+
+    def _finish_task(self, view):
+        """Drop the task that sent this signal; True if it is still the latest one for its view."""
+        signals = self.sender()
+        task = next((t for t in self.running_tasks if t.signals is signals), None)
+        self.running_tasks.discard(task)
+        latest = task is not None and self.detection_tasks.get(view) is task
+        if latest:
+            del self.detection_tasks[view]
+        self.update_detection_status()
+        return latest
+
+    def update_detection_status(self):
+        running = sorted(self.detection_tasks)
+        self.cancel_btn.setEnabled(bool(running))
+        if running:
+            self.progress_bar.show()
+        else:
+            self.progress_bar.hide()
+            self.statusBar().clearMessage()
+
+    def on_detection_progress(self, view, percent, stage):
+        task = self.detection_tasks.get(view)
+        if task is None or task.signals is not self.sender():
+            return
+        self.progress_bar.setValue(percent)
+        pending = ", ".join(sorted(self.detection_tasks))
+        self.statusBar().showMessage(f"{stage} ({view} image); pending: {pending}")
+
+    def on_detection_failed(self, view, message):
+        if self._finish_task(view):
+            QMessageBox.warning(self, "Detection Failed", f"{view.capitalize()} image: {message}")
+
+    def on_detection_cancelled(self, view):
+        if self._finish_task(view):
+            self.statusBar().showMessage(f"Detection cancelled for the {view} image.", 3000)
+
+    def on_detection_finished(self, view, loaded, landmarks, keypoints):
+        if not self._finish_task(view):
+            return
+        if keypoints is None:
+            QMessageBox.warning(self, "Detection Failed", "Could not detect keypoints.")
+            return
+        self.pose_landmarks = landmarks  # Store results for later use
+        if view == 'front':
+            self.front_image = loaded
+            self.map_keypoints_front(keypoints)
+            self.current_points = self.front_points
+            self.current_point_labels = self.point_front_labels
+        else:
+            self.side_image = loaded
+            self.map_keypoints_side(keypoints)
+            self.current_points = self.side_points
+            self.current_point_labels = self.point_side_labels
+        self.current_image = loaded.pixels
+        self.image_type = view
+        self.point_idx = 0
+        
+        self.display_image()
+        self.draw_points()
+
+    def closeEvent(self, event):
+        self.cancel_detection()
+        self.thread_pool.waitForDone()
+        self.measurement_store.close()
+        super().closeEvent(event)
 
     def get_user_height(self):
         text, ok = QInputDialog.getText(self, 'Input Height', 'Enter your height in cm:')
@@ -318,24 +326,8 @@ class IntegratedMeasurementTool(QMainWindow):
         if not self._validate_measurements():
             return
 
-        # Calculate scale factors
-        front_pixel_height = self.calculate_distance(self.front_points[0], self.front_points[-1])
-        side_pixel_height = self.calculate_distance(self.side_points[0], self.side_points[-1])
-        avg_pixel_height = (front_pixel_height + side_pixel_height) / 2
-        self.scale_factor = self.user_height / avg_pixel_height
-
-        # Calculate primary measurements
-        chest_width_pixels = self.calculate_distance(self.front_points[1], self.front_points[2])
-        chest_depth_pixels = self.calculate_distance(self.side_points[1], self.side_points[2])
-        chest_width_cm = chest_width_pixels * self.scale_factor
-        chest_depth_cm = chest_depth_pixels * self.scale_factor
-        chest_circumference = self.calculate_ellipse_circumference(chest_width_cm, chest_depth_cm) * 1.1
-
-        waist_width_pixels = self.calculate_distance(self.front_points[3], self.front_points[4])
-        waist_depth_pixels = self.calculate_distance(self.side_points[3], self.side_points[4])
-        waist_width_cm = waist_width_pixels * self.scale_factor
-        waist_depth_cm = waist_depth_pixels * self.scale_factor
-        waist_circumference = self.calculate_ellipse_circumference(waist_width_cm, waist_depth_cm) * 1.2
+        self.scale_factor, chest_circumference, waist_circumference = \
+            measurement.calculate_measurements(self.front_points, self.side_points, self.user_height)
 
         # Collect and export measurements
         measurements = [
@@ -344,8 +336,15 @@ class IntegratedMeasurementTool(QMainWindow):
         ]
         estimated_measurements = self.estimate_measurements(chest_circumference, waist_circumference)
         self.export_to_csv("output_measurements.csv", measurements, estimated_measurements)
+        self.store_measurements(measurements, estimated_measurements)
         QMessageBox.information(self, "Calculations Complete", "Measurements calculated and saved.")
 
+    def store_measurements(self, measurements, estimated_measurements):
+        values = dict(measurements, **estimated_measurements)
+        values["Scale Factor"] = self.scale_factor
+        self.measurement_store.append(None, self.gender, self.user_height, self.front_points,
+                                      self.side_points, values, source="ml")
+
     def _validate_measurements(self):
         if self.user_height is None:
             QMessageBox.warning(self, "Warning", "User height is not set.")
@@ -362,38 +361,11 @@ class IntegratedMeasurementTool(QMainWindow):
         return True
 
     def calculate_ellipse_circumference(self, width_cm, depth_cm):
-        a = width_cm / 2
-        b = depth_cm / 2
-        h = ((a - b) ** 2) / ((a + b) ** 2)
-        return math.pi * (a + b) * (1 + (3 * h) / (10 + math.sqrt(4 - 3 * h)))
+        return measurement.calculate_ellipse_circumference(width_cm, depth_cm)
 
     def estimate_measurements(self, chest_circumference, waist_circumference):
-        measurements = {}
-        if self.gender == 'Male':
-            measurements.update({
-                'Hip Circumference': ((chest_circumference + waist_circumference) / 2) * 1.05,
-                'Shoulder Width': (chest_circumference * 0.25) * 1.8,
-                'Sleeve Length': (self.user_height * 0.25) * 1.4,
-                'Inseam Length': self.user_height * 0.45,
-                'Neck Circumference': chest_circumference * 0.37,
-                'Arm Length': self.user_height * 0.28,
-                'Thigh Circumference': waist_circumference * 0.7,
-                'Torso Length': self.user_height * 0.27,
-                'Leg Length': self.user_height * 0.53
-            })
-        else:  # Female
-            measurements.update({
-                'Hip Circumference': ((chest_circumference + waist_circumference) / 2) * 1.15,
-                'Shoulder Width': (chest_circumference * 0.25) * 1.75,
-                'Sleeve Length': (self.user_height * 0.24) * 1.4,
-                'Inseam Length': self.user_height * 0.46,
-                'Neck Circumference': chest_circumference * 0.39,
-                'Arm Length': self.user_height * 0.30,
-                'Thigh Circumference': waist_circumference * 0.75,
-                'Torso Length': self.user_height * 0.28,
-                'Leg Length': self.user_height * 0.55
-            })
-        return measurements
+        return measurement.estimate_measurements(
+            chest_circumference, waist_circumference, self.user_height, self.gender)
 
     def mouse_move_event(self, event):
         if self.dragging and self.current_image is not None:
@@ -408,6 +380,7 @@ class IntegratedMeasurementTool(QMainWindow):
             self.dragging = False
             self.drag_point_index = -1
 
+    @instrumentation.timed("csv_export")
     def export_to_csv(self, filename, measurements, estimated_measurements):
         with open(filename, mode='w', newline='') as file:
             writer = csv.writer(file)
@@ -445,9 +418,20 @@ class IntegratedMeasurementTool(QMainWindow):
 
 def main():
     app = QApplication(sys.argv)
-    window = IntegratedMeasurementTool()
+    # One estimator per detection thread so front and side can run together.
+    # Set MANNEQUIN_POSE_BACKEND=onnx and MANNEQUIN_ONNX_MODEL to detect on ONNX Runtime.
+    pose_pool = pose_backends.create_backend(
+        os.environ.get("MANNEQUIN_POSE_BACKEND", "mediapipe"), size=2, model_complexity=1,
+        model_path=os.environ.get("MANNEQUIN_ONNX_MODEL"),
+        quantized=os.environ.get("MANNEQUIN_ONNX_INT8") == "1"
+    )
+    pose_pool.warm_up()
+    keypoint_cache = KeypointCache("keypoint_cache", pose_pool.settings())
+    window = IntegratedMeasurementTool(pose_pool, keypoint_cache)
     window.show()
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+    pose_pool.close()
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
     main()
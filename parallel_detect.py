@@ -0,0 +1,155 @@
+import itertools
+import multiprocessing
+import os
+import queue
+import time
+
+import measurement
+
+try:
+    import resource
+except ImportError:  # Windows has no address-space limits
+    resource = None
+
+# Seconds between checks for workers that died without reporting back
+LIVENESS_INTERVAL = 1.0
+
+
+def _limit_memory(max_memory_mb):
+    if resource is None or not max_memory_mb:
+        return
+    limit = int(max_memory_mb * 1024 * 1024)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _worker_main(worker_id, task_queue, result_queue, model_complexity,
+                 min_detection_confidence, inference_size, max_memory_mb, cache_dir,
+                 use_silhouette=False):
+    """Own one warmed Pose instance and detect points for tasks until a None sentinel."""
+    import cv2
+    from keypoint_cache import KeypointCache
+    from pose_pool import PoseEstimatorPool
+
+    # One process per core already; keep OpenCV from oversubscribing it
+    cv2.setNumThreads(1)
+    _limit_memory(max_memory_mb)
+
+    with PoseEstimatorPool(model_complexity=model_complexity,
+                           min_detection_confidence=min_detection_confidence,
+                           inference_size=inference_size,
+                           enable_segmentation=use_silhouette) as pose_pool:
+        pose_pool.warm_up()
+        cache = KeypointCache(cache_dir, pose_pool.settings()) if cache_dir else None
+        with pose_pool.pose() as pose:
+            while True:
+                task = task_queue.get()
+                if task is None:
+                    break
+                subject_id, view, path = task
+                try:
+                    points = measurement.detect_image_points(
+                        pose, path, view, cache, inference_size, use_silhouette)
+                    result_queue.put((worker_id, (subject_id, view, points, None)))
+                except MemoryError:
+                    result_queue.put((worker_id, (subject_id, view, None, "worker memory cap exceeded")))
+                except Exception as error:
+                    result_queue.put((worker_id, (subject_id, view, None, str(error))))
+
+
+class ParallelDetector:
+    """Detects measurement points on many images across a pool of worker processes.
+
+    Each worker warms up its own Pose instance once and is handed
+    (subject_id, view, path) tasks one at a time on its own queue, so the
+    parent always knows which task a worker holds. Results come back in
+    completion order as (subject_id, view, points, error) tuples. A worker
+    that dies fails only the task it held and is replaced. Workers share
+    an on-disk keypoint cache when cache_dir is given.
+    """
+
+    def __init__(self, workers=None, model_complexity=1, min_detection_confidence=0.5,
+                 inference_size="auto", max_worker_memory_mb=None, cache_dir=None,
+                 use_silhouette=False):
+        self.workers = workers or os.cpu_count() or 1
+        if self.workers < 1:
+            raise ValueError("Worker count must be at least 1.")
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.inference_size = inference_size
+        self.max_worker_memory_mb = max_worker_memory_mb
+        self.cache_dir = cache_dir
+        self.use_silhouette = use_silhouette
+        self._context = multiprocessing.get_context("spawn")
+
+    def _start_worker(self, worker_id, task_queue, result_queue):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, task_queue, result_queue, self.model_complexity,
+                  self.min_detection_confidence, self.inference_size,
+                  self.max_worker_memory_mb, self.cache_dir, self.use_silhouette),
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def detect(self, tasks):
+        """Yield (subject_id, view, points, error) for every task as soon as it finishes."""
+        pending = list(reversed(list(tasks)))
+        remaining = len(pending)
+        if not remaining:
+            return
+        result_queue = self._context.Queue()
+        workers = {}   # worker id -> (process, task queue)
+        assigned = {}  # worker id -> task it holds
+        worker_ids = itertools.count()
+
+        def dispatch(worker_id):
+            task_queue = workers[worker_id][1]
+            if pending:
+                assigned[worker_id] = pending.pop()
+                task_queue.put(assigned[worker_id])
+            else:
+                task_queue.put(None)
+
+        def start_worker():
+            worker_id = next(worker_ids)
+            task_queue = self._context.Queue()
+            workers[worker_id] = (self._start_worker(worker_id, task_queue, result_queue), task_queue)
+            dispatch(worker_id)
+
+        for _ in range(min(self.workers, remaining)):
+            start_worker()
+        last_check = time.monotonic()
+        try:
+            while remaining:
+                try:
+                    worker_id, payload = result_queue.get(timeout=LIVENESS_INTERVAL)
+                except queue.Empty:
+                    pass
+                else:
+                    # A result from a worker that was already written off has been failed
+                    if assigned.pop(worker_id, None) is not None:
+                        remaining -= 1
+                        dispatch(worker_id)
+                        yield payload
+                if time.monotonic() - last_check < LIVENESS_INTERVAL:
+                    continue
+                last_check = time.monotonic()
+                # A worker killed outright (segfault, OOM killer) never reports back;
+                # fail the task it held and replace it so the rest keep draining.
+                for worker_id, (process, _) in list(workers.items()):
+                    if process.is_alive() or process.exitcode == 0:
+                        continue
+                    del workers[worker_id]
+                    process.join()
+                    task = assigned.pop(worker_id, None)
+                    if task is not None:
+                        remaining -= 1
+                        yield (task[0], task[1], None, f"worker exited with code {process.exitcode}")
+                    if pending:
+                        start_worker()
+        finally:
+            for process, _ in workers.values():
+                if process.is_alive():
+                    process.terminate()
+                process.join()
@@ -0,0 +1,79 @@
+from PyQt5.QtWidgets import QWidget, QApplication
+from PyQt5.QtGui import QPainter, QPen, QColor, QFontMetrics
+from PyQt5.QtCore import Qt, QPoint, QRect, QTimer
+
+POINT_RADIUS = 5
+
+
+class PointOverlay(QWidget):
+    """Transparent layer drawing points and labels above an image widget.
+
+    The image underneath keeps its cached pixmap; moving a point only
+    repaints the small areas around its old and new positions.
+    """
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setAttribute(Qt.WA_NoSystemBackground)
+        self.setGeometry(parent.rect())
+        self.points = []
+        self.labels = []
+
+    def set_points(self, points, labels):
+        self.points = points
+        self.labels = labels
+        self.update()
+
+    def point_rect(self, index):
+        """Area covered by a point's marker and label."""
+        x, y = self.points[index]
+        label = self.labels[index] if index < len(self.labels) else ""
+        metrics = QFontMetrics(self.font())
+        margin = POINT_RADIUS + 3
+        marker = QRect(x - margin, y - margin, margin * 2, margin * 2)
+        text = QRect(x + 10, y - 10 - metrics.ascent(),
+                     metrics.horizontalAdvance(label) + 2, metrics.height())
+        return marker.united(text)
+
+    def move_point(self, index, point):
+        """Move one point (in the shared points list) and repaint just around it."""
+        old_rect = self.point_rect(index)
+        self.points[index] = point
+        self.update(old_rect.united(self.point_rect(index)))
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        for i, point in enumerate(self.points):
+            painter.setPen(QPen(QColor(255, 0, 0), 3))
+            painter.drawEllipse(QPoint(*point), POINT_RADIUS, POINT_RADIUS)
+            if i < len(self.labels):
+                painter.setPen(QColor(0, 255, 0))
+                painter.drawText(point[0] + 10, point[1] - 10, self.labels[i])
+        painter.end()
+
+
+class MoveCoalescer:
+    """Collects mouse positions and hands only the latest to a callback once per display frame."""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self.pending = None
+        screen = QApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None else 60
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(max(1, int(1000 / (refresh_rate or 60))))
+        self.timer.timeout.connect(self.flush)
+
+    def push(self, position):
+        self.pending = position
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        self.timer.stop()
+        if self.pending is not None:
+            position, self.pending = self.pending, None
+            self.callback(position)
@@ -0,0 +1,291 @@
+"""Pose detection backends.
+
+Everything that detects landmarks takes a pose backend: an object with the
+PoseEstimatorPool interface (pose(), settings(), inference_size,
+warm_up(), detect_batch(), close()). PoseEstimatorPool is the MediaPipe
+backend. OnnxPoseBackend runs a BlazePose landmark model exported to ONNX
+on ONNX Runtime's CPU provider, with control over threads, true batched
+inference and an int8 dynamically quantized variant of the model.
+
+    python pose_backends.py --model pose_landmark_full.onnx --quantize
+    python pose_backends.py --model pose_landmark_full.onnx --compare photos/*.jpg
+"""
+import argparse
+import glob
+import hashlib
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import cv2
+import numpy as np
+
+import image_loader
+import instrumentation
+
+BACKENDS = ("mediapipe", "onnx")
+LANDMARK_COUNT = 33
+INT8_SUFFIX = ".int8.onnx"
+
+
+def create_backend(name="mediapipe", size=1, model_complexity=1, min_detection_confidence=0.5,
+                   static_image_mode=True, inference_size="auto", enable_segmentation=False,
+                   model_path=None, quantized=False, intra_op_threads=0, inter_op_threads=1,
+                   batch_size=16):
+    """Pose backend by name; the MediaPipe-only and ONNX-only options are ignored by the other."""
+    if name == "mediapipe":
+        from pose_pool import PoseEstimatorPool
+        return PoseEstimatorPool(size, model_complexity, min_detection_confidence,
+                                 static_image_mode, inference_size, enable_segmentation)
+    if name == "onnx":
+        if not model_path:
+            raise ValueError("The onnx backend needs a model path.")
+        return OnnxPoseBackend(model_path, quantized, intra_op_threads, inter_op_threads,
+                               batch_size, min_detection_confidence)
+    raise ValueError(f"Unknown pose backend {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+def quantized_path(model_path):
+    return os.path.splitext(model_path)[0] + INT8_SUFFIX
+
+
+def quantize_model(model_path, output_path=None):
+    """Write an int8 dynamically quantized copy of an ONNX model and return its path.
+
+    Weights are stored as int8 and activations are quantized on the fly, so
+    no calibration images are needed.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    output_path = output_path or quantized_path(model_path)
+    quantize_dynamic(model_path, output_path, weight_type=QuantType.QInt8)
+    return output_path
+
+
+def letterbox(image, size):
+    """Fit a BGR image into a size x size RGB float square, keeping its aspect ratio.
+
+    Returns (square, (scale, pad_x, pad_y)) to map points back with.
+    """
+    height, width = image.shape[:2]
+    scale = size / max(height, width)
+    new_width, new_height = max(1, round(width * scale)), max(1, round(height * scale))
+    resized = cv2.resize(image, (new_width, new_height),
+                         interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+    pad_x, pad_y = (size - new_width) // 2, (size - new_height) // 2
+    square = np.zeros((size, size, 3), dtype=np.float32)
+    square[pad_y:pad_y + new_height, pad_x:pad_x + new_width] = resized[:, :, ::-1]
+    square *= 1.0 / 255.0
+    return square, (scale, pad_x, pad_y)
+
+
+def _sigmoid(values):
+    return 1.0 / (1.0 + np.exp(-values))
+
+
+class OnnxPoseBackend:
+    """BlazePose landmark model on ONNX Runtime, behind the PoseEstimatorPool interface.
+
+    The model takes whole images letterboxed to its input size (there is no
+    separate person detector, so subjects should fill most of the frame, as
+    they do in measurement photos). Its outputs are recognised by shape: a
+    (N, 39 * 5) landmark tensor in input pixels, a (N, 1) pose score and
+    optionally a (N, size, size, 1) segmentation mask.
+
+    One session is shared by every thread; ONNX Runtime's run() is thread
+    safe. intra_op_threads parallelizes each operator (0 lets ONNX Runtime
+    use every core), inter_op_threads runs independent branches of the
+    graph at once.
+    """
+
+    # Landmarks are normalized to the whole image, so no downscaling beforehand
+    inference_size = None
+
+    def __init__(self, model_path, quantized=False, intra_op_threads=0, inter_op_threads=1,
+                 batch_size=16, min_detection_confidence=0.5):
+        import onnxruntime as ort
+
+        if quantized:
+            source_path = model_path
+            model_path = quantized_path(source_path)
+            if not os.path.exists(model_path):
+                quantize_model(source_path, model_path)
+        self.model_path = model_path
+        self.quantized = quantized
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.min_detection_confidence = min_detection_confidence
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        if inter_op_threads > 1:
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+        model_input = self._session.get_inputs()[0]
+        self._input_name = model_input.name
+        shape = model_input.shape
+        self._channels_last = shape[-1] == 3
+        self.input_size = int(shape[1] if self._channels_last else shape[2])
+        # A fixed batch dimension caps how many images go into one run
+        self.batch_size = shape[0] if isinstance(shape[0], int) and shape[0] > 0 else batch_size
+
+        self._outputs = {}
+        for output in self._session.get_outputs():
+            last = output.shape[-1]
+            if isinstance(last, int) and last >= LANDMARK_COUNT * 5 and last % 5 == 0 and len(output.shape) == 2:
+                self._outputs["landmarks"] = output.name
+            elif len(output.shape) == 2 and last == 1:
+                self._outputs["score"] = output.name
+            elif len(output.shape) == 4 and "mask" not in self._outputs:
+                self._outputs["mask"] = output.name
+        if "landmarks" not in self._outputs:
+            raise ValueError(f"{model_path} has no (N, 39 * 5) landmark output")
+        with open(model_path, "rb") as file:
+            self._model_digest = hashlib.sha256(file.read()).hexdigest()[:16]
+
+    def settings(self):
+        """Model settings that affect detection output, e.g. for keying caches."""
+        return {
+            "backend": "onnx",
+            "model": self._model_digest,
+            "quantized": self.quantized,
+            "min_detection_confidence": self.min_detection_confidence,
+        }
+
+    def warm_up(self):
+        self.detect_batch([np.zeros((256, 256, 3), dtype=np.uint8)])
+
+    @contextmanager
+    def pose(self, timeout=None):
+        """The backend itself stands in for a Pose instance, see measurement.detect_landmarks."""
+        yield self
+
+    def detect_batch(self, images, with_mask=False):
+        """Landmarks for each BGR image, None where no person was found.
+
+        Images are letterboxed and run batch_size at a time. With with_mask
+        each entry is (landmarks, mask) instead, the mask covering the image
+        at the model's resolution (None if the model has no mask output).
+        """
+        results = []
+        for start in range(0, len(images), self.batch_size):
+            results.extend(self._run(images[start:start + self.batch_size], with_mask))
+        return results
+
+    def _run(self, images, with_mask):
+        size = self.input_size
+        batch = np.empty((len(images), size, size, 3), dtype=np.float32)
+        frames = []
+        with instrumentation.span("letterbox"):
+            for index, image in enumerate(images):
+                batch[index], frame = letterbox(image, size)
+                frames.append(frame)
+            if not self._channels_last:
+                batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+
+        names = [self._outputs[key] for key in ("landmarks", "score", "mask") if key in self._outputs]
+        with instrumentation.span("pose_inference"):
+            outputs = dict(zip(names, self._session.run(names, {self._input_name: batch})))
+        raw = outputs[self._outputs["landmarks"]].reshape(len(images), -1, 5)[:, :LANDMARK_COUNT]
+        if "score" in self._outputs:
+            found = outputs[self._outputs["score"]].reshape(-1) >= self.min_detection_confidence
+        else:
+            found = np.ones(len(images), dtype=bool)
+
+        # Input pixels back to coordinates normalized to each original image
+        scales = np.array([frame[0] for frame in frames], dtype=np.float32)[:, None]
+        pads = np.array([frame[1:] for frame in frames], dtype=np.float32)
+        shapes = np.array([image.shape[1::-1] for image in images], dtype=np.float32)
+        landmarks = np.empty((len(images), LANDMARK_COUNT, 4), dtype=np.float32)
+        landmarks[:, :, :2] = (raw[:, :, :2] - pads[:, None]) / (scales[:, None] * shapes[:, None])
+        landmarks[:, :, 2] = raw[:, :, 2] / (scales * shapes[:, :1])
+        landmarks[:, :, 3] = _sigmoid(raw[:, :, 3])
+
+        results = []
+        for index, image in enumerate(images):
+            result = landmarks[index] if found[index] else None
+            if with_mask:
+                mask = None
+                if result is not None and "mask" in self._outputs:
+                    mask = self._crop_mask(outputs[self._outputs["mask"]][index], image.shape, frames[index])
+                result = (result, mask)
+            results.append(result)
+        return results
+
+    def _crop_mask(self, logits, image_shape, frame):
+        mask = np.squeeze(logits)
+        if mask.shape != (self.input_size, self.input_size):
+            mask = cv2.resize(mask, (self.input_size, self.input_size))
+        scale, pad_x, pad_y = frame
+        height, width = max(1, round(image_shape[0] * scale)), max(1, round(image_shape[1] * scale))
+        return _sigmoid(mask[pad_y:pad_y + height, pad_x:pad_x + width])
+
+    def close(self):
+        self._session = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def compare(model_path, paths, intra_op_threads=0, inter_op_threads=1, batch_size=16):
+    """Throughput of the float and int8 models and how far the int8 landmarks move, in pixels."""
+    images, shapes = [], []
+    for path in paths:
+        loaded = image_loader.load_image(path)
+        if loaded is not None:
+            images.append(loaded.pixels)
+            shapes.append(loaded.full_shape)
+    if not images:
+        raise SystemExit("No readable images to compare on.")
+
+    landmarks = {}
+    for quantized in (False, True):
+        backend = OnnxPoseBackend(model_path, quantized, intra_op_threads, inter_op_threads, batch_size)
+        backend.warm_up()
+        start = time.perf_counter()
+        landmarks[quantized] = backend.detect_batch(images)
+        elapsed = time.perf_counter() - start
+        label = "int8" if quantized else "float"
+        print(f"{label}: {len(images) / elapsed:.1f} images/s ({os.path.basename(backend.model_path)})")
+
+    errors = []
+    for base, fast, shape in zip(landmarks[False], landmarks[True], shapes):
+        if base is not None and fast is not None:
+            offsets = (base[:, :2] - fast[:, :2]) * (shape[1], shape[0])
+            errors.append(np.linalg.norm(offsets, axis=1))
+    if errors:
+        errors = np.concatenate(errors)
+        print(f"int8 landmark shift: mean {errors.mean():.2f}px, 95th percentile "
+              f"{np.percentile(errors, 95):.2f}px, max {errors.max():.2f}px")
+    missed = sum((base is None) != (fast is None) for base, fast in zip(landmarks[False], landmarks[True]))
+    print(f"Detection disagreements: {missed}/{len(images)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize and compare ONNX pose models.")
+    parser.add_argument("--model", required=True, help="BlazePose landmark model in ONNX format")
+    parser.add_argument("--quantize", action="store_true", help=f"write the int8 model as <model>{INT8_SUFFIX}")
+    parser.add_argument("--compare", nargs="*", default=None, metavar="IMAGE",
+                        help="time the float and int8 models on these images (globs allowed)")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--inter-op-threads", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    if args.quantize:
+        print(f"Wrote {quantize_model(args.model)}")
+    if args.compare is not None:
+        paths = [path for pattern in args.compare for path in sorted(glob.glob(pattern)) or [pattern]]
+        compare(args.model, paths, args.intra_op_threads, args.inter_op_threads, args.batch_size)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
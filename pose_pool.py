@@ -0,0 +1,128 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import mediapipe as mp
+
+import measurement
+
+
+class PoseEstimatorPool:
+    """Keeps warmed-up MediaPipe Pose instances around so each image skips model init.
+
+    This is the MediaPipe pose backend; see pose_backends for the others.
+    """
+
+    def __init__(self, size=1, model_complexity=1, min_detection_confidence=0.5,
+                 static_image_mode=True, inference_size="auto", enable_segmentation=False):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.size = size
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.static_image_mode = static_image_mode
+        # Long side images are downscaled to before detection, see measurement.detect_landmarks
+        self.inference_size = inference_size
+        # Person masks for silhouette measurements, see silhouette.py
+        self.enable_segmentation = enable_segmentation
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def settings(self):
+        """Model settings that affect detection output, e.g. for keying caches."""
+        return {
+            "model_complexity": self.model_complexity,
+            "min_detection_confidence": self.min_detection_confidence,
+            "static_image_mode": self.static_image_mode,
+            "inference_size": self.inference_size,
+            "enable_segmentation": self.enable_segmentation,
+        }
+
+    def _create(self):
+        return mp.solutions.pose.Pose(
+            static_image_mode=self.static_image_mode,
+            model_complexity=self.model_complexity,
+            min_detection_confidence=self.min_detection_confidence,
+            enable_segmentation=self.enable_segmentation
+        )
+
+    def warm_up(self):
+        """Build every instance up front and run one dummy frame through each."""
+        blank = np.zeros((256, 256, 3), dtype=np.uint8)
+        estimators = [self.checkout() for _ in range(self.size)]
+        try:
+            for pose in estimators:
+                pose.process(blank)
+        finally:
+            for pose in estimators:
+                self.checkin(pose)
+
+    def checkout(self, timeout=None):
+        """Take an idle Pose instance, creating one if the pool is not full yet."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Pose pool has been closed.")
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._create()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No pose estimator became available in time.")
+
+    def checkin(self, pose):
+        """Return a Pose instance to the pool, or close it if the pool has been closed."""
+        # Checked and queued under one lock so close() cannot drain in between
+        with self._lock:
+            if not self._closed:
+                self._idle.put(pose)
+                return
+        pose.close()
+
+    def detect_batch(self, images, with_mask=False):
+        """Landmarks (or None) for each BGR image; MediaPipe takes them one at a time."""
+        with self.pose() as pose:
+            return [measurement.detect_landmarks(pose, image, self.inference_size, with_mask)
+                    for image in images]
+
+    @contextmanager
+    def pose(self, timeout=None):
+        estimator = self.checkout(timeout)
+        try:
+            yield estimator
+        finally:
+            self.checkin(estimator)
+
+    def close(self):
+        """Release all idle instances; instances still checked out close on return."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
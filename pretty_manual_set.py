@@ -4,11 +4,12 @@ import numpy as np
 import math
 import csv
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QLabel, QPushButton, QVBoxLayout,
+    QApplication, QMainWindow, QWidget, QPushButton, QVBoxLayout,
     QHBoxLayout, QFileDialog, QMessageBox, QInputDialog
 )
-from PyQt5.QtGui import QImage, QPixmap
-from PyQt5.QtCore import Qt
+import image_loader
+import instrumentation
+from tiled_viewer import TiledImageView
 
 class MeasurementTool(QMainWindow):
     def __init__(self):
@@ -34,9 +35,9 @@ class MeasurementTool(QMainWindow):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
 
-        self.image_label = QLabel()
-        self.image_label.setFixedSize(800, 600)
-        self.image_label.setStyleSheet("background-color: black;")
+        # Scroll to zoom, right-drag to pan; clicks arrive in original image coordinates
+        self.image_view = TiledImageView()
+        self.image_view.setFixedSize(800, 600)
 
         load_front_btn = QPushButton("Load Front Image")
         load_front_btn.clicked.connect(self.load_front_image)
@@ -53,19 +54,23 @@ class MeasurementTool(QMainWindow):
         button_layout.addWidget(calculate_btn)
 
         main_layout = QVBoxLayout()
-        main_layout.addWidget(self.image_label)
+        main_layout.addWidget(self.image_view)
         main_layout.addLayout(button_layout)
 
         central_widget.setLayout(main_layout)
-        self.image_label.mousePressEvent = self.mouse_press_event
+        self.image_view.point_clicked.connect(self.place_point)
 
     def load_front_image(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Open Front Image", "", "Image Files (*.png *.jpg *.bmp)")
         if filename:
-            self.front_image = cv2.imread(filename)
-            self.current_image = self.front_image.copy()
+            self.front_image = image_loader.load_image(filename)
+            if self.front_image is None:
+                QMessageBox.warning(self, "Load Failed", "Could not read the image.")
+                return
+            self.current_image = self.front_image.pixels
             self.front_points.clear()
             self.point_idx_front = 0
+            self.image_view.set_image(self.front_image)
             self.display_image()
             self.get_user_height()  # Prompt user for their height
             self.next_point()
@@ -81,27 +86,11 @@ class MeasurementTool(QMainWindow):
 
     def display_image(self):
         if self.current_image is not None:
-            height, width, channel = self.current_image.shape
-            bytes_per_line = 3 * width
-            q_img = QImage(self.current_image.data, width, height, bytes_per_line, QImage.Format_RGB888).rgbSwapped()
-            pixmap = QPixmap.fromImage(q_img)
-            self.image_label.setPixmap(pixmap.scaled(self.image_label.size(), Qt.KeepAspectRatio))
-
-    def mouse_press_event(self, event):
-        if event.button() == Qt.LeftButton and self.current_image is not None:
-            x = event.pos().x()
-            y = event.pos().y()
-            label_size = self.image_label.size()
-            pixmap_size = self.image_label.pixmap().size()
-            ratio = pixmap_size.width() / self.current_image.shape[1]
-            img_x = int(x / ratio)
-            img_y = int(y / ratio)
-            cv2.circle(self.current_image, (img_x, img_y), 5, (0, 0, 255), -1)
+            self.image_view.set_points(self.front_points, self.point_front_labels)
 
+    def place_point(self, img_x, img_y):
+        if self.current_image is not None:
             if self.point_idx_front < len(self.point_front_labels):
-                label = self.point_front_labels[self.point_idx_front]
-                cv2.putText(self.current_image, label, (img_x + 10, img_y - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
                 self.front_points.append((img_x, img_y))
                 self.point_idx_front += 1
                 self.display_image()
@@ -142,6 +131,7 @@ class MeasurementTool(QMainWindow):
     def calculate_distance(self, p1, p2):
         return math.hypot(p1[0] - p2[0], p1[1] - p2[1])
 
+    @instrumentation.timed("csv_export")
     def export_to_csv(self, filename, measurements):
         with open(filename, mode='w', newline='') as file:
             writer = csv.writer(file)
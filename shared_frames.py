@@ -0,0 +1,259 @@
+import multiprocessing
+import queue
+import signal
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+# Room for a 1280px square BGR frame: detection runs at 1024px (measurement.AUTO_INFERENCE_SIZE)
+# and skips resampling up to 1.25x that, so nothing it would look at is lost
+DEFAULT_SLOT_BYTES = 1280 * 1280 * 3
+
+
+def fit_frame(image, slot_bytes):
+    """The image, downscaled if it does not fit in a slot. Landmarks are normalized, so this is harmless."""
+    if image.nbytes <= slot_bytes:
+        return image
+    scale = (slot_bytes / image.nbytes) ** 0.5
+    height, width = image.shape[:2]
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class FrameRing:
+    """Fixed pool of shared-memory slots that decoded frames are handed to worker processes in.
+
+    One shared memory block is split into slot_count slots of slot_bytes.
+    put() copies a frame into a free slot and returns a small picklable
+    handle; workers map the same block and read the frame in place, so
+    only the handle crosses the process boundary. The slot stays taken
+    until release(), and put() blocks while every slot is taken, so memory
+    use is fixed no matter how much work queues up. Handles carry the
+    slot's generation, so releasing a stale handle twice does nothing.
+    """
+
+    def __init__(self, slot_count=32, slot_bytes=DEFAULT_SLOT_BYTES):
+        self.slot_count = slot_count
+        self.slot_bytes = slot_bytes
+        self._memory = shared_memory.SharedMemory(create=True, size=slot_count * slot_bytes)
+        self._free = queue.Queue()
+        for slot in range(slot_count):
+            self._free.put(slot)
+        self._lock = threading.Lock()
+        self._generations = [0] * slot_count
+        self._taken = set()
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    def free_slots(self):
+        return self._free.qsize()
+
+    def put(self, image, timeout=None):
+        """Copy a frame into a free slot; returns (slot, generation, shape, dtype)."""
+        image = fit_frame(np.ascontiguousarray(image), self.slot_bytes)
+        try:
+            slot = self._free.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError("No frame slot became free in time.")
+        with self._lock:
+            self._generations[slot] += 1
+            self._taken.add(slot)
+            generation = self._generations[slot]
+        view = np.ndarray(image.shape, image.dtype, self._memory.buf, slot * self.slot_bytes)
+        view[...] = image
+        del view
+        return slot, generation, image.shape, image.dtype.str
+
+    def release(self, handle):
+        slot, generation = handle[0], handle[1]
+        with self._lock:
+            if slot not in self._taken or self._generations[slot] != generation:
+                return
+            self._taken.discard(slot)
+        self._free.put(slot)
+
+    def close(self):
+        self._memory.close()
+        self._memory.unlink()
+
+
+class RingReader:
+    """A worker's view of a FrameRing created by another process."""
+
+    def __init__(self, name, slot_bytes):
+        self.slot_bytes = slot_bytes
+        self._memory = shared_memory.SharedMemory(name=name)
+
+    def frame(self, handle):
+        """The frame behind a handle, read in place; drop it before close()."""
+        slot, _, shape, dtype = handle
+        return np.ndarray(shape, np.dtype(dtype), self._memory.buf, slot * self.slot_bytes)
+
+    def close(self):
+        self._memory.close()
+
+
+def _worker_main(worker_id, ring_name, slot_bytes, task_queue, result_queue, backend_options):
+    """Own one warmed pose backend and detect on frames in the ring until a None sentinel."""
+    import pose_backends
+
+    # Ctrl+C reaches the whole process group; the parent shuts workers down with sentinels
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # One process per core already; keep OpenCV from oversubscribing it
+    cv2.setNumThreads(1)
+    ring = RingReader(ring_name, slot_bytes)
+    try:
+        with pose_backends.create_backend(**backend_options) as backend:
+            backend.warm_up()
+            while True:
+                task = task_queue.get()
+                if task is None:
+                    break
+                task_id, handles, with_mask = task
+                result_queue.put(("start", worker_id, task_id))
+                try:
+                    frames = [ring.frame(handle) for handle in handles]
+                    results = backend.detect_batch(frames, with_mask)
+                    del frames
+                    result_queue.put(("done", worker_id, (task_id, results, None)))
+                except Exception as error:
+                    result_queue.put(("done", worker_id, (task_id, None, str(error))))
+    finally:
+        ring.close()
+
+
+class SharedFrameDetector:
+    """detect_batch() on a pool of worker processes, with frames passed through a FrameRing.
+
+    Each worker builds its own backend from backend_options (the keyword
+    arguments of pose_backends.create_backend). detect_batch blocks the
+    calling thread until a worker answers, so call it from as many threads
+    as there are workers to keep them all busy. A background thread
+    collects results, returns the batch's slots to the ring and replaces
+    workers that die, failing only the batch they were on.
+    """
+
+    def __init__(self, workers=2, backend_options=None, slot_count=64, slot_bytes=DEFAULT_SLOT_BYTES,
+                 slot_timeout=30.0):
+        self.workers = workers
+        self.backend_options = dict(backend_options or {})
+        self.slot_timeout = slot_timeout
+        self.ring = FrameRing(slot_count, slot_bytes)
+        self._context = multiprocessing.get_context("spawn")
+        self._tasks = self._context.Queue()
+        self._results = self._context.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}    # task id -> (Future, handles)
+        self._in_flight = {}  # worker id -> task id
+        self._next_task = 0
+        self._closing = False
+        self._processes = {}
+        self._next_worker = 0
+        for _ in range(workers):
+            self._start_worker()
+        self._reader = threading.Thread(target=self._read_results, name="shared-frame-results", daemon=True)
+        self._reader.start()
+
+    def _start_worker(self):
+        worker_id = self._next_worker
+        self._next_worker += 1
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.ring.name, self.ring.slot_bytes, self._tasks, self._results,
+                  self.backend_options),
+            daemon=True
+        )
+        process.start()
+        self._processes[worker_id] = process
+
+    def detect_batch(self, images, with_mask=False):
+        """Landmarks (or (landmarks, mask) pairs) for each BGR image, like a pose backend's."""
+        handles = []
+        try:
+            for image in images:
+                handles.append(self.ring.put(image, self.slot_timeout))
+        except Exception:
+            for handle in handles:
+                self.ring.release(handle)
+            raise
+        future = Future()
+        with self._lock:
+            if self._closing:
+                for handle in handles:
+                    self.ring.release(handle)
+                raise RuntimeError("Shared frame detector has been closed.")
+            task_id = self._next_task
+            self._next_task += 1
+            self._pending[task_id] = (future, handles)
+        self._tasks.put((task_id, handles, with_mask))
+        return future.result()
+
+    def _finish(self, task_id, results, error):
+        with self._lock:
+            entry = self._pending.pop(task_id, None)
+        if entry is None:
+            return
+        future, handles = entry
+        # The worker is done reading, so the slots can take new frames
+        for handle in handles:
+            self.ring.release(handle)
+        if error is None:
+            future.set_result(results)
+        else:
+            future.set_exception(RuntimeError(error))
+
+    def _read_results(self):
+        while True:
+            try:
+                kind, worker_id, payload = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if self._closing:
+                    return
+                self._replace_dead_workers()
+                continue
+            except (EOFError, OSError):
+                return
+            if kind == "start":
+                self._in_flight[worker_id] = payload
+            else:
+                self._in_flight.pop(worker_id, None)
+                self._finish(*payload)
+
+    def _replace_dead_workers(self):
+        for worker_id, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            del self._processes[worker_id]
+            task_id = self._in_flight.pop(worker_id, None)
+            if task_id is not None:
+                self._finish(task_id, None, f"worker exited with code {process.exitcode}")
+            if not self._closing:
+                self._start_worker()
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+        for _ in self._processes:
+            self._tasks.put(None)
+        for process in self._processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        self._reader.join()
+        with self._lock:
+            pending = list(self._pending)
+        for task_id in pending:
+            self._finish(task_id, None, "shared frame detector closed")
+        self.ring.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,111 @@
+"""Chest and waist widths from a person segmentation mask.
+
+Instead of fixed offsets from the shoulder and hip landmarks, the chest
+and waist edges are read off the silhouette, so the side view measures
+real body depth. For each measurement height a thin band of mask rows,
+cropped to the torso region, is run-length encoded in one pass; in every
+row the run around the body centre is the torso, and the band's median
+edges are used so a single noisy row does not matter. Front and side
+views go through the same code.
+"""
+import numpy as np
+
+import instrumentation
+
+MASK_THRESHOLD = 0.5
+CHEST_FRACTION = 0.3   # chest line, as a fraction of the way from shoulders to hips
+WAIST_FRACTION = 0.75  # natural waist, a little above the hip landmarks
+BAND_FRACTION = 0.02   # half height of the row band, as a fraction of the torso height
+ROI_MARGIN = 0.6       # torso region reaches this fraction of the torso height past the landmarks
+
+_SHOULDERS = (11, 12)
+_HIPS = (23, 24)
+
+
+def row_runs(rows):
+    """Row, start column and end column (exclusive) of every run of True in a 2-D array."""
+    padded = np.zeros((rows.shape[0], rows.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = rows
+    steps = np.diff(padded, axis=1)
+    run_rows, starts = np.nonzero(steps == 1)
+    _, ends = np.nonzero(steps == -1)
+    return run_rows, starts, ends
+
+
+def band_edges(body, centre_x):
+    """Median (left, right) edges of the run nearest centre_x in each row of a boolean band.
+
+    Where two runs are equally near (e.g. the centre falls in a gap) the
+    wider one wins. Returns None when the band has no body pixels.
+    """
+    run_rows, starts, ends = row_runs(body)
+    if not len(starts):
+        return None
+    distance = np.maximum(np.maximum(starts - centre_x, centre_x - (ends - 1)), 0)
+    order = np.lexsort((starts - ends, distance, run_rows))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = run_rows[order][1:] != run_rows[order][:-1]
+    chosen = order[first]
+    return float(np.median(starts[chosen])), float(np.median(ends[chosen]))
+
+
+def measure_widths(mask, landmarks, fractions=(CHEST_FRACTION, WAIST_FRACTION)):
+    """Silhouette edges at each torso fraction as (left, right, y) in mask pixels.
+
+    mask is a (H, W) probability or boolean array and landmarks the
+    normalized (33, 4) pose landmarks of the same image. Entries are None
+    where the torso cannot be located or the band holds no body.
+    """
+    height, width = mask.shape[:2]
+    shoulders = landmarks[list(_SHOULDERS), :2] * (width, height)
+    hips = landmarks[list(_HIPS), :2] * (width, height)
+    shoulder_mid, hip_mid = shoulders.mean(axis=0), hips.mean(axis=0)
+    torso_height = hip_mid[1] - shoulder_mid[1]
+    if torso_height <= 1:
+        return [None] * len(fractions)
+
+    # Only the torso region is thresholded and scanned
+    margin = ROI_MARGIN * torso_height
+    xs = np.concatenate([shoulders[:, 0], hips[:, 0]])
+    x0 = int(max(0, np.floor(xs.min() - margin)))
+    x1 = int(min(width, np.ceil(xs.max() + margin)))
+    half_band = max(1, int(round(BAND_FRACTION * torso_height)))
+
+    results = []
+    for fraction in fractions:
+        centre = shoulder_mid + fraction * (hip_mid - shoulder_mid)
+        y = int(round(centre[1]))
+        top, bottom = max(0, y - half_band), min(height, y + half_band + 1)
+        if top >= bottom or x0 >= x1:
+            results.append(None)
+            continue
+        band = mask[top:bottom, x0:x1]
+        body = band if band.dtype == bool else band > MASK_THRESHOLD
+        edges = band_edges(body, centre[0] - x0)
+        results.append(None if edges is None else (edges[0] + x0, edges[1] + x0, y))
+    return results
+
+
+@instrumentation.timed("silhouette")
+def silhouette_points(mask, landmarks, points, image_shape):
+    """Replace the chest (1, 2) and waist (3, 4) points with silhouette edges.
+
+    points are the six mapped points of either view in image_shape
+    coordinates; the mask may be smaller (e.g. at inference size). Points
+    whose band found no body are left as they were, and each pair keeps
+    its original left/right order.
+    """
+    mask_height, mask_width = mask.shape[:2]
+    scale_x = image_shape[1] / mask_width
+    scale_y = image_shape[0] / mask_height
+    points = list(points)
+    for index, edges in zip((1, 3), measure_widths(mask, landmarks)):
+        if edges is None:
+            continue
+        left, right, y = edges
+        pair = [(int(round(left * scale_x)), int(round(y * scale_y))),
+                (int(round(right * scale_x)), int(round(y * scale_y)))]
+        if points[index][0] > points[index + 1][0]:
+            pair.reverse()
+        points[index:index + 2] = pair
+    return points
@@ -0,0 +1,146 @@
+"""Match subject measurements against a garment size chart catalog.
+
+A catalog CSV has the columns sku, garment, size plus one column per
+measurement, named like the measurement tools' output (for example
+"Chest Circumference", "Waist Circumference", "Inseam Length"). Every SKU
+must give every measurement column of its file, so keep garments with
+different charts (tops, trousers) in separate catalogs.
+
+Sizes are indexed in a KD-tree over the weighted measurement vector, so
+finding the k nearest sizes does not scan the catalog.
+
+    python size_matcher.py catalog.csv batch_measurements.csv --top 3 --output sizes.csv
+"""
+import argparse
+import csv
+import sys
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+ID_FIELDS = ("sku", "garment", "size")
+
+# How much a centimetre of difference matters per measurement; the rest count 1
+DEFAULT_WEIGHTS = {
+    "Chest Circumference": 2.0,
+    "Waist Circumference": 2.0,
+    "Hip Circumference": 1.5,
+    "Neck Circumference": 0.5,
+    "Thigh Circumference": 0.5,
+}
+
+
+class SizeMatch:
+    def __init__(self, sku, garment, size, distance):
+        self.sku = sku
+        self.garment = garment
+        self.size = size
+        self.distance = distance
+
+    def __repr__(self):
+        return f"SizeMatch({self.sku!r}, {self.garment!r}, {self.size!r}, {self.distance:.2f})"
+
+
+class SizeCatalog:
+    """Garment sizes in a KD-tree, queried by weighted Euclidean distance.
+
+    Each measurement axis is multiplied by the square root of its weight
+    before the tree is built, so plain Euclidean distance in the tree is
+    the weighted distance sqrt(sum(w * (subject - size) ** 2)).
+    """
+
+    def __init__(self, skus, garments, sizes, names, values, weights=None):
+        self.skus = list(skus)
+        self.garments = list(garments)
+        self.sizes = list(sizes)
+        self.names = list(names)
+        weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.weights = np.array([weights.get(name, 1.0) for name in self.names])
+        self._axis_scale = np.sqrt(self.weights)
+        values = np.asarray(values, dtype=np.float64).reshape(len(self.skus), len(self.names))
+        self.tree = cKDTree(values * self._axis_scale, balanced_tree=False)
+
+    @classmethod
+    def load(cls, path, weights=None):
+        skus, garments, sizes, values = [], [], [], []
+        with open(path, newline='') as file:
+            reader = csv.DictReader(file)
+            names = [field for field in reader.fieldnames if field not in ID_FIELDS]
+            for line, row in enumerate(reader, start=2):
+                try:
+                    values.append([float(row[name]) for name in names])
+                except (TypeError, ValueError):
+                    raise ValueError(f"{path}:{line}: every measurement column needs a number")
+                skus.append(row["sku"])
+                garments.append(row.get("garment", ""))
+                sizes.append(row.get("size", ""))
+        if not skus:
+            raise ValueError(f"{path} has no sizes")
+        return cls(skus, garments, sizes, names, values, weights)
+
+    def __len__(self):
+        return len(self.skus)
+
+    def subject_vectors(self, measurements):
+        """(N, M) array from a dict of names to values or (N,) arrays, in catalog order."""
+        missing = [name for name in self.names if name not in measurements]
+        if missing:
+            raise ValueError(f"Measurements are missing {', '.join(missing)}")
+        columns = [np.atleast_1d(np.asarray(measurements[name], dtype=np.float64)) for name in self.names]
+        return np.column_stack(columns)
+
+    def query_batch(self, measurements, k=5, workers=-1):
+        """Distances and catalog indices of the k best sizes for N subjects, each (N, k)."""
+        vectors = self.subject_vectors(measurements)
+        k = min(k, len(self))
+        distances, indices = self.tree.query(vectors * self._axis_scale, k=k, workers=workers)
+        return distances.reshape(len(vectors), k), indices.reshape(len(vectors), k)
+
+    def query(self, measurements, k=5):
+        """The k best-fitting sizes for one subject, closest first."""
+        distances, indices = self.query_batch(measurements, k, workers=1)
+        return self.matches(distances[0], indices[0])
+
+    def matches(self, distances, indices):
+        return [SizeMatch(self.skus[i], self.garments[i], self.sizes[i], float(d))
+                for d, i in zip(distances, indices)]
+
+
+def read_results(path, names):
+    """Subject ids and measurement columns of the 'ok' rows of a batch_measure CSV."""
+    subject_ids, columns = [], {name: [] for name in names}
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            if row.get("status", "ok") != "ok":
+                continue
+            subject_ids.append(row["subject_id"])
+            for name in names:
+                columns[name].append(float(row[name]))
+    return subject_ids, {name: np.array(values) for name, values in columns.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recommend garment sizes for measured subjects.")
+    parser.add_argument("catalog", help="CSV with sku, garment, size and measurement columns")
+    parser.add_argument("results", help="batch_measure.py output")
+    parser.add_argument("--top", type=int, default=3, help="sizes to recommend per subject")
+    parser.add_argument("--output", default="size_recommendations.csv")
+    args = parser.parse_args(argv)
+
+    catalog = SizeCatalog.load(args.catalog)
+    subject_ids, measurements = read_results(args.results, catalog.names)
+    distances, indices = catalog.query_batch(measurements, args.top)
+    with open(args.output, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["subject_id", "rank", "sku", "garment", "size", "distance"])
+        for subject_id, row_distances, row_indices in zip(subject_ids, distances, indices):
+            for rank, match in enumerate(catalog.matches(row_distances, row_indices), start=1):
+                writer.writerow([subject_id, rank, match.sku, match.garment, match.size,
+                                 f"{match.distance:.2f}"])
+    print(f"Matched {len(subject_ids)} subjects against {len(catalog)} sizes. "
+          f"Results exported to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
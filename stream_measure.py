@@ -0,0 +1,210 @@
+"""Measure a subject from one turn-around video instead of two posed stills.
+
+Reads a video file or camera, runs MediaPipe Pose in tracking mode and
+sorts frames into front and side views by how far apart the shoulders
+are. Each view's landmarks are smoothed with an exponential moving
+average; once both views have held still for a while the measurements
+are computed from the smoothed landmarks and printed. Frames are skipped
+whenever detection falls behind the source frame rate.
+
+    python stream_measure.py --camera 0 --height 175 --gender Male
+    python stream_measure.py --video turnaround.mp4 --height 175 --gender Male --store measurements.db
+"""
+import argparse
+import sys
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+import measurement
+import measurement_store
+from batch_measure import Subject, measure_points, parse_gender, parse_inference_size, store_row
+from pose_pool import PoseEstimatorPool
+
+# Landmarks the six measurement points are built from
+TRACKED = [0, 2, 5, 11, 12, 23, 24, 29, 30]
+FRONT_SPREAD = 0.45  # shoulder width / torso height above which a frame is a front view
+SIDE_SPREAD = 0.15   # and below which it is a side view
+
+
+def classify_view(landmarks):
+    """'front', 'side' or None (back view, in between, or no torso) for one frame's landmarks."""
+    shoulders, hips = landmarks[[11, 12], :2], landmarks[[23, 24], :2]
+    torso_height = hips[:, 1].mean() - shoulders[:, 1].mean()
+    if torso_height <= 0:
+        return None
+    spread = (shoulders[0, 0] - shoulders[1, 0]) / torso_height
+    # Facing the camera puts the left shoulder (11) on the right of the image
+    if spread > FRONT_SPREAD:
+        return "front"
+    if abs(spread) < SIDE_SPREAD:
+        return "side"
+    return None
+
+
+class LandmarkSmoother:
+    """Exponential moving average of one view's landmarks, and whether it has settled.
+
+    The view settles once window smoothed frames in a row kept every
+    tracked landmark within tolerance (in normalized image units) of their
+    mean. The landmarks at that moment are kept in settled, so turning on
+    to the next view afterwards does not undo it; a later still spell
+    replaces them.
+    """
+
+    def __init__(self, alpha=0.3, window=15, tolerance=0.004):
+        self.alpha = alpha
+        self.tolerance = tolerance
+        self.landmarks = None
+        self.settled = None
+        self.frames = 0
+        self._history = deque(maxlen=window)
+
+    def update(self, landmarks):
+        if self.landmarks is None:
+            self.landmarks = landmarks.astype(np.float32)
+        else:
+            self.landmarks += self.alpha * (landmarks - self.landmarks)
+        self.frames += 1
+        self._history.append(self.landmarks[TRACKED, :2].copy())
+        if self.is_stable():
+            self.settled = self.landmarks.copy()
+        return self.landmarks
+
+    def is_stable(self):
+        if len(self._history) < self._history.maxlen:
+            return False
+        history = np.stack(self._history)
+        return float(np.abs(history - history.mean(axis=0)).max()) < self.tolerance
+
+
+class FrameScheduler:
+    """Decides how many frames to drop so detection keeps up with the source frame rate."""
+
+    def __init__(self, fps, alpha=0.2):
+        self.frame_interval = 1.0 / fps if fps and fps > 0 else 0.0
+        self.alpha = alpha
+        self.cost = None  # smoothed seconds per processed frame
+
+    def record(self, seconds):
+        self.cost = seconds if self.cost is None else self.cost + self.alpha * (seconds - self.cost)
+
+    def frames_to_skip(self):
+        if not self.frame_interval or self.cost is None:
+            return 0
+        return max(0, int(np.ceil(self.cost / self.frame_interval)) - 1)
+
+
+class TurnaroundCapture:
+    """Smoothed front and side landmarks collected from a stream of frames."""
+
+    def __init__(self, alpha=0.3, window=15, tolerance=0.004):
+        self.views = {view: LandmarkSmoother(alpha, window, tolerance) for view in ("front", "side")}
+
+    def add(self, landmarks):
+        """Feed one frame's landmarks (or None); returns the view it counted towards."""
+        view = None if landmarks is None else classify_view(landmarks)
+        if view is not None:
+            self.views[view].update(landmarks)
+        return view
+
+    def ready(self):
+        return all(smoother.settled is not None for smoother in self.views.values())
+
+    def points(self, image_shape):
+        """(front points, side points) from the settled landmarks."""
+        return tuple(measurement.map_landmarks(self.views[view].settled, view, image_shape)
+                     for view in ("front", "side"))
+
+
+def open_capture(args):
+    source = args.camera if args.video is None else args.video
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open {'camera' if args.video is None else 'video'} {source}")
+    return capture
+
+
+def run(args):
+    capture = open_capture(args)
+    fps = capture.get(cv2.CAP_PROP_FPS)
+    scheduler = FrameScheduler(None if args.every_frame else fps)
+    turnaround = TurnaroundCapture(args.smoothing, args.stable_frames, args.tolerance)
+    start = time.perf_counter()
+    processed = skipped = 0
+    frame_shape = None
+
+    # Tracking mode: full detection only until a person is found, then cheap tracking
+    with PoseEstimatorPool(model_complexity=args.model_complexity,
+                           min_detection_confidence=args.min_detection_confidence,
+                           static_image_mode=False,
+                           inference_size=args.inference_size) as pose_pool:
+        with pose_pool.pose() as pose:
+            while not turnaround.ready():
+                if args.max_seconds and time.perf_counter() - start > args.max_seconds:
+                    break
+                for _ in range(scheduler.frames_to_skip()):
+                    if not capture.grab():
+                        break
+                    skipped += 1
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                frame_shape = frame.shape
+                frame_start = time.perf_counter()
+                landmarks = measurement.detect_landmarks(pose, frame, args.inference_size)
+                turnaround.add(landmarks)
+                scheduler.record(time.perf_counter() - frame_start)
+                processed += 1
+    capture.release()
+
+    print(f"Processed {processed} frames, skipped {skipped}.", file=sys.stderr)
+    if not turnaround.ready():
+        missing = [view for view, smoother in turnaround.views.items() if smoother.settled is None]
+        print(f"No stable {' or '.join(missing)} view found; turn slowly and pause facing "
+              "the camera and side-on.", file=sys.stderr)
+        return 1
+
+    front_points, side_points = turnaround.points(frame_shape)
+    subject = Subject(args.subject_id, None, None, args.height, args.gender)
+    row = measure_points(subject, front_points, side_points, args.coefficient_set)
+    for name in measurement_store.VALUE_NAMES:
+        print(f"{name}: {row[name]:.2f}")
+    if args.store:
+        with measurement_store.MeasurementStore(args.store) as store:
+            store_row(store, row, args.coefficient_set)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure a subject from a turn-around video.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--video", help="video file")
+    source.add_argument("--camera", type=int, help="camera device index")
+    parser.add_argument("--height", type=float, required=True, help="cm")
+    parser.add_argument("--gender", type=parse_gender, required=True)
+    parser.add_argument("--subject-id", default="stream")
+    parser.add_argument("--model-complexity", type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument("--min-detection-confidence", type=float, default=0.5)
+    parser.add_argument("--inference-size", type=parse_inference_size, default="auto")
+    parser.add_argument("--smoothing", type=float, default=0.3, help="EMA weight of each new frame")
+    parser.add_argument("--stable-frames", type=int, default=15,
+                        help="smoothed frames a view must hold still for")
+    parser.add_argument("--tolerance", type=float, default=0.004,
+                        help="largest landmark wobble (fraction of the frame) that still counts as still")
+    parser.add_argument("--every-frame", action="store_true",
+                        help="process every frame of a video instead of keeping up with real time")
+    parser.add_argument("--max-seconds", type=float, default=60.0, help="give up after this long")
+    parser.add_argument("--coefficient-set", default="default")
+    parser.add_argument("--store", default=None, help="append the result to this measurement store")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    return run(parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
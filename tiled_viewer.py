@@ -0,0 +1,191 @@
+import math
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor
+from PyQt5.QtCore import Qt, QPoint, QPointF, QRectF, pyqtSignal
+
+TILE_SIZE = 256
+MAX_CACHED_TILES = 512
+MAX_ZOOM = 8.0
+
+
+def to_pixmap(image):
+    height, width, channel = image.shape
+    q_img = QImage(image.data, width, height, 3 * width, QImage.Format_RGB888).rgbSwapped()
+    return QPixmap.fromImage(q_img)
+
+
+class TilePyramid:
+    """Multi-resolution tiles of a LoadedImage, generated on demand and kept in an LRU cache.
+
+    Level 0 is full resolution and every level above halves it. Levels at or
+    below the loader's reduced scale are cut from the reduced pixels, so the
+    full-resolution image is only decoded once someone zooms in past it.
+    """
+
+    def __init__(self, loaded, tile_size=TILE_SIZE, max_tiles=MAX_CACHED_TILES):
+        self.loaded = loaded
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles
+        self.full_height, self.full_width = loaded.full_shape[:2]
+        self.top_level = max(0, math.ceil(math.log2(max(self.full_width, self.full_height) / tile_size)))
+        self._tiles = OrderedDict()
+
+    def level_for_zoom(self, zoom):
+        """Coarsest level that still has at least one source pixel per screen pixel."""
+        if zoom >= 1:
+            return 0
+        return min(self.top_level, int(math.floor(math.log2(1 / zoom))))
+
+    def tile_range(self, level, x0, y0, x1, y1):
+        """Tile indices covering a rectangle in full-resolution coordinates."""
+        span = self.tile_size * 2 ** level
+        columns = math.ceil(self.full_width / span)
+        rows = math.ceil(self.full_height / span)
+        tx0, tx1 = max(0, int(x0 // span)), min(columns - 1, int(x1 // span))
+        ty0, ty1 = max(0, int(y0 // span)), min(rows - 1, int(y1 // span))
+        return range(tx0, tx1 + 1), range(ty0, ty1 + 1)
+
+    def tile_bounds(self, level, tx, ty):
+        """(x0, y0, x1, y1) of a tile in full-resolution coordinates."""
+        span = self.tile_size * 2 ** level
+        return (tx * span, ty * span,
+                min(self.full_width, (tx + 1) * span), min(self.full_height, (ty + 1) * span))
+
+    def tile(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self._tiles.get(key)
+        if pixmap is not None:
+            self._tiles.move_to_end(key)
+            return pixmap
+
+        x0, y0, x1, y1 = self.tile_bounds(level, tx, ty)
+        downscale = 2 ** level
+        if downscale >= self.loaded.scale:
+            # Reduced pixels are detailed enough for this level
+            scale = self.loaded.scale
+            sx0, sy0 = int(x0 / scale), int(y0 / scale)
+            sx1 = max(sx0 + 1, math.ceil(x1 / scale))
+            sy1 = max(sy0 + 1, math.ceil(y1 / scale))
+            source = self.loaded.pixels[sy0:sy1, sx0:sx1]
+        else:
+            source = self.loaded.region(0, 0, self.full_width, self.full_height)[y0:y1, x0:x1]
+        size = (max(1, math.ceil((x1 - x0) / downscale)), max(1, math.ceil((y1 - y0) / downscale)))
+        if (source.shape[1], source.shape[0]) != size:
+            source = cv2.resize(source, size, interpolation=cv2.INTER_AREA)
+        pixmap = to_pixmap(np.ascontiguousarray(source))
+
+        self._tiles[key] = pixmap
+        while len(self._tiles) > self.max_tiles:
+            self._tiles.popitem(last=False)
+        return pixmap
+
+
+class TiledImageView(QWidget):
+    """Zoomable, pannable image view that only draws the tiles currently visible.
+
+    Scroll to zoom around the cursor, drag with the right or middle button
+    to pan. Left clicks are reported through point_clicked in original
+    image coordinates, and points are given and drawn in the same coordinates.
+    """
+
+    point_clicked = pyqtSignal(int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.pyramid = None
+        self.zoom = 1.0          # screen pixels per original pixel
+        self.offset = QPointF()  # original-image coordinate shown at the widget's top-left
+        self.points = []
+        self.labels = []
+        self._pan_start = None
+
+    def set_image(self, loaded):
+        self.pyramid = TilePyramid(loaded)
+        self.points = []
+        self.labels = []
+        self.fit_to_view()
+
+    def set_points(self, points, labels):
+        self.points = points
+        self.labels = labels
+        self.update()
+
+    def fit_to_view(self):
+        if self.pyramid is None:
+            return
+        self.zoom = min(self.width() / self.pyramid.full_width, self.height() / self.pyramid.full_height)
+        self.offset = QPointF()
+        self.update()
+
+    def to_image(self, pos):
+        return QPointF(self.offset.x() + pos.x() / self.zoom, self.offset.y() + pos.y() / self.zoom)
+
+    def to_view(self, x, y):
+        return QPointF((x - self.offset.x()) * self.zoom, (y - self.offset.y()) * self.zoom)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+        if self.pyramid is None:
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+        level = self.pyramid.level_for_zoom(self.zoom)
+        top_left = self.to_image(event.rect().topLeft())
+        bottom_right = self.to_image(event.rect().bottomRight())
+        columns, rows = self.pyramid.tile_range(
+            level, top_left.x(), top_left.y(), bottom_right.x(), bottom_right.y())
+        for ty in rows:
+            for tx in columns:
+                x0, y0, x1, y1 = self.pyramid.tile_bounds(level, tx, ty)
+                target = QRectF(self.to_view(x0, y0), self.to_view(x1, y1))
+                painter.drawPixmap(target, self.pyramid.tile(level, tx, ty), QRectF())
+
+        painter.setRenderHint(QPainter.Antialiasing)
+        for i, (x, y) in enumerate(self.points):
+            center = self.to_view(x, y).toPoint()
+            painter.setPen(QPen(QColor(255, 0, 0), 3))
+            painter.drawEllipse(center, 5, 5)
+            if i < len(self.labels):
+                painter.setPen(QColor(0, 255, 0))
+                painter.drawText(center + QPoint(10, -10), self.labels[i])
+        painter.end()
+
+    def wheelEvent(self, event):
+        if self.pyramid is None:
+            return
+        anchor = self.to_image(event.pos())
+        fit = min(self.width() / self.pyramid.full_width, self.height() / self.pyramid.full_height)
+        factor = 1.25 ** (event.angleDelta().y() / 120)
+        self.zoom = min(MAX_ZOOM, max(fit, self.zoom * factor))
+        # Keep the image point under the cursor fixed
+        self.offset = QPointF(anchor.x() - event.pos().x() / self.zoom,
+                              anchor.y() - event.pos().y() / self.zoom)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if self.pyramid is None:
+            return
+        if event.button() in (Qt.RightButton, Qt.MiddleButton):
+            self._pan_start = (event.pos(), QPointF(self.offset))
+        elif event.button() == Qt.LeftButton:
+            point = self.to_image(event.pos())
+            if 0 <= point.x() < self.pyramid.full_width and 0 <= point.y() < self.pyramid.full_height:
+                self.point_clicked.emit(int(point.x()), int(point.y()))
+
+    def mouseMoveEvent(self, event):
+        if self._pan_start is not None:
+            start_pos, start_offset = self._pan_start
+            delta = event.pos() - start_pos
+            self.offset = QPointF(start_offset.x() - delta.x() / self.zoom,
+                                  start_offset.y() - delta.y() / self.zoom)
+            self.update()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() in (Qt.RightButton, Qt.MiddleButton):
+            self._pan_start = None